@@ -7,9 +7,11 @@ It defines routes for user input, expert search, and scheduling.
 
 import os
 import time
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+import hmac
+from flask import Flask, render_template, stream_template, request, redirect, url_for, session, jsonify, g
 from flask_session import Session
-from utils import linkedin, email, db, nlp, monitor
+from flask_session.sessions import SessionInterface as ServerSideSessionInterface, NullSessionInterface
+from utils import email, db, nlp, monitor, tracing, profiling, admission, search as search_service
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -28,6 +30,97 @@ app.config["SESSION_PERMANENT"] = False
 app.config["SESSION_TYPE"] = "filesystem"
 Session(app)
 
+if tracing.ENABLED:
+    # Time session loads and saves, which happen outside the route functions
+    app.session_interface.open_session = tracing.traced('session.open')(app.session_interface.open_session)
+    app.session_interface.save_session = tracing.traced('session.save')(app.session_interface.save_session)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_time(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.endpoint or 'unknown'
+            tracing.observe(f"http.{route}", time.perf_counter() - started)
+            tracing.increment('http_requests', route=route, status=response.status_code)
+        return response
+
+if admission.ENABLED:
+    @app.before_request
+    def admit_request():
+        # Turn expensive requests away quickly when this worker is saturated
+        try:
+            g.admission = admission.acquire(request.endpoint)
+        except admission.Rejected as rejected:
+            tracing.increment('admission_rejections', route=request.endpoint, status=rejected.status)
+            return (jsonify({'error': 'Server busy, please retry'}), rejected.status,
+                    {'Retry-After': str(rejected.retry_after)})
+        return None
+
+    @app.teardown_request
+    def release_admission(exc):
+        admission.release(g.pop('admission', None), failed=exc is not None)
+
+if profiling.ENABLED:
+    def require_admin():
+        """Reject requests without the configured admin token."""
+        token = request.headers.get('X-Admin-Token', '')
+        if not profiling.ADMIN_TOKEN or not hmac.compare_digest(token, profiling.ADMIN_TOKEN):
+            return jsonify({'error': 'Forbidden'}), 403
+        return None
+
+    @app.before_request
+    def start_request_profile():
+        g.profiler = profiling.begin_request()
+
+    @app.teardown_request
+    def stop_request_profile(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiling.end_request(profiler)
+
+    @app.route('/admin/profile', methods=['GET', 'POST'])
+    def admin_profile():
+        """
+        POST arms a profile of the next N requests; GET returns the top functions.
+        """
+        denied = require_admin()
+        if denied:
+            return denied
+        if request.method == 'POST':
+            count = min(max(request.args.get('requests', 10, type=int), 1), 1000)
+            profiling.start_profile(count)
+            return jsonify({'remaining': count})
+        limit = request.args.get('limit', 30, type=int)
+        sort = request.args.get('sort', 'cumulative')
+        return jsonify(profiling.get_profile(limit, sort))
+
+    @app.route('/admin/memory', methods=['GET', 'POST', 'DELETE'])
+    def admin_memory():
+        """
+        POST takes a baseline tracemalloc snapshot, GET diffs against it,
+        DELETE stops allocation tracing.
+        """
+        denied = require_admin()
+        if denied:
+            return denied
+        if request.method == 'POST':
+            return jsonify(profiling.take_snapshot())
+        if request.method == 'DELETE':
+            profiling.stop_tracing()
+            return jsonify({'tracing': False})
+        limit = request.args.get('limit', 20, type=int)
+        group_by = request.args.get('group_by', 'lineno')
+        if group_by not in ('lineno', 'filename', 'traceback'):
+            return jsonify({'error': 'Invalid group_by'}), 400
+        diff = profiling.diff_snapshot(limit, group_by)
+        if diff is None:
+            return jsonify({'error': 'No baseline snapshot; POST first'}), 409
+        return jsonify(diff)
+
 # Initialize database
 db.init_db()
 
@@ -39,16 +132,34 @@ def index():
     """
     return render_template('index.html')
 
-@app.route('/search', methods=['POST'])
+@app.route('/search', methods=['GET', 'POST'])
 def search():
     """
     Process the search form:
     1. Get user query and email from form
     2. Search for experts on LinkedIn
     3. Rank experts using NLP
-    4. Store results in session
+    4. Store the displayed page in session
     5. Render search results page
+    
+    With SEARCH_STREAMING on and a server-side session, the page is
+    streamed instead: the shell is sent at once, then early matches from
+    stored experts, then the final ranking once the provider search
+    completes.
+    
+    GET requests with a cursor render further pages from the cached
+    ranking without searching again.
     """
+    cursor = request.args.get('cursor')
+    if request.method == 'GET':
+        resumed = search_service.resume(cursor) if cursor else None
+        if resumed is None:
+            return redirect(url_for('index'))
+        entry, offset = resumed
+        page = search_service.get_page(entry, offset)
+        session['experts'] = page['experts']
+        return render_template('search_results.html', **page)
+    
     # Get form data
     query = request.form.get('query')
     user_email = request.form.get('email')
@@ -63,25 +174,194 @@ def search():
     # Record start time for performance tracking
     start_time = time.time()
     
-    # Search for experts
-    experts = linkedin.search_experts(query)
+    if search_service.SEARCH_STREAMING and session_is_server_side():
+        # Send the page shell now and the results as they are ranked
+        return stream_template('search_stream.html', events=stream_search(query, start_time))
     
-    # Rank experts
-    ranked_experts = nlp.rank_experts(experts, query)
+    # Search for and rank experts
+    entry = search_service.run_search(query)
+    page = search_service.get_page(entry)
     
-    # Store in session
-    session['experts'] = ranked_experts
+    # Store only the displayed page in session
+    session['experts'] = page['experts']
     
     # Calculate search time
     search_time = round(time.time() - start_time, 2)
     
     # Log the search results
     monitor.log_action('search_completed', {
-        'experts_found': len(ranked_experts),
+        'experts_found': page['total'],
         'search_time': search_time
     })
     
-    return render_template('search_results.html', experts=ranked_experts)
+    return render_template('search_results.html', **page)
+
+def session_is_server_side():
+    """
+    Check whether sessions are stored server-side by Flask-Session.
+    
+    Streamed pages can only keep the displayed experts for /schedule when
+    the session data lives on the server: the cookie has been sent before
+    the final page is known, so a cookie-backed session would lose them.
+    
+    Returns:
+        bool: True if the session can be saved after the response has started
+    """
+    interface = app.session_interface
+    return isinstance(interface, ServerSideSessionInterface) and not isinstance(interface, NullSessionInterface)
+
+def stream_search(query, start_time):
+    """
+    Run a search for a streamed results page.
+    
+    Yields the provisional ranking of stored experts, then the first page of
+    the final ranking. The response headers, and with them the session
+    cookie, have been sent by the time the final page is known, so the
+    session is written to the server-side store again directly. This relies
+    on the Flask-Session interface only using the response to set the
+    cookie, which already names the same session id; see session_is_server_side.
+    
+    Args:
+        query (str): Search query
+        start_time (float): When the search request started
+    
+    Yields:
+        tuple: ('partial', expert list) or ('final', page dict)
+    """
+    for kind, result in search_service.iter_search(query):
+        if kind == 'partial':
+            yield kind, result
+            continue
+        
+        page = search_service.get_page(result)
+        session['experts'] = page['experts']
+        # The throwaway response only receives a duplicate of the cookie
+        app.session_interface.save_session(app, session, app.response_class())
+        
+        monitor.log_action('search_completed', {
+            'experts_found': page['total'],
+            'search_time': round(time.time() - start_time, 2),
+            'streamed': True
+        })
+        yield kind, page
+
+@app.route('/api/search')
+def api_search():
+    """
+    API endpoint for searching experts as JSON.
+    
+    Pages are addressed either by q/limit/offset or by the cursor returned
+    with the previous page, which reuses the cached ranking. Responses
+    carry a strong ETag derived from the normalized query and the cached
+    result version, so clients can revalidate with If-None-Match and get a
+    304 without the search being re-run.
+    """
+    limit = min(max(request.args.get('limit', search_service.SEARCH_PAGE_SIZE, type=int), 1), 100)
+    cursor = request.args.get('cursor')
+    
+    if cursor:
+        resumed = search_service.resume(cursor)
+        if resumed is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        entry, offset = resumed
+        query = entry['query']
+    else:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Missing query parameter q'}), 400
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        
+        # Answer revalidations from the cache without searching
+        entry = search_service.get_cached(query)
+        if entry is not None:
+            etag = search_service.make_etag(entry, limit, offset)
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+                response.set_etag(etag)
+                response.cache_control.public = True
+                response.cache_control.max_age = search_service.max_age(entry)
+                return response
+        else:
+            monitor.log_action('search_initiated', {'query': query, 'source': 'api'})
+            start_time = time.time()
+            entry = search_service.run_search(query)
+            monitor.log_action('search_completed', {
+                'experts_found': len(entry['experts']),
+                'search_time': round(time.time() - start_time, 2),
+                'source': 'api'
+            })
+    
+    page = search_service.get_page(entry, offset, limit)
+    response = jsonify(dict(page, query=query))
+    response.set_etag(search_service.make_etag(entry, limit, offset))
+    response.cache_control.public = True
+    response.cache_control.max_age = search_service.max_age(entry)
+    return response.make_conditional(request)
+
+def is_valid_expert(expert):
+    """
+    Check that a caller-supplied expert has the fields ranking reads, with the right types.
+    
+    Args:
+        expert: Value taken from a request body
+        
+    Returns:
+        bool: True if the expert can be ranked
+    """
+    if not isinstance(expert, dict) or not isinstance(expert.get('id'), str):
+        return False
+    if not all(isinstance(expert.get(field, ''), str) for field in ('name', 'title', 'company', 'summary')):
+        return False
+    skills = expert.get('skills', [])
+    education = expert.get('education', [])
+    return (isinstance(skills, list) and all(isinstance(skill, str) for skill in skills)
+            and isinstance(education, list)
+            and all(isinstance(edu, dict) and isinstance(edu.get('field', ''), str) for edu in education))
+
+@app.route('/api/search/batch', methods=['POST'])
+def api_search_batch():
+    """
+    API endpoint for ranking many queries against one expert pool.
+    
+    Expects a JSON body with 'queries' (up to BATCH_MAX_QUERIES non-empty
+    strings) and optional 'k' and 'experts' (up to BATCH_MAX_EXPERTS).
+    Without 'experts', the stored expert catalog is used as the pool.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    
+    queries = payload.get('queries')
+    if (not queries or not isinstance(queries, list) or len(queries) > nlp.BATCH_MAX_QUERIES
+            or not all(isinstance(query, str) and query.strip() for query in queries)):
+        return jsonify({'error': f'Expected a list of 1 to {nlp.BATCH_MAX_QUERIES} non-empty query strings'}), 400
+    
+    k = payload.get('k', 10)
+    if not isinstance(k, int) or isinstance(k, bool):
+        return jsonify({'error': 'Expected an integer k'}), 400
+    k = min(max(k, 1), 100)
+    
+    experts = payload.get('experts')
+    if experts is not None:
+        if (not isinstance(experts, list) or len(experts) > nlp.BATCH_MAX_EXPERTS
+                or not all(is_valid_expert(expert) for expert in experts)):
+            return jsonify({'error': f'Expected a list of up to {nlp.BATCH_MAX_EXPERTS} experts with string ids'}), 400
+    experts = experts or db.get_all_experts()
+    
+    monitor.log_action('batch_search_initiated', {'queries': len(queries), 'experts': len(experts)})
+    start_time = time.time()
+    
+    results = nlp.rank_experts_batch(experts, queries, k=k)
+    
+    monitor.log_action('batch_search_completed', {
+        'queries': len(queries),
+        'search_time': round(time.time() - start_time, 2)
+    })
+    
+    return jsonify([
+        {'query': query, 'experts': ranked}
+        for query, ranked in zip(queries, results)
+    ])
 
 @app.route('/schedule', methods=['POST'])
 def schedule():
@@ -111,8 +391,14 @@ def schedule():
         'user_email': user_email
     })
     
+    # Record the selections; they feed the popularity prior used in ranking
+    if user_email and selected_experts:
+        with tracing.span('schedule.record'):
+            db.record_selections(user_email, [expert['id'] for expert in selected_experts], query)
+
     # Send email with selected experts
-    email_status = email.send_expert_selection_email(user_email, selected_experts, query)
+    with tracing.span('schedule.email'):
+        email_status = email.send_expert_selection_email(user_email, selected_experts, query)
     
     # Log scheduling completion
     monitor.log_action('scheduling_completed', {
@@ -140,5 +426,17 @@ def monitor_updates():
     new_actions = monitor.get_actions_since(since_id)
     return jsonify(new_actions)
 
+@app.route('/metrics')
+def metrics():
+    """
+    Expose stage timings, counters and admission state in Prometheus text format.
+    """
+    if not tracing.ENABLED and not admission.ENABLED:
+        return 'Tracing is disabled\n', 404, {'Content-Type': 'text/plain'}
+    body = tracing.render_prometheus() if tracing.ENABLED else ''
+    if admission.ENABLED:
+        body += admission.render_prometheus()
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""
+Julie AI Agent - ASGI Application
+
+This file serves Julie over ASGI, e.g. with `uvicorn asgi:application`.
+The search and scheduling API run on the async path, so one worker can hold
+many slow provider searches at once on a single event loop. Every other
+route is passed to the Flask application in app.py.
+"""
+
+import json
+import time
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import parse_etags
+from app import app
+from utils import admission, async_db, email, tracing, search as search_service
+
+flask_application = WsgiToAsgi(app)
+
+async def send_json(send, payload, status=200, headers=None):
+    """
+    Send a JSON response.
+
+    Args:
+        send (callable): ASGI send channel
+        payload: JSON-serializable response body, or None for no body
+        status (int, optional): HTTP status code
+        headers (dict, optional): Extra response headers
+    """
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    response_headers = [(b'content-length', str(len(body)).encode('ascii'))]
+    if payload is not None:
+        response_headers.append((b'content-type', b'application/json'))
+    for name, value in (headers or {}).items():
+        response_headers.append((name.lower().encode('ascii'), value.encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def read_json(receive):
+    """
+    Read and parse a JSON request body.
+
+    Args:
+        receive (callable): ASGI receive channel
+
+    Returns:
+        The parsed body, or None if it is not valid JSON
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    try:
+        return json.loads(b''.join(chunks) or b'null')
+    except ValueError:
+        return None
+
+def _arg(params, name, default=None, cast=str):
+    try:
+        return cast(params[name][0])
+    except (KeyError, IndexError, ValueError):
+        return default
+
+async def api_search(scope, receive, send):
+    """
+    Async variant of the /api/search route.
+
+    Takes the same q/limit/offset or cursor parameters and returns the same
+    pages and ETags, but the search runs on the event loop.
+    """
+    params = parse_qs(scope['query_string'].decode('latin-1'))
+    limit = min(max(_arg(params, 'limit', search_service.SEARCH_PAGE_SIZE, int), 1), 100)
+    cursor = _arg(params, 'cursor')
+
+    if cursor:
+        resumed = await search_service.resume_async(cursor)
+        if resumed is None:
+            return await send_json(send, {'error': 'Invalid cursor'}, 400)
+        entry, offset = resumed
+        query = entry['query']
+    else:
+        query = (_arg(params, 'q') or '').strip()
+        if not query:
+            return await send_json(send, {'error': 'Missing query parameter q'}, 400)
+        offset = max(_arg(params, 'offset', 0, int), 0)
+
+        entry = search_service.get_cached(query)
+        if entry is None:
+            await async_db.log_action('search_initiated', {'query': query, 'source': 'async'})
+            start_time = time.time()
+            entry = await search_service.run_search_async(query)
+            await async_db.log_action('search_completed', {
+                'experts_found': len(entry['experts']),
+                'search_time': round(time.time() - start_time, 2),
+                'source': 'async'
+            })
+
+    etag = search_service.make_etag(entry, limit, offset)
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': f'public, max-age={search_service.max_age(entry)}'
+    }
+    request_headers = dict(scope['headers'])
+    if parse_etags(request_headers.get(b'if-none-match', b'').decode('latin-1')).contains(etag):
+        return await send_json(send, None, 304, headers)
+
+    page = search_service.get_page(entry, offset, limit)
+    await send_json(send, dict(page, query=query), headers=headers)
+
+async def api_schedule(scope, receive, send):
+    """
+    Async variant of the /schedule route for API clients.
+
+    Expects a JSON body with 'email', 'expert_ids' and optional 'query'.
+    Experts are looked up by id rather than taken from the session.
+    """
+    payload = await read_json(receive)
+    if not isinstance(payload, dict) or not payload.get('email') or not isinstance(payload.get('expert_ids'), list):
+        return await send_json(send, {'error': 'Expected email and a list of expert_ids'}, 400)
+    user_email = payload['email']
+    query = payload.get('query')
+
+    selected_experts = []
+    for expert_id in payload['expert_ids']:
+        expert = await async_db.get_expert(expert_id)
+        if expert:
+            selected_experts.append(expert)
+
+    await async_db.log_action('scheduling_initiated', {
+        'selected_experts': len(selected_experts),
+        'user_email': user_email
+    })
+
+    # Record the selections; they feed the popularity prior used in ranking
+    if selected_experts:
+        with tracing.span('schedule.record'):
+            await async_db.record_selections(user_email, [expert['id'] for expert in selected_experts], query)
+
+    with tracing.span('schedule.email'):
+        email_status = await email.send_expert_selection_email_async(user_email, selected_experts, query)
+
+    await async_db.log_action('scheduling_completed', {
+        'user_email': user_email,
+        'email_status': 'sent' if email_status else 'failed'
+    })
+
+    await send_json(send, {
+        'experts': [expert['id'] for expert in selected_experts],
+        'email_status': 'sent' if email_status else 'failed'
+    })
+
+async def monitor_updates(scope, receive, send):
+    """
+    Async variant of the /api/monitor/updates route.
+    """
+    params = parse_qs(scope['query_string'].decode('latin-1'))
+    await send_json(send, await async_db.get_actions_since(_arg(params, 'since', 0, int)))
+
+# Routes served on the async path, by method and path
+ROUTES = {
+    ('GET', '/api/search'): api_search,
+    ('POST', '/api/schedule'): api_schedule,
+    ('GET', '/api/monitor/updates'): monitor_updates
+}
+
+async def lifespan(receive, send):
+    """Acknowledge server startup and shutdown."""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    """
+    ASGI entry point.
+
+    Args:
+        scope (dict): Connection scope
+        receive (callable): ASGI receive channel
+        send (callable): ASGI send channel
+    """
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    handler = ROUTES.get((scope['method'], scope['path'])) if scope['type'] == 'http' else None
+    if handler is None:
+        return await flask_application(scope, receive, send)
+
+    route = handler.__name__
+    started = time.perf_counter()
+    response = {'status': 500}
+
+    async def send_and_record(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        await send(message)
+
+    token = None
+    failed = True
+    try:
+        if admission.ENABLED:
+            # Same limit and queue as the Flask routes of this worker
+            try:
+                token = await admission.acquire_async(route)
+            except admission.Rejected as rejected:
+                tracing.increment('admission_rejections', route=route, status=rejected.status)
+                return await send_json(send_and_record, {'error': 'Server busy, please retry'}, rejected.status,
+                                       {'Retry-After': str(rejected.retry_after)})
+        await handler(scope, receive, send_and_record)
+        failed = False
+    finally:
+        admission.release(token, failed=failed)
+        if tracing.ENABLED:
+            tracing.observe(f"http.async.{route}", time.perf_counter() - started)
+            tracing.increment('http_requests', route=f"async.{route}", status=response['status'])
@@ -0,0 +1,104 @@
+"""
+Async Search Benchmark
+
+Starts a burst of concurrent searches, each waiting on the slow mock
+provider, and compares how long one worker takes to finish them: on the
+sync path with a fixed number of request threads, and on the async path
+with every search on one event loop. Concurrency is the provider wait the
+worker overlapped, i.e. searches times provider delay over wall time.
+
+Usage:
+    python -m benchmarks.bench_async --searches 50 200 --threads 8 --provider-delay 1.0
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import corpus
+
+
+def _queries(count, tag):
+    # Distinct queries, so no search is answered from a cache
+    return [f"{corpus.QUERIES[i % len(corpus.QUERIES)]} {tag} {i}" for i in range(count)]
+
+
+def run_sync(queries, threads):
+    """
+    Run searches on the sync path with a fixed number of threads.
+
+    Args:
+        queries (list): Search queries
+        threads (int): Request threads
+
+    Returns:
+        float: Wall time in seconds
+    """
+    from utils import search
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(search.run_search, queries))
+    return time.perf_counter() - started
+
+
+def run_async(queries):
+    """
+    Run searches on the async path, all on one event loop.
+
+    Args:
+        queries (list): Search queries
+
+    Returns:
+        float: Wall time in seconds
+    """
+    from utils import search
+
+    async def burst():
+        await asyncio.gather(*(search.run_search_async(query) for query in queries))
+
+    started = time.perf_counter()
+    asyncio.run(burst())
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--searches', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--threads', type=int, default=8, help='request threads on the sync path')
+    parser.add_argument('--provider-delay', type=float, default=1.0, help='mock provider latency in seconds')
+    args = parser.parse_args()
+
+    os.environ['USE_MOCK_LINKEDIN'] = 'True'
+    os.environ['MOCK_SEARCH_DELAY'] = str(args.provider_delay)
+    os.environ['LINKEDIN_CACHE_TTL'] = '0'
+    # Let every search reach the provider
+    os.environ['PROVIDER_RATE_LIMIT'] = '100000'
+    os.environ['PROVIDER_BURST'] = '100000'
+    os.environ['BREAKER_SLOW_CALL_SECONDS'] = str(args.provider_delay * 100)
+
+    from utils import db, monitor, nlp
+
+    db_file = os.path.join(tempfile.mkdtemp(), 'async.db')
+    db.DB_FILE = db_file
+    monitor.DB_FILE = db_file
+    db.init_db()
+    nlp.preprocess_text('warm up')
+
+    print(f"provider delay: {args.provider_delay:.2f} s, sync threads: {args.threads}")
+    print(f"{'searches':>8}  {'path':<6} {'seconds':>8} {'searches/s':>10} {'concurrency':>11}")
+    for count in args.searches:
+        for name in ('sync', 'async'):
+            queries = _queries(count, f"{name}{count}")
+            if name == 'sync':
+                seconds = run_sync(queries, args.threads)
+            else:
+                seconds = run_async(queries)
+            print(f"{count:>8}  {name:<6} {seconds:>8.2f} {count / seconds:>10.1f} "
+                  f"{count * args.provider_delay / seconds:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Embeddings Benchmark
+
+Fits an embeddings model on synthetic experts, saves and memory-maps it,
+then compares LSH retrieval against an exact scan: recall@k of the LSH
+results and per-query latency of both.
+
+Usage:
+    python -m benchmarks.bench_embeddings --experts 20000 --k 20
+"""
+
+import argparse
+import tempfile
+import time
+
+from benchmarks import corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--experts', type=int, default=20000)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--probes', type=int, default=1, choices=(0, 1))
+    args = parser.parse_args()
+
+    from utils import embeddings
+
+    experts = corpus.make_experts(args.experts)
+    started = time.perf_counter()
+    fitted = embeddings.fit(experts)
+    fit_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        fitted.save(directory)
+        started = time.perf_counter()
+        model = embeddings.EmbeddingModel.load(directory)
+        load_seconds = time.perf_counter() - started
+
+        exact_time = lsh_time = 0.0
+        recall = 0.0
+        candidates = 0
+        for query in corpus.QUERIES:
+            started = time.perf_counter()
+            exact = model.search_exact(query, k=args.k)
+            exact_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            approximate = model.search(query, k=args.k, probes=args.probes)
+            lsh_time += time.perf_counter() - started
+
+            candidates += len(model.index.candidates(model.embed(query), args.probes))
+            recall += len({e for e, _ in exact} & {e for e, _ in approximate}) / len(exact)
+        model = None
+
+    queries = len(corpus.QUERIES)
+    print(f"experts: {args.experts}, vocabulary: {len(fitted.vocabulary)}, dim: {fitted.dim}")
+    print(f"fit:            {fit_seconds:>10.2f} s")
+    print(f"load (mmap):    {load_seconds * 1000:>10.1f} ms")
+    print(f"exact scan:     {exact_time / queries * 1000:>10.1f} ms/query")
+    print(f"lsh:            {lsh_time / queries * 1000:>10.1f} ms/query "
+          f"({candidates / queries:.0f} candidates)")
+    print(f"recall@{args.k}:      {recall / queries:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
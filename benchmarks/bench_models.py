@@ -0,0 +1,146 @@
+"""
+Expert Batch Benchmark
+
+Ranks synthetic experts with nlp.rank_experts, which keeps scores in an
+ExpertBatch, and with the previous implementation that wrote the score into
+every dictionary on each blend and sorted the dictionaries. Reports time,
+peak allocations and whether both produce the same order, end to end and
+with expert tokens already fetched (scoring, blending and ordering only).
+
+Usage:
+    python -m benchmarks.bench_models --experts 5000 --k 20
+"""
+
+import argparse
+import contextlib
+import heapq
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import corpus
+
+
+def rank_dicts(experts, query, k=None):
+    """
+    Rank experts the way nlp.rank_experts did before ExpertBatch.
+
+    Args:
+        experts (list): List of expert dictionaries
+        query (str): Search query
+        k (int, optional): Number of top experts to return
+
+    Returns:
+        list: Ranked list of expert dictionaries
+    """
+    from utils import embeddings, nlp, popularity
+    query_tokens = nlp.preprocess_text(query)
+    for expert, tokens in zip(experts, nlp.expert_tokens(experts)):
+        expert['relevance_score'] = nlp._score_tokens(tokens, expert.get('title', ''), query_tokens)
+
+    model = embeddings.get_model() if nlp.SEMANTIC_WEIGHT > 0 else None
+    if model is not None:
+        query_vector = model.embed(query)
+        for expert in experts:
+            expert['relevance_score'] = nlp.blend_semantic(expert['relevance_score'],
+                                                           model.similarity(query_vector, expert))
+
+    priors = popularity.priors(experts, query_tokens)
+    if priors is not None:
+        for expert, prior in zip(experts, priors):
+            expert['relevance_score'] = nlp.blend_popularity(expert['relevance_score'], prior)
+
+    if k is not None:
+        return heapq.nlargest(k, experts, key=lambda x: x.get('relevance_score', 0))
+    return sorted(experts, key=lambda x: x.get('relevance_score', 0), reverse=True)
+
+
+@contextlib.contextmanager
+def prefetched_tokens(experts):
+    """
+    Serve nlp.expert_tokens from memory, to time ranking without token fetching.
+
+    Args:
+        experts (list): Expert dictionaries whose tokens are fetched once
+    """
+    from utils import nlp
+    fetch = nlp.expert_tokens
+    tokens = dict(zip((e['id'] for e in experts), fetch(experts)))
+    nlp.expert_tokens = lambda candidates: [tokens[e['id']] for e in candidates]
+    try:
+        yield
+    finally:
+        nlp.expert_tokens = fetch
+
+
+def run(rank, experts, queries, k):
+    """
+    Rank every query on fresh copies and measure the whole run.
+
+    Timing and allocation tracing are separate passes, since tracemalloc
+    slows everything down.
+
+    Args:
+        rank (callable): rank_experts implementation
+        experts (list): Expert dictionaries
+        queries (list): Search queries
+        k (int): Results per query, or None for a full ordering
+
+    Returns:
+        tuple: (seconds, peak bytes allocated for one query, list of ranked id lists)
+    """
+    copies = [[dict(e) for e in experts] for _ in queries]
+    started = time.perf_counter()
+    results = [[e['id'] for e in rank(candidates, query, k=k)] for candidates, query in zip(copies, queries)]
+    elapsed = time.perf_counter() - started
+
+    candidates = [dict(e) for e in experts]
+    tracemalloc.start()
+    rank(candidates, queries[0], k=k)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--experts', type=int, default=5000)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--selections', type=int, default=200,
+                        help='selections recorded first, so the popularity blend runs')
+    args = parser.parse_args()
+
+    from utils import db, nlp, popularity
+
+    db.DB_FILE = os.path.join(tempfile.mkdtemp(), 'bench_models.db')
+    db.init_db()
+    experts = corpus.make_experts(args.experts)
+    queries = corpus.QUERIES
+    now = time.time()
+    store = popularity.get_store()
+    for i in range(args.selections):
+        expert_id = experts[(i * 7919) % len(experts)]['id']
+        terms = popularity.selection_terms(queries[i % len(queries)])
+        store.apply([(expert_id, 1.0, now)], [(term, expert_id, 1.0, now) for term in terms])
+
+    # Warm the token cache so both runs score from it
+    nlp.expert_tokens(experts)
+
+    def compare(label):
+        for k in (args.k, None):
+            dict_time, dict_peak, by_dict = run(rank_dicts, experts, queries, k)
+            batch_time, batch_peak, by_batch = run(nlp.rank_experts, experts, queries, k)
+            print(f"{label}, {f'top {k}' if k is not None else 'full order'}:")
+            print(f"  dicts:        {dict_time * 1000:>8.1f} ms, peak {dict_peak / 1024:>8.1f} KiB")
+            print(f"  ExpertBatch:  {batch_time * 1000:>8.1f} ms, peak {batch_peak / 1024:>8.1f} KiB")
+            print(f"  same order:   {by_dict == by_batch}")
+
+    print(f"experts: {args.experts}, queries: {len(queries)}, selections: {args.selections}")
+    compare("end to end")
+    with prefetched_tokens(experts):
+        compare("tokens fetched")
+
+
+if __name__ == '__main__':
+    main()
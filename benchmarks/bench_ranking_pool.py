@@ -0,0 +1,92 @@
+"""
+Ranking Pool Benchmark
+
+Ranks stored synthetic experts from several threads at once, in-process and
+through the ranking pool, and reports throughput and whether both produce
+the same top k.
+
+Usage:
+    python -m benchmarks.bench_ranking_pool --experts 20000 --threads 8
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import corpus
+
+
+def populate(db_file, count):
+    """
+    Create a database holding synthetic experts with ETags.
+
+    Args:
+        db_file (str): Database file path
+        count (int): Number of experts
+    """
+    from utils import catalog, db
+    db.DB_FILE = db_file
+    db.init_db()
+    catalog.store_profiles(corpus.make_experts(count))
+
+
+def run(rank, candidates, queries, threads, k):
+    """
+    Rank every query concurrently and time the whole run.
+
+    Args:
+        rank (callable): rank_experts implementation
+        candidates (list): Expert dictionaries
+        queries (list): Search queries
+        threads (int): Concurrent callers
+        k (int): Results per query
+
+    Returns:
+        tuple: (seconds, list of ranked id lists)
+    """
+    def one(query):
+        # Each caller ranks its own copies, as separate requests would
+        return [e['id'] for e in rank([dict(e) for e in candidates], query, k=k)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(one, queries))
+    return time.perf_counter() - started, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--experts', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--k', type=int, default=20)
+    args = parser.parse_args()
+
+    from utils import db, nlp, ranking_pool
+
+    db_file = os.path.join(tempfile.mkdtemp(), 'ranking_pool.db')
+    populate(db_file, args.experts)
+    candidates = db.get_all_experts()
+    queries = (corpus.QUERIES * (args.threads // len(corpus.QUERIES) + 1))[:max(args.threads, len(corpus.QUERIES))]
+
+    ranking_pool.RANKING_POOL_THRESHOLD = 0
+    started = time.perf_counter()
+    ranking_pool.get_executor().submit(int).result()
+    run(ranking_pool.rank_experts, candidates[:10], queries[:1], 1, args.k)
+    warmup = time.perf_counter() - started
+
+    local_time, local = run(nlp.rank_experts, candidates, queries, args.threads, args.k)
+    pool_time, pooled = run(ranking_pool.rank_experts, candidates, queries, args.threads, args.k)
+    ranking_pool.shutdown()
+
+    print(f"experts: {args.experts}, queries: {len(queries)}, threads: {args.threads}, "
+          f"pool processes: {ranking_pool.RANKING_POOL_SIZE}")
+    print(f"pool start:     {warmup:>8.2f} s")
+    print(f"in-process:     {local_time:>8.2f} s ({len(queries) / local_time:.2f} queries/s)")
+    print(f"ranking pool:   {pool_time:>8.2f} s ({len(queries) / pool_time:.2f} queries/s)")
+    print(f"same top {args.k}:    {local == pooled}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Scheduling Benchmark
+
+Compares conflict detection through the interval index against a plain SQL
+overlap query, over a synthetic schedules table.
+
+Usage:
+    python -m benchmarks.bench_scheduling --bookings 100000
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+
+def populate(db_file, bookings, experts, users):
+    """
+    Fill a fresh database with random non-overlapping bookings.
+
+    Args:
+        db_file (str): Database file path
+        bookings (int): Number of schedules to create
+        experts (int): Number of distinct experts
+        users (int): Number of distinct users
+    """
+    from utils import db
+    db.DB_FILE = db_file
+    db.init_db()
+
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    cursor.executemany('INSERT INTO users (email) VALUES (?)',
+                       [(f"user{i}@example.com",) for i in range(users)])
+
+    base = datetime.datetime(2030, 1, 1, 9)
+    rows = []
+    for i in range(bookings):
+        # Each expert's calls are spread across half-hour slots
+        expert = i % experts
+        slot = i // experts
+        start = base + datetime.timedelta(minutes=30 * slot)
+        rows.append((random.randint(1, users), f"expert-{expert}", start.isoformat(sep=' '), 30))
+    cursor.executemany('''
+    INSERT INTO schedules (user_id, expert_id, scheduled_time, duration_minutes)
+    VALUES (?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+    return base, bookings // experts
+
+
+def sql_conflicts(db_file, expert_id, start, end):
+    """Naive overlap query used as the comparison baseline."""
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT id FROM schedules
+    WHERE expert_id = ?
+    AND status NOT IN ('cancelled', 'failed')
+    AND datetime(scheduled_time, '+' || duration_minutes || ' minutes') > ?
+    AND scheduled_time < ?
+    ''', (expert_id, start.isoformat(sep=' '), end.isoformat(sep=' ')))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--experts', type=int, default=500)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--checks', type=int, default=2000)
+    args = parser.parse_args()
+
+    from utils import scheduling
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        base, slots_per_expert = populate(db_file, args.bookings, args.experts, args.users)
+
+        started = time.perf_counter()
+        scheduler = scheduling.Scheduler(db_file)
+        scheduler.refresh()
+        load_time = time.perf_counter() - started
+
+        probes = []
+        for _ in range(args.checks):
+            expert_id = f"expert-{random.randrange(args.experts)}"
+            offset = random.randrange(slots_per_expert * 30)
+            start = base + datetime.timedelta(minutes=offset)
+            probes.append((expert_id, start, start + datetime.timedelta(minutes=30)))
+
+        started = time.perf_counter()
+        for expert_id, start, end in probes:
+            scheduler._conflicts(None, [expert_id], start, end)
+        index_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for expert_id, start, end in probes:
+            sql_conflicts(db_file, expert_id, start, end)
+        sql_time = time.perf_counter() - started
+
+        group = [f"expert-{i}" for i in random.sample(range(args.experts), 3)]
+        started = time.perf_counter()
+        for _ in range(100):
+            scheduler.find_free_slots('user1@example.com', group, 30, k=5, start=base)
+        slots_time = time.perf_counter() - started
+
+    print(f"bookings:               {args.bookings}")
+    print(f"index load:             {load_time * 1000:.1f} ms")
+    print(f"conflict check (index): {index_time / args.checks * 1e6:.1f} us/op")
+    print(f"conflict check (SQL):   {sql_time / args.checks * 1e6:.1f} us/op")
+    print(f"free slots (3 experts): {slots_time / 100 * 1e6:.1f} us/op")
+
+
+if __name__ == '__main__':
+    main()
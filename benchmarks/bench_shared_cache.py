@@ -0,0 +1,126 @@
+"""
+Shared Cache Benchmark
+
+Runs several worker processes that each serve a stream of ranking requests,
+preprocessing the texts of a skewed sample of experts per request. Each run
+caches the tokens either in a per-process LRU dict or in the shared cache,
+and reports throughput, how often texts were preprocessed, and how many
+cached entries were held in total.
+
+Usage:
+    python -m benchmarks.bench_shared_cache --workers 4 8 --experts 5000
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from collections import OrderedDict
+
+from benchmarks import corpus
+
+# Experts looked up per request, like a page of search candidates
+BATCH = 20
+
+
+def _requests(texts, count, seed):
+    # Zipf-like popularity: a few experts come back in most searches
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(texts))]
+    return [rng.choices(texts, weights, k=BATCH) for _ in range(count)]
+
+
+def _compute(text, miss_cost):
+    from utils import nlp
+    tokens = nlp.preprocess_text(text)
+    if miss_cost:
+        deadline = time.perf_counter() + miss_cost
+        while time.perf_counter() < deadline:
+            pass
+    return tokens
+
+
+def _dict_worker(args):
+    texts, count, seed, capacity, miss_cost = args
+    cache = OrderedDict()
+    misses = 0
+    for batch in _requests(texts, count, seed):
+        for text in batch:
+            if text in cache:
+                cache.move_to_end(text)
+                continue
+            cache[text] = _compute(text, miss_cost)
+            misses += 1
+            if len(cache) > capacity:
+                cache.popitem(last=False)
+    return misses, len(cache)
+
+
+def _shared_worker(args):
+    texts, count, seed, _, miss_cost = args
+    from utils import shared_cache
+    misses = 0
+    for batch in _requests(texts, count, seed):
+        found = shared_cache.get_many('bench', batch)
+        computed = {text: _compute(text, miss_cost) for text in batch if text not in found}
+        shared_cache.set_many('bench', computed)
+        misses += len(computed)
+    return misses, 0
+
+
+def run(worker, texts, workers, count, capacity, miss_cost):
+    """
+    Run one worker function in several processes at once.
+
+    Args:
+        worker (callable): _dict_worker or _shared_worker
+        texts (list): Expert texts
+        workers (int): Worker processes
+        count (int): Requests per worker
+        capacity (int): Entries per per-process dict
+        miss_cost (float): Extra seconds spent per miss
+
+    Returns:
+        tuple: (seconds, total misses, entries held)
+    """
+    jobs = [(texts, count, seed, capacity, miss_cost) for seed in range(workers)]
+    with multiprocessing.Pool(workers) as pool:
+        started = time.perf_counter()
+        results = pool.map(worker, jobs)
+        seconds = time.perf_counter() - started
+    return seconds, sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 8])
+    parser.add_argument('--experts', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=300, help='requests per worker')
+    parser.add_argument('--capacity', type=int, default=2000, help='entries per per-process dict')
+    parser.add_argument('--miss-cost', type=float, default=0.0,
+                        help='extra milliseconds per miss, e.g. for slower tokenizers')
+    args = parser.parse_args()
+
+    from utils import nlp, shared_cache
+
+    shared_cache.SHARED_CACHE_FILE = os.path.join(tempfile.mkdtemp(), 'bench_cache.db')
+    texts = [nlp._expert_text(e) for e in corpus.make_experts(args.experts)]
+    miss_cost = args.miss_cost / 1000
+
+    print(f"experts: {args.experts}, requests per worker: {args.requests} x {BATCH} lookups")
+    print(f"{'workers':>7}  {'cache':<8} {'seconds':>8} {'lookups/s':>10} {'misses':>8} {'hit rate':>8} {'entries':>8}")
+    for workers in args.workers:
+        lookups = workers * args.requests * BATCH
+        for name, worker in (('dict', _dict_worker), ('shared', _shared_worker)):
+            shared_cache.clear()
+            seconds, misses, entries = run(worker, texts, workers, args.requests, args.capacity, miss_cost)
+            if name == 'shared':
+                entries = shared_cache.get_stats().get('bench', {}).get('entries', 0)
+            print(f"{workers:>7}  {name:<8} {seconds:>8.2f} {lookups / seconds:>10.0f} {misses:>8} "
+                  f"{1 - misses / lookups:>8.1%} {entries:>8}")
+
+
+if __name__ == '__main__':
+    main()
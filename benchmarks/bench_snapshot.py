@@ -0,0 +1,75 @@
+"""
+Expert Snapshot Benchmark
+
+Compares how long a fresh worker takes before it can rank every stored
+expert: reading and tokenizing the experts table, as ranking pool processes
+did at start, against opening a published snapshot. Also checks that both
+give the same ranking.
+
+Usage:
+    python -m benchmarks.bench_snapshot --experts 20000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks import corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--experts', type=int, default=20000)
+    parser.add_argument('--k', type=int, default=20)
+    args = parser.parse_args()
+
+    from utils import catalog, db, nlp, ranking_pool, shared_cache, snapshot
+
+    workdir = tempfile.mkdtemp()
+    db.DB_FILE = os.path.join(workdir, 'snapshot.db')
+    shared_cache.ENABLED = False
+    snapshot.SNAPSHOT_DIR = os.path.join(workdir, 'snapshots')
+    snapshot.SNAPSHOT_CHECK_INTERVAL = 0
+    db.init_db()
+    catalog.store_profiles(corpus.make_experts(args.experts))
+    nlp.preprocess_text('warm up')
+
+    started = time.perf_counter()
+    ranking_pool._load_new_experts()
+    table_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    path = snapshot.build()
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    snap = snapshot.Snapshot(path)
+    open_seconds = time.perf_counter() - started
+
+    candidates = db.get_all_experts()
+    items = [(e['id'], e['etag']) for e in candidates]
+    query = corpus.QUERIES[0]
+    query_tokens = nlp.preprocess_text(query)
+
+    started = time.perf_counter()
+    from_index = ranking_pool._score_shard(query, query_tokens, 0, items, args.k)
+    index_rank = time.perf_counter() - started
+
+    # Score the same items again, resolved against the snapshot only
+    ranking_pool._index.clear()
+    started = time.perf_counter()
+    from_snapshot = ranking_pool._score_shard(query, query_tokens, 0, items, args.k)
+    snapshot_rank = time.perf_counter() - started
+
+    print(f"experts: {args.experts}, snapshot: {os.path.getsize(path) / 1e6:.1f} MB")
+    print(f"read + tokenize table:  {table_seconds * 1000:>9.1f} ms")
+    print(f"build snapshot:         {build_seconds * 1000:>9.1f} ms")
+    print(f"open snapshot (mmap):   {open_seconds * 1000:>9.1f} ms")
+    print(f"rank all, in-memory:    {index_rank * 1000:>9.1f} ms")
+    print(f"rank all, snapshot:     {snapshot_rank * 1000:>9.1f} ms")
+    print(f"same top {args.k}:            {from_index == from_snapshot}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Synthetic Corpus
+
+Deterministic synthetic experts, queries and actions for benchmarks, shaped
+like the mock LinkedIn results.
+"""
+
+import random
+
+FIRST_NAMES = ["Sarah", "Michael", "David", "Jennifer", "Alex", "Emma", "Priya", "Omar",
+               "Lucia", "Kenji", "Grace", "Tomas", "Aisha", "Noah", "Ingrid", "Mateo"]
+LAST_NAMES = ["Johnson", "Chen", "Williams", "Lee", "Rodriguez", "Wilson", "Patel", "Haddad",
+              "Rossi", "Tanaka", "Okafor", "Novak", "Khan", "Brown", "Larsen", "Garcia"]
+COMPANIES = ["DeepMind", "Stanford University", "Goldman Sachs", "Citadel", "Google", "Microsoft",
+             "Mayo Clinic", "Pfizer", "Skadden", "McKinsey", "Stripe", "OpenAI", "JP Morgan"]
+LOCATIONS = ["London, UK", "Palo Alto, CA", "New York, NY", "Chicago, IL", "Mountain View, CA",
+             "Seattle, WA", "Boston, MA", "Berlin, Germany", "Singapore", "Toronto, Canada"]
+TITLES = ["AI Research Scientist", "Director of AI Ethics", "Investment Banking Director",
+          "Hedge Fund Manager", "Senior Software Engineer", "Product Manager", "Chief Medical Officer",
+          "Compliance Counsel", "Data Science Lead", "Partner", "Portfolio Manager", "Head of Risk"]
+SKILLS = ["Machine Learning", "Deep Learning", "Neural Networks", "Python", "TensorFlow", "AI Ethics",
+          "Policy", "Research", "Public Speaking", "Investment Banking", "M&A", "Financial Analysis",
+          "Valuation", "Deal Structuring", "Portfolio Management", "Risk Analysis", "Derivatives",
+          "Quantitative Finance", "Java", "Cloud Computing", "Distributed Systems", "Product Strategy",
+          "User Experience", "Agile", "Market Research", "Clinical Trials", "Healthcare Regulation",
+          "Securities Law", "Compliance", "Data Privacy", "Drug Development", "Biostatistics"]
+FIELDS = ["Computer Science", "Economics", "Finance", "Law", "Medicine", "Statistics",
+          "Mathematics", "Public Policy", "Biology", "Business Administration"]
+QUERIES = [
+    "I need an AI ethics expert with experience in healthcare regulation",
+    "machine learning researcher for a deep learning due diligence",
+    "hedge fund portfolio manager with derivatives experience",
+    "investment banking director for M&A valuation questions",
+    "compliance counsel familiar with securities law and data privacy",
+    "clinical trials and drug development expert at a pharma company",
+    "senior software engineer with distributed systems and cloud computing",
+    "product manager who has run market research for enterprise software",
+]
+ACTION_TYPES = ["search_initiated", "search_completed", "scheduling_initiated", "scheduling_completed"]
+
+
+def make_experts(count, seed=0):
+    """
+    Generate synthetic experts.
+
+    Args:
+        count (int): Number of experts
+        seed (int, optional): Random seed
+
+    Returns:
+        list: List of expert dictionaries
+    """
+    rng = random.Random(seed)
+    experts = []
+    for i in range(count):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        experts.append({
+            'id': f"bench-{i}",
+            'name': name,
+            'title': rng.choice(TITLES),
+            'company': rng.choice(COMPANIES),
+            'location': rng.choice(LOCATIONS),
+            'profile_url': f"https://linkedin.com/in/bench-{i}",
+            'skills': rng.sample(SKILLS, rng.randint(3, 6)),
+            'education': [{'field': rng.choice(FIELDS)} for _ in range(rng.randint(0, 2))]
+        })
+    return experts
+
+
+def make_queries(count, seed=0):
+    """
+    Generate synthetic queries.
+
+    Args:
+        count (int): Number of queries
+        seed (int, optional): Random seed
+
+    Returns:
+        list: List of query strings
+    """
+    rng = random.Random(seed)
+    return [rng.choice(QUERIES) for _ in range(count)]
+
+
+def make_action(rng, i):
+    """
+    Generate one synthetic monitor action.
+
+    Args:
+        rng (random.Random): Random source
+        i (int): Sequence number
+
+    Returns:
+        tuple: (action_type, details) as passed to monitor.log_action
+    """
+    action_type = ACTION_TYPES[i % len(ACTION_TYPES)]
+    if action_type == 'search_initiated':
+        details = {'query': rng.choice(QUERIES), 'email': f"user{i}@example.com"}
+    elif action_type == 'search_completed':
+        details = {'experts_found': rng.randint(0, 20), 'search_time': round(rng.random() * 3, 2)}
+    elif action_type == 'scheduling_initiated':
+        details = {'selected_experts': rng.randint(1, 5), 'user_email': f"user{i}@example.com"}
+    else:
+        details = {'user_email': f"user{i}@example.com", 'email_status': 'sent'}
+    return action_type, details
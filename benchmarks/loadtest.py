@@ -0,0 +1,386 @@
+"""
+Load Test Harness
+
+Drives /search, /schedule, /monitor and /api/monitor/updates with concurrent
+virtual users and reports throughput and latency percentiles per route.
+
+Clients either call the app in-process through Flask's test client or send
+real HTTP requests, to a server started here (--serve) or one already
+running (--url). In-process and --serve runs use the mock providers.
+
+Usage:
+    python -m benchmarks.loadtest --concurrency 16 --duration 30
+    python -m benchmarks.loadtest --mode socket --serve --rate 20 --duration 60
+    python -m benchmarks.loadtest --mix search=1,monitor=4 --provider-delay 0.2
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import corpus
+
+ROUTES = ('search', 'schedule', 'monitor', 'updates')
+DEFAULT_MIX = 'search=5,schedule=2,monitor=2,updates=1'
+EXPERT_ID_PATTERN = re.compile(r'name="expert_id" value="([^"]+)"')
+
+
+def load_app(provider_delay, cache):
+    """
+    Import the Flask app configured for load testing.
+
+    Args:
+        provider_delay (float): Simulated mock provider latency in seconds
+        cache (bool): Whether to keep the search result cache and catalog on
+
+    Returns:
+        Flask: Application instance
+    """
+    os.environ['USE_MOCK_LINKEDIN'] = 'True'
+    os.environ['USE_MOCK_EMAIL'] = 'True'
+    os.environ['MOCK_SEARCH_DELAY'] = str(provider_delay)
+    os.environ.setdefault('DB_FILE', os.path.join(tempfile.mkdtemp(), 'loadtest.db'))
+    if not cache:
+        os.environ['SEARCH_CACHE_TTL'] = '0'
+        os.environ['CATALOG_TTL'] = '0'
+        os.environ['CATALOG_MAX_STALE'] = '0'
+        os.environ['LINKEDIN_CACHE_TTL'] = '0'
+
+    # Keep mock email and per-request server logs out of the report
+    import logging
+    logging.getLogger('utils.email').setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    from app import app
+    return app
+
+
+class InProcessClient:
+    """Virtual user calling the app through Flask's test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_data(as_text=True)
+
+    def post(self, path, data):
+        response = self.client.post(path, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class SocketClient:
+    """Virtual user sending real HTTP requests with its own cookie jar."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=120) as response:
+                return response.status, response.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, ''
+        except OSError:
+            return 0, ''
+
+    def get(self, path):
+        return self._open(urllib.request.Request(self.base_url + path))
+
+    def post(self, path, data):
+        body = urllib.parse.urlencode(data, doseq=True).encode('ascii')
+        return self._open(urllib.request.Request(self.base_url + path, data=body))
+
+
+class VirtualUser:
+    """
+    One simulated user.
+
+    Schedules only go out after the user has searched at least once, so
+    /schedule always sees experts in the session, as it would in practice.
+    """
+
+    def __init__(self, client, rng, index):
+        self.client = client
+        self.rng = rng
+        self.email = f"loadtest{index}@example.com"
+        self.expert_ids = []
+        self.last_action_id = 0
+
+    def search(self):
+        status, body = self.client.post('/search', {
+            'query': self.rng.choice(corpus.QUERIES),
+            'email': self.email
+        })
+        self.expert_ids = EXPERT_ID_PATTERN.findall(body)
+        return status
+
+    def schedule(self):
+        if not self.expert_ids:
+            self.search()
+        selected = self.rng.sample(self.expert_ids, min(len(self.expert_ids), 2))
+        status, _ = self.client.post('/schedule', {'expert_id': selected})
+        return status
+
+    def monitor(self):
+        status, _ = self.client.get('/monitor')
+        return status
+
+    def updates(self):
+        status, body = self.client.get(f'/api/monitor/updates?since={self.last_action_id}')
+        try:
+            actions = json.loads(body)
+        except ValueError:
+            actions = []
+        if actions:
+            self.last_action_id = max(self.last_action_id, max(action['id'] for action in actions))
+        return status
+
+    def run(self, route):
+        return getattr(self, route)()
+
+
+class Recorder:
+    """Thread-safe collection of per-route latencies."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+
+    def record(self, route, seconds, status):
+        with self.lock:
+            self.latencies[route].append(seconds)
+            if not 200 <= status < 400:
+                self.errors[route] += 1
+
+
+def parse_mix(mix):
+    """
+    Parse a scenario mix such as 'search=5,monitor=1'.
+
+    Args:
+        mix (str): Comma-separated route=weight pairs
+
+    Returns:
+        tuple: (routes, weights) for random.choices
+    """
+    routes, weights = [], []
+    for part in mix.split(','):
+        route, _, weight = part.partition('=')
+        route = route.strip()
+        if route not in ROUTES:
+            raise ValueError(f"Unknown route '{route}'; expected one of {', '.join(ROUTES)}")
+        routes.append(route)
+        weights.append(float(weight or 1))
+    return routes, weights
+
+
+def run_closed_loop(users, routes, weights, duration, think_time, recorder):
+    """
+    Each user issues its next request as soon as the previous one returns.
+
+    Args:
+        users (list): Virtual users, one thread each
+        routes (list): Routes in the mix
+        weights (list): Route weights
+        duration (float): Test length in seconds
+        think_time (float): Pause between a user's requests in seconds
+        recorder (Recorder): Latency recorder
+    """
+    deadline = time.perf_counter() + duration
+
+    def loop(user):
+        while time.perf_counter() < deadline:
+            route = user.rng.choices(routes, weights)[0]
+            started = time.perf_counter()
+            status = user.run(route)
+            recorder.record(route, time.perf_counter() - started, status)
+            if think_time:
+                time.sleep(user.rng.expovariate(1 / think_time))
+
+    threads = [threading.Thread(target=loop, args=(user,), daemon=True) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(users, routes, weights, duration, rate, poisson, recorder):
+    """
+    Requests arrive at a fixed rate regardless of how fast they complete.
+
+    Latency is measured from each request's scheduled arrival, so time spent
+    waiting for a free user counts against the app, as it would for a real
+    client.
+
+    Args:
+        users (list): Virtual users; their count caps requests in flight
+        routes (list): Routes in the mix
+        weights (list): Route weights
+        duration (float): Test length in seconds
+        rate (float): Arrivals per second
+        poisson (bool): Exponential inter-arrival times instead of constant
+        recorder (Recorder): Latency recorder
+    """
+    rng = random.Random(0)
+    idle = list(users)
+    idle_lock = threading.Lock()
+    available = threading.Semaphore(len(users))
+
+    def issue(route, arrival):
+        available.acquire()
+        with idle_lock:
+            user = idle.pop()
+        try:
+            status = user.run(route)
+            recorder.record(route, time.perf_counter() - arrival, status)
+        finally:
+            with idle_lock:
+                idle.append(user)
+            available.release()
+
+    started = time.perf_counter()
+    next_arrival = started
+    with ThreadPoolExecutor(max_workers=len(users) * 2) as executor:
+        while next_arrival < started + duration:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(issue, rng.choices(routes, weights)[0], next_arrival)
+            next_arrival += rng.expovariate(rate) if poisson else 1 / rate
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def report(recorder, elapsed):
+    """
+    Summarize recorded latencies.
+
+    Args:
+        recorder (Recorder): Latency recorder
+        elapsed (float): Wall-clock test length in seconds
+
+    Returns:
+        dict: Per-route count, errors, throughput and latency percentiles in ms
+    """
+    summary = {}
+    for route in ROUTES:
+        values = sorted(recorder.latencies[route])
+        if not values:
+            continue
+        summary[route] = {
+            'requests': len(values),
+            'errors': recorder.errors[route],
+            'throughput_rps': len(values) / elapsed,
+            'mean_ms': statistics.mean(values) * 1000,
+            'p50_ms': percentile(values, 0.5) * 1000,
+            'p90_ms': percentile(values, 0.9) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'max_ms': values[-1] * 1000
+        }
+    return summary
+
+
+def print_report(summary, elapsed):
+    """Print a report table."""
+    header = f"{'route':<10} {'reqs':>7} {'errs':>5} {'rps':>8} {'p50':>9} {'p90':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+    print(header)
+    print('-' * len(header))
+    total = 0
+    for route, row in summary.items():
+        total += row['requests']
+        print(f"{route:<10} {row['requests']:>7} {row['errors']:>5} {row['throughput_rps']:>8.1f} "
+              f"{row['p50_ms']:>7.1f}ms {row['p90_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms "
+              f"{row['p99_ms']:>7.1f}ms {row['max_ms']:>7.1f}ms")
+    print(f"total: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=('inprocess', 'socket'), default='inprocess')
+    parser.add_argument('--url', help='base URL of a running server (socket mode)')
+    parser.add_argument('--serve', action='store_true',
+                        help='start a threaded local server for socket mode')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--concurrency', type=int, default=8, help='number of virtual users')
+    parser.add_argument('--duration', type=float, default=10.0, help='test length in seconds')
+    parser.add_argument('--rate', type=float,
+                        help='open-loop arrivals per second (closed loop if omitted)')
+    parser.add_argument('--poisson', action='store_true', help='Poisson arrivals in open loop')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='mean pause between requests per user in closed loop')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='route weights, e.g. search=5,monitor=1')
+    parser.add_argument('--provider-delay', type=float, default=1.5,
+                        help='simulated mock provider latency in seconds')
+    parser.add_argument('--no-cache', action='store_true', help='disable the search result cache, catalog and provider cache')
+    parser.add_argument('--output', help='write the report to this JSON file')
+    args = parser.parse_args()
+
+    try:
+        routes, weights = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = None
+    if args.mode == 'inprocess':
+        app = load_app(args.provider_delay, not args.no_cache)
+        make_client = lambda: InProcessClient(app)
+    else:
+        base_url = args.url
+        if args.serve:
+            from werkzeug.serving import make_server
+            app = load_app(args.provider_delay, not args.no_cache)
+            server = make_server('127.0.0.1', args.port, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{args.port}"
+        if not base_url:
+            parser.error('socket mode needs --url or --serve')
+        make_client = lambda: SocketClient(base_url)
+
+    users = [VirtualUser(make_client(), random.Random(i), i) for i in range(args.concurrency)]
+    recorder = Recorder()
+
+    started = time.perf_counter()
+    if args.rate:
+        run_open_loop(users, routes, weights, args.duration, args.rate, args.poisson, recorder)
+    else:
+        run_closed_loop(users, routes, weights, args.duration, args.think_time, recorder)
+    elapsed = time.perf_counter() - started
+
+    if server is not None:
+        server.shutdown()
+
+    summary = report(recorder, elapsed)
+    print_report(summary, elapsed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'elapsed_s': elapsed, 'routes': summary}, f, indent=2)
+
+    if any(row['errors'] for row in summary.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
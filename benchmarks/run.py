@@ -0,0 +1,313 @@
+"""
+Benchmark Runner
+
+Times the search, ranking, persistence and monitor hot paths over synthetic
+corpora and optionally compares the run against a stored baseline.
+
+Usage:
+    python -m benchmarks.run --scales 100 10000 --output bench.json
+    python -m benchmarks.run --baseline bench.json --threshold 0.25
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks import corpus
+
+# Registered benchmark cases, in run order
+CASES = {}
+
+
+def case(name):
+    """Register a benchmark case."""
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+
+def fresh_db(workdir, name):
+    """
+    Point the db and monitor modules at a new, initialized database.
+
+    Args:
+        workdir (str): Directory for database files
+        name (str): Database file name
+
+    Returns:
+        str: Database file path
+    """
+    from utils import db, monitor
+    db_file = os.path.join(workdir, name)
+    if os.path.exists(db_file):
+        os.remove(db_file)
+    db.DB_FILE = db_file
+    monitor.DB_FILE = db_file
+    monitor.reset_dashboard()
+    db.init_db()
+    return db_file
+
+
+@case('rank_experts')
+def bench_rank_experts(scale, ctx):
+    from utils import nlp
+    experts = corpus.make_experts(scale)
+    query = corpus.QUERIES[0]
+    return scale, lambda: nlp.rank_experts(experts, query)
+
+
+@case('calculate_relevance_score')
+def bench_calculate_relevance_score(scale, ctx):
+    from utils import nlp
+    experts = corpus.make_experts(scale)
+    query_tokens = nlp.preprocess_text(corpus.QUERIES[0])
+
+    def run():
+        for expert in experts:
+            nlp.calculate_relevance_score(expert, query_tokens)
+    return scale, run
+
+
+@case('analyze_expertise_match')
+def bench_analyze_expertise_match(scale, ctx):
+    from utils import nlp
+    experts = corpus.make_experts(scale)
+    query = corpus.QUERIES[0]
+
+    def run():
+        for expert in experts:
+            nlp.analyze_expertise_match(expert, query)
+    return scale, run
+
+
+@case('analyze_expertise_matches')
+def bench_analyze_expertise_matches(scale, ctx):
+    from utils import nlp
+    experts = corpus.make_experts(scale)
+    for i, expert in enumerate(experts):
+        expert['etag'] = f"bench-etag-{i}"
+    query = corpus.QUERIES[0]
+    return scale, lambda: nlp.analyze_expertise_matches(experts, query)
+
+
+@case('store_expert')
+def bench_store_expert(scale, ctx):
+    from utils import db
+    count = min(scale, ctx['max_writes'])
+    experts = corpus.make_experts(count)
+
+    def run():
+        fresh_db(ctx['workdir'], 'store_expert.db')
+        for expert in experts:
+            db.store_expert(expert)
+    return count, run
+
+
+@case('search_local_experts')
+def bench_search_local_experts(scale, ctx):
+    from utils import db
+    db_file = fresh_db(ctx['workdir'], 'search_local.db')
+
+    # Insert through executemany so the triggers index the rows
+    rows = [(e['id'], e['name'], e['title'], e['company'], e['location'], e['profile_url'], json.dumps(e))
+            for e in corpus.make_experts(scale)]
+    conn = sqlite3.connect(db_file)
+    conn.executemany('INSERT INTO experts (id, name, title, company, location, profile_url, details) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+    def run():
+        for query in corpus.QUERIES:
+            db.search_local_experts(query)
+    return len(corpus.QUERIES), run
+
+
+@case('log_action')
+def bench_log_action(scale, ctx):
+    from utils import monitor
+    count = min(scale, ctx['max_writes'])
+    rng = random.Random(0)
+    actions = [corpus.make_action(rng, i) for i in range(count)]
+
+    def run():
+        fresh_db(ctx['workdir'], 'log_action.db')
+        for action_type, details in actions:
+            monitor.log_action(action_type, details)
+    return count, run
+
+
+def _populate_actions(scale, ctx):
+    """Fill a fresh monitor database with actions from the last three days."""
+    db_file = fresh_db(ctx['workdir'], 'monitor.db')
+
+    # Pre-populate the actions table directly; it is not what's being timed
+    rng = random.Random(0)
+    now = datetime.datetime.now()
+    rows = []
+    for i in range(scale):
+        action_type, details = corpus.make_action(rng, i)
+        timestamp = now - datetime.timedelta(seconds=rng.randint(0, 3 * 86400))
+        rows.append((action_type, json.dumps(details), timestamp.strftime('%Y-%m-%d %H:%M:%S')))
+    conn = sqlite3.connect(db_file)
+    conn.executemany('INSERT INTO actions (action_type, details, timestamp) VALUES (?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+
+@case('get_monitor_data')
+def bench_get_monitor_data(scale, ctx):
+    from utils import monitor
+    _populate_actions(scale, ctx)
+
+    reads = 20
+
+    def run():
+        for _ in range(reads):
+            monitor.get_monitor_data()
+    return reads, run
+
+
+@case('get_monitor_data_uncached')
+def bench_get_monitor_data_uncached(scale, ctx):
+    from utils import monitor
+    _populate_actions(scale, ctx)
+
+    reads = 20
+
+    def run():
+        ttl, monitor.MONITOR_CACHE_TTL = monitor.MONITOR_CACHE_TTL, 0
+        try:
+            for _ in range(reads):
+                monitor.get_monitor_data()
+        finally:
+            monitor.MONITOR_CACHE_TTL = ttl
+    return reads, run
+
+
+def measure(func, repeat):
+    """
+    Time a function several times.
+
+    Args:
+        func (callable): Function to time
+        repeat (int): Number of runs
+
+    Returns:
+        list: Wall-clock seconds per run
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def run_suite(scales, names, repeat, max_writes):
+    """
+    Run the selected benchmark cases at each scale.
+
+    Args:
+        scales (list): Corpus sizes
+        names (list): Case names to run
+        repeat (int): Runs per case
+        max_writes (int): Cap on rows written by write benchmarks
+
+    Returns:
+        dict: Results keyed by 'case[scale]'
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        ctx = {'workdir': workdir, 'max_writes': max_writes}
+        for scale in scales:
+            for name in names:
+                ops, func = CASES[name](scale, ctx)
+                timings = measure(func, repeat)
+                best = min(timings)
+                key = f"{name}[{scale}]"
+                results[key] = {
+                    'ops': ops,
+                    'best_s': best,
+                    'median_s': statistics.median(timings),
+                    'ops_per_s': ops / best if best else None
+                }
+                print(f"{key:<40} {best * 1000:>10.2f} ms  {ops / best if best else 0:>12.0f} ops/s",
+                      flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results against a baseline run.
+
+    Args:
+        results (dict): Current results
+        baseline (dict): Baseline results
+        threshold (float): Allowed relative slowdown, e.g. 0.25 for 25%
+
+    Returns:
+        list: Keys that regressed beyond the threshold
+    """
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous or not previous['best_s']:
+            continue
+        ratio = current['best_s'] / previous['best_s']
+        marker = ''
+        if ratio > 1 + threshold:
+            regressions.append(key)
+            marker = '  REGRESSION'
+        print(f"{key:<40} {ratio:>6.2f}x baseline{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[100, 10000])
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-writes', type=int, default=10000,
+                        help='cap on rows written by store_expert and log_action')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare against a previous results file')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative slowdown counted as a regression')
+    args = parser.parse_args()
+
+    results = run_suite(args.scales, args.cases, args.repeat, args.max_writes)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'created_at': datetime.datetime.now().isoformat(),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'scales': args.scales,
+                    'repeat': args.repeat
+                },
+                'results': results
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
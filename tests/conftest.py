@@ -0,0 +1,81 @@
+"""
+Test configuration.
+
+NLTK data isn't available offline, so its tokenizer, stopword list and
+lemmatizer are replaced with small stand-ins before the utils modules are
+imported. Each test gets its own database, shared cache and snapshot
+directories, and starts with empty per-process caches.
+"""
+
+import os
+import pytest
+import nltk
+import nltk.corpus
+import nltk.data
+import nltk.stem
+import nltk.tokenize
+
+os.environ.setdefault('USE_MOCK_LINKEDIN', 'True')
+os.environ.setdefault('USE_MOCK_EMAIL', 'True')
+os.environ.setdefault('MOCK_SEARCH_DELAY', '0')
+
+
+class _Stopwords:
+    def words(self, language):
+        return ['a', 'an', 'and', 'for', 'i', 'in', 'need', 'of', 'on', 'the', 'to', 'with']
+
+
+class _Lemmatizer:
+    def lemmatize(self, token):
+        return token[:-1] if token.endswith('s') and len(token) > 3 else token
+
+
+nltk.data.find = lambda *args, **kwargs: True
+nltk.tokenize.word_tokenize = str.split
+nltk.corpus.stopwords = _Stopwords()
+nltk.stem.WordNetLemmatizer = _Lemmatizer
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """Point every module at files under the test's temporary directory."""
+    from utils import db, dedup, embeddings, monitor, popularity, scheduling, search, shared_cache, snapshot
+
+    db_file = str(tmp_path / 'julie.db')
+    monkeypatch.setattr(db, 'DB_FILE', db_file)
+    monkeypatch.setattr(monitor, 'DB_FILE', db_file)
+    monkeypatch.setattr(shared_cache, 'SHARED_CACHE_FILE', str(tmp_path / 'cache.db'))
+    # Deferred writes queued by an earlier test would land in this test's file
+    monkeypatch.setattr(shared_cache, '_pending', {})
+    monkeypatch.setattr(shared_cache, '_pending_count', 0)
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(snapshot, '_snapshot', None)
+    monkeypatch.setattr(snapshot, '_checked_at', 0.0)
+    monkeypatch.setattr(embeddings, 'EMBEDDINGS_DIR', str(tmp_path / 'embeddings'))
+    monkeypatch.setattr(embeddings, '_model', None)
+    monkeypatch.setattr(embeddings, '_model_path', None)
+    monkeypatch.setattr(embeddings, '_checked_at', 0.0)
+    monkeypatch.setattr(popularity, '_store', popularity.PopularityStore())
+    monkeypatch.setattr(scheduling, '_scheduler', None)
+    monkeypatch.setattr(dedup, '_index', None)
+    monkeypatch.setattr(dedup, '_aliases', {})
+    monkeypatch.setattr(dedup, '_last_rowid', 0)
+    monkeypatch.setattr(dedup, '_last_fetched_at', 0.0)
+    monkeypatch.setattr(dedup, '_last_alias_rowid', 0)
+    search.clear_cache()
+    db.init_db()
+    yield tmp_path
+    search.clear_cache()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Test client for the Flask app, with session files under the test's directory."""
+    from flask_session import Session
+    # Importing the app creates its session directory in the working directory
+    monkeypatch.chdir(tmp_path)
+    from app import app
+
+    app.config['SESSION_FILE_DIR'] = str(tmp_path / 'sessions')
+    Session(app)
+    return app.test_client()
@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+
+from utils import catalog, db, dedup
+
+
+def profile(expert_id, name, url, **fields):
+    expert = {'id': expert_id, 'name': name, 'title': 'Data Scientist', 'company': 'Acme',
+              'profile_url': url, 'skills': ['Python', 'Machine Learning']}
+    expert.update(fields)
+    return expert
+
+
+def rows(query, params=()):
+    conn = sqlite3.connect(db.DB_FILE)
+    try:
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_profile_urls_keep_non_tracking_parameters():
+    assert dedup.normalize_profile_url('https://www.LinkedIn.com/in/jane-doe/?trk=x&utm_source=mail') == \
+        dedup.normalize_profile_url('linkedin.com/in/jane-doe')
+    assert dedup.normalize_profile_url('https://example.com/profile?id=1&utm_medium=x') == 'example.com/profile?id=1'
+    assert dedup.normalize_profile_url('https://example.com/profile?id=1') != \
+        dedup.normalize_profile_url('https://example.com/profile?id=2')
+
+
+def test_refetched_profiles_are_reindexed():
+    catalog.store_profiles([profile('a', 'Jane Doe', 'https://example.com/a')], fetched_at=1000.0)
+    assert dedup.canonical_id(profile('x', 'Jane Doe', 'https://example.com/x')) == 'a'
+
+    # The same id now holds a different person
+    catalog.store_profiles([profile('a', 'Omar Haddad', 'https://example.com/a', company='Globex',
+                                    title='Patent Attorney', skills=['Patent Law'])], fetched_at=2000.0)
+    assert dedup.canonical_id(profile('y', 'Jane Doe', 'https://example.com/y')) == 'y'
+    assert dedup.canonical_id(profile('z', 'Omar Haddad', 'https://example.com/z', company='Globex',
+                                      title='Patent Attorney', skills=['Patent Law'])) == 'a'
+
+
+def test_rededupe_merges_references_and_popularity():
+    catalog.store_profiles([profile('a', 'Jane Doe', 'https://linkedin.com/in/jane'),
+                            profile('b', 'Jane Doe', 'https://www.linkedin.com/in/jane/?trk=feed')])
+    db.record_selections('u@example.com', ['a'], query='python developer')
+    db.record_selections('u@example.com', ['b'], query='python developer')
+
+    assert dedup.rededupe_catalog() == {'b': 'a'}
+
+    assert rows('SELECT id FROM experts') == [('a',)]
+    assert rows('SELECT DISTINCT expert_id FROM selections') == [('a',)]
+    assert rows('SELECT alias_id, canonical_id FROM expert_aliases') == [('b', 'a')]
+
+    (expert_id, score), = rows('SELECT expert_id, score FROM expert_popularity')
+    assert expert_id == 'a'
+    assert score == pytest.approx(2.0, rel=1e-3)
+    terms = rows('SELECT term, expert_id, score FROM term_popularity ORDER BY term')
+    assert terms
+    for term, expert_id, score in terms:
+        assert expert_id == 'a'
+        assert score == pytest.approx(2.0, rel=1e-3)
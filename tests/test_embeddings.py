@@ -0,0 +1,23 @@
+from benchmarks import corpus
+from utils import embeddings
+
+
+def test_get_model_switches_to_newly_published_version(monkeypatch):
+    assert embeddings.get_model() is None
+
+    experts = corpus.make_experts(20)
+    embeddings.fit(experts[:10]).save(embeddings.EMBEDDINGS_DIR)
+    # Within the check interval the worker keeps what it has
+    assert embeddings.get_model() is None
+
+    monkeypatch.setattr(embeddings, 'EMBEDDINGS_CHECK_INTERVAL', 0)
+    first = embeddings.get_model()
+    assert first.expert_ids == [e['id'] for e in experts[:10]]
+    assert embeddings.get_model() is first
+
+    embeddings.fit(experts).save(embeddings.EMBEDDINGS_DIR)
+    second = embeddings.get_model()
+    assert second is not first
+    assert len(second.expert_ids) == 20
+    # The old model stays usable by whoever still holds it
+    assert first.search(experts[0]['title'], k=3)
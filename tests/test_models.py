@@ -0,0 +1,37 @@
+from benchmarks import corpus
+from utils import nlp
+from utils.models import ExpertBatch
+
+
+def test_top_k_keeps_ties_in_batch_order():
+    batch = ExpertBatch([{'id': str(i)} for i in range(5)])
+    batch.scores[1] = batch.scores[3] = 0.5
+    batch.scores[4] = 0.9
+
+    assert batch.top_k() == [4, 1, 3, 0, 2]
+    assert batch.top_k(3) == [4, 1, 3]
+
+    ranked = batch.ranked(batch.top_k(2))
+    assert [e['id'] for e in ranked] == ['4', '1']
+    assert ranked[0]['relevance_score'] == 0.9
+    assert 'relevance_score' not in batch.experts[0]
+
+
+def test_blend_updates_scores_in_place():
+    batch = ExpertBatch([{'id': 'a'}, {'id': 'b'}])
+    batch.blend(lambda score, value: score + value, [0.25, 0.5])
+    assert list(batch.scores) == [0.25, 0.5]
+
+
+def test_rank_experts_matches_per_expert_scoring():
+    experts = corpus.make_experts(300)
+    for query in corpus.QUERIES:
+        query_tokens = nlp.preprocess_text(query)
+        expected = sorted(((nlp.calculate_relevance_score(e, query_tokens), e['id']) for e in experts),
+                          key=lambda item: item[0], reverse=True)
+
+        ranked = nlp.rank_experts([dict(e) for e in experts], query)
+        assert [(e['relevance_score'], e['id']) for e in ranked] == expected
+
+        top = nlp.rank_experts([dict(e) for e in experts], query, k=10)
+        assert [(e['relevance_score'], e['id']) for e in top] == expected[:10]
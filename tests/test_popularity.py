@@ -0,0 +1,44 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from utils import async_db, db, popularity
+
+
+@pytest.fixture
+def store():
+    # Loaded, so selections are applied to it locally
+    return popularity.get_store()
+
+
+def test_rolled_back_selections_leave_the_store_alone(store, monkeypatch):
+    record = popularity.record_selection
+    calls = []
+
+    def failing(cursor, expert_id, query=None, now=None):
+        calls.append(expert_id)
+        rows = record(cursor, expert_id, query, now)
+        if len(calls) == 2:
+            raise sqlite3.OperationalError('disk I/O error')
+        return rows
+
+    monkeypatch.setattr(popularity, 'record_selection', failing)
+    with pytest.raises(sqlite3.OperationalError):
+        db.record_selections('u@example.com', ['a', 'b'], query='python developer')
+
+    assert calls == ['a', 'b']
+    assert store.experts == {}
+    assert store.terms == {}
+    conn = sqlite3.connect(db.DB_FILE)
+    assert conn.execute('SELECT COUNT(*) FROM expert_popularity').fetchone()[0] == 0
+    conn.close()
+
+
+def test_committed_selections_are_applied(store):
+    db.record_selections('u@example.com', ['a'], query='python developer')
+    assert store.experts['a'][0] == pytest.approx(1.0)
+    assert all('a' in experts for experts in store.terms.values())
+
+    asyncio.run(async_db.record_selections('u@example.com', ['b'], query='python developer'))
+    assert store.experts['b'][0] == pytest.approx(1.0)
@@ -0,0 +1,45 @@
+import pytest
+
+from benchmarks import corpus
+from utils import catalog, db, nlp, ranking_pool
+
+QUERY = 'senior python developer'
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(ranking_pool, 'RANKING_POOL_THRESHOLD', 1)
+    monkeypatch.setattr(ranking_pool, 'RANKING_POOL_SIZE', 2)
+    ranking_pool.shutdown()
+    yield
+    ranking_pool.shutdown()
+
+
+def ranking(rank, experts, k):
+    return [(e['id'], e['relevance_score']) for e in rank([dict(e) for e in experts], QUERY, k=k)]
+
+
+def assert_parity(experts):
+    for k in (5, None):
+        assert ranking(ranking_pool.rank_experts, experts, k) == ranking(nlp.rank_experts, experts, k)
+
+
+def test_pool_matches_in_process_ranking_after_profile_updates(pool):
+    experts = corpus.make_experts(60)
+    catalog.store_profiles([dict(e) for e in experts])
+    before = db.get_all_experts()
+    assert all(e.get('etag') for e in before)
+    assert_parity(before)
+
+    # Rewrite some profiles so they now match the query; the pool has
+    # already indexed their previous versions
+    for expert in experts[::7]:
+        expert['title'] = 'Senior Python Developer'
+        expert['skills'] = ['Python', 'Django']
+    catalog.store_profiles([dict(e) for e in experts])
+    after = db.get_all_experts()
+    assert_parity(after)
+    assert {e['id'] for e in experts[::7]} <= {i for i, _ in ranking(ranking_pool.rank_experts, after, 9)}
+
+    # Candidates read before the update are scored from their own fields
+    assert_parity(before)
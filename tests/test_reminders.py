@@ -0,0 +1,93 @@
+import datetime
+import sqlite3
+import pytest
+from utils import db, email, reminders, scheduling
+
+START = datetime.datetime(2026, 10, 19, 9, 0)
+
+
+def test_timer_wheel_fires_in_order_and_skips_cancelled():
+    now = 1_000_000.0
+    wheel = reminders.TimerWheel(resolution=1.0, bits=2, levels=3, start=now)
+    wheel.schedule('soon', now + 2, 'a')
+    wheel.schedule('later', now + 40, 'b')
+    # Beyond the top level; parked and re-placed while cascading
+    wheel.schedule('far', now + 500, 'c')
+    wheel.schedule('cancelled', now + 3, 'd')
+    wheel.cancel('cancelled')
+
+    assert wheel.advance(now + 1) == []
+    assert wheel.advance(now + 3) == [('soon', 'a')]
+    assert wheel.advance(now + 39) == []
+    assert wheel.advance(now + 40) == [('later', 'b')]
+    assert wheel.advance(now + 499) == []
+    assert wheel.advance(now + 500) == [('far', 'c')]
+    assert len(wheel) == 0
+
+
+def test_timer_wheel_fires_overdue_timers_on_next_tick():
+    now = 1_000_000.0
+    wheel = reminders.TimerWheel(start=now)
+    wheel.schedule('overdue', now - 60, 'x')
+    assert wheel.advance(now + 1) == [('overdue', 'x')]
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    calls = []
+    monkeypatch.setattr(email, 'send_schedule_reminder_email',
+                        lambda user_email, expert, scheduled_time, duration: calls.append(scheduled_time) or True)
+    return calls
+
+
+def _status(schedule_id):
+    conn = sqlite3.connect(db.DB_FILE)
+    status = conn.execute('SELECT status FROM schedules WHERE id = ?', (schedule_id,)).fetchone()[0]
+    conn.close()
+    return status
+
+
+def test_dispatcher_reminds_then_completes(sent):
+    lead = datetime.timedelta(minutes=reminders.REMINDER_LEAD_MINUTES)
+    dispatcher = reminders.ReminderDispatcher(now=(START - 2 * lead).timestamp())
+    schedule_id = scheduling.Scheduler().book('user@example.com', 'expert-1', START, 30)
+
+    dispatcher.tick((START - 2 * lead).timestamp())
+    assert sent == []
+    dispatcher.tick((START - lead).timestamp())
+    assert len(sent) == 1 and _status(schedule_id) == 'reminded'
+    dispatcher.tick((START + datetime.timedelta(minutes=30)).timestamp())
+    assert _status(schedule_id) == 'completed'
+
+
+def test_dispatcher_follows_calls_moved_by_another_worker(sent):
+    lead = datetime.timedelta(minutes=reminders.REMINDER_LEAD_MINUTES)
+    now = (START - 2 * lead).timestamp()
+    dispatcher = reminders.ReminderDispatcher(now=now)
+    schedule_id = scheduling.Scheduler().book('user@example.com', 'expert-1', START, 30)
+    dispatcher.tick(now)
+
+    moved = START + datetime.timedelta(hours=3)
+    conn = sqlite3.connect(db.DB_FILE)
+    conn.execute('UPDATE schedules SET scheduled_time = ? WHERE id = ?', (moved.isoformat(sep=' '), schedule_id))
+    conn.commit()
+    conn.close()
+
+    # Nothing fires at the old reminder time
+    dispatcher.tick((START - lead).timestamp())
+    assert sent == [] and _status(schedule_id) == 'pending'
+    dispatcher.tick((moved - lead).timestamp())
+    assert len(sent) == 1 and _status(schedule_id) == 'reminded'
+
+
+def test_dispatcher_drops_calls_cancelled_elsewhere(sent):
+    lead = datetime.timedelta(minutes=reminders.REMINDER_LEAD_MINUTES)
+    now = (START - 2 * lead).timestamp()
+    dispatcher = reminders.ReminderDispatcher(now=now)
+    schedule_id = scheduling.Scheduler().book('user@example.com', 'expert-1', START, 30)
+    dispatcher.tick(now)
+
+    scheduling.Scheduler().cancel(schedule_id)
+    dispatcher.tick((START - lead).timestamp())
+    assert ('remind', schedule_id) not in dispatcher.wheel
+    assert sent == []
@@ -0,0 +1,75 @@
+import datetime
+import sqlite3
+import pytest
+from utils import db, scheduling
+
+# A Monday
+MONDAY = datetime.datetime(2026, 10, 19, 9, 0)
+
+
+def test_book_rejects_overlapping_calls():
+    scheduler = scheduling.Scheduler()
+    scheduler.book('user@example.com', 'expert-1', MONDAY, 60)
+
+    with pytest.raises(scheduling.SchedulingConflict) as raised:
+        scheduler.book('other@example.com', 'expert-1', MONDAY + datetime.timedelta(minutes=30), 30)
+    assert raised.value.conflicts[0]['participant'] == 'expert'
+
+    # Back-to-back calls don't overlap
+    scheduler.book('other@example.com', 'expert-1', MONDAY + datetime.timedelta(minutes=60), 30)
+
+
+def test_cancelled_booking_frees_the_slot():
+    scheduler = scheduling.Scheduler()
+    schedule_id = scheduler.book('user@example.com', 'expert-1', MONDAY, 30)
+    scheduler.cancel(schedule_id)
+    scheduler.book('other@example.com', 'expert-1', MONDAY, 30)
+
+
+def test_status_change_by_another_worker_is_picked_up():
+    first = scheduling.Scheduler()
+    second = scheduling.Scheduler()
+    schedule_id = first.book('user@example.com', 'expert-1', MONDAY, 30)
+    assert second.check_conflicts('other@example.com', ['expert-1'], MONDAY, 30)
+
+    conn = sqlite3.connect(db.DB_FILE)
+    conn.execute("UPDATE schedules SET status = 'cancelled' WHERE id = ?", (schedule_id,))
+    conn.commit()
+    conn.close()
+
+    assert second.check_conflicts('other@example.com', ['expert-1'], MONDAY, 30) == []
+
+
+def test_free_slots_skip_bookings_and_business_hours():
+    scheduler = scheduling.Scheduler()
+    scheduler.book('user@example.com', 'expert-1', MONDAY, 60)
+    scheduler.book('user@example.com', 'expert-2', MONDAY + datetime.timedelta(hours=7, minutes=30), 30)
+
+    slots = scheduler.find_free_slots('user@example.com', ['expert-1', 'expert-2'], 60, k=8, start=MONDAY)
+
+    starts = [start for start, _ in slots]
+    assert starts[0] == MONDAY + datetime.timedelta(hours=1)
+    # The 16:30 booking leaves no hour at the end of Monday; Tuesday starts at 9:00
+    assert MONDAY.replace(hour=16) not in starts
+    assert MONDAY + datetime.timedelta(days=1) in starts
+    for start, end in slots:
+        assert scheduling.BUSINESS_HOURS_START <= start.hour and end.hour <= scheduling.BUSINESS_HOURS_END
+        assert start.weekday() < 5
+
+
+def test_calls_longer_than_business_hours_are_rejected():
+    scheduler = scheduling.Scheduler()
+    business_minutes = (scheduling.BUSINESS_HOURS_END - scheduling.BUSINESS_HOURS_START) * 60
+
+    with pytest.raises(ValueError):
+        scheduler.find_free_slots('user@example.com', ['expert-1'], business_minutes + 1, start=MONDAY)
+    with pytest.raises(ValueError):
+        scheduler.book('user@example.com', 'expert-1', MONDAY, business_minutes + 1)
+
+    slots = scheduler.find_free_slots('user@example.com', ['expert-1'], business_minutes, k=2, start=MONDAY)
+    assert slots[0] == (MONDAY, MONDAY + datetime.timedelta(minutes=business_minutes))
+
+
+def test_align_stops_at_the_limit():
+    limit = MONDAY + datetime.timedelta(days=3)
+    assert scheduling._align(MONDAY, datetime.timedelta(hours=20), 15, limit) >= limit
@@ -0,0 +1,71 @@
+from utils import db, search
+
+INTERNAL = {'details', 'created_at', 'fetched_at', 'etag'}
+
+
+def test_etag_revalidation_returns_304(client):
+    response = client.get('/api/search?q=python developer&limit=5')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    revalidated = client.get('/api/search?q=Python  Developer&limit=5', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == etag
+
+    # A different page has a different tag
+    other = client.get('/api/search?q=python developer&limit=5&offset=5', headers={'If-None-Match': etag})
+    assert other.status_code == 200
+    assert other.headers['ETag'] != etag
+
+
+def test_results_leave_out_stored_columns(client):
+    # The first search stores the provider profiles; the second also finds them locally
+    client.get('/api/search?q=python developer')
+    search.clear_cache()
+    assert db.search_local_experts('python developer')
+    payload = client.get('/api/search?q=python developer').get_json()
+
+    assert payload['experts']
+    for expert in payload['experts']:
+        assert not INTERNAL & set(expert)
+
+
+def test_stored_experts_drop_details_json():
+    db.store_expert({'id': 'x1', 'name': 'Ada', 'title': 'Engineer', 'profile_url': 'https://example.com/ada',
+                     'skills': ['Python']})
+    expert = db.get_expert('x1')
+    assert expert['skills'] == ['Python']
+    assert 'details' not in expert
+    assert 'details' not in db.search_local_experts('python')[0]
+
+
+def test_cursor_pages_walk_the_cached_ranking(client):
+    first = client.get('/api/search?q=python developer&limit=1').get_json()
+    assert first['prev_cursor'] is None and first['next_cursor']
+
+    second = client.get(f"/api/search?cursor={first['next_cursor']}&limit=1").get_json()
+    assert second['offset'] == 1
+    assert second['query'] == first['query']
+    assert {e['id'] for e in first['experts']}.isdisjoint(e['id'] for e in second['experts'])
+
+    back = client.get(f"/api/search?cursor={second['prev_cursor']}&limit=1").get_json()
+    assert back['experts'] == first['experts']
+
+
+def test_cursor_round_trip():
+    entry = {'query': 'python developer', 'version': 'abc123'}
+    assert search.decode_cursor(search.encode_cursor(entry, 20)) == ('python developer', 'abc123', 20)
+
+
+def test_malformed_cursors_are_rejected(client):
+    import base64
+    import json
+
+    def encode(payload):
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+    for cursor in ('not-a-cursor', encode({'q': 'x', 'v': 'y'}), encode({'q': ['x'], 'v': 'y', 'o': 0}),
+                   encode({'q': 'x', 'v': 1, 'o': 0}), encode({'q': 'x', 'v': 'y', 'o': 'z'})):
+        assert search.decode_cursor(cursor) is None
+        assert client.get(f'/api/search?cursor={cursor}').status_code == 400
+        assert client.get(f'/search?cursor={cursor}').status_code == 302
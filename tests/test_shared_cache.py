@@ -0,0 +1,60 @@
+import sqlite3
+from types import SimpleNamespace
+
+from utils import shared_cache
+
+
+def entry_keys(namespace):
+    conn = sqlite3.connect(shared_cache.SHARED_CACHE_FILE)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM cache_entries WHERE namespace = ?', (namespace,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_namespace_is_evicted_least_recently_used_first(monkeypatch):
+    monkeypatch.setattr(shared_cache, 'SHARED_CACHE_BUDGET', 2000)
+    monkeypatch.setattr(shared_cache, 'SHARED_CACHE_TOUCH_INTERVAL', 0)
+    monkeypatch.setattr(shared_cache, 'SHARED_CACHE_COMPRESS_MIN', 1 << 20)
+    # A clock of its own, so access times are distinct
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(shared_cache, 'time', SimpleNamespace(time=lambda: float(next(clock))))
+
+    for i in range(10):
+        shared_cache.set('lru', f'k{i}', 'x' * 150)
+    # Reading k0 makes it the most recently used
+    assert shared_cache.get('lru', 'k0') == 'x' * 150
+    for i in range(10, 20):
+        shared_cache.set('lru', f'k{i}', 'x' * 150)
+
+    stats = shared_cache.get_stats()['lru']
+    assert stats['bytes'] <= 2000
+    assert stats['entries'] == entry_keys('lru') < 20
+    assert shared_cache.get('lru', 'k0') is not None
+    assert shared_cache.get('lru', 'k1') is None
+    assert shared_cache.get('lru', 'k19') is not None
+
+
+def test_expired_entries_miss():
+    shared_cache.set('ttl', 'gone', 1, ttl=-1)
+    shared_cache.set('ttl', 'kept', 2, ttl=60)
+    assert shared_cache.get_many('ttl', ['gone', 'kept']) == {'kept': 2}
+
+
+def test_corrupt_entries_miss_and_bad_values_are_dropped():
+    shared_cache.set_many('bad', {'a': [1, 2], 'b': 'fine'})
+    conn = sqlite3.connect(shared_cache.SHARED_CACHE_FILE)
+    conn.execute("UPDATE cache_entries SET value = ? WHERE namespace = 'bad' AND key = ?",
+                 (b'z-not-zlib', shared_cache._key('a')))
+    conn.commit()
+    conn.close()
+    assert shared_cache.get_many('bad', ['a', 'b']) == {'b': 'fine'}
+
+    shared_cache.set_many('bad', {'c': object(), 'd': 4})
+    assert shared_cache.get_many('bad', ['c', 'd']) == {'d': 4}
+
+
+def test_deferred_writes_are_stored_on_flush():
+    shared_cache.set_many_deferred('later', {'a': 1, 'b': [2]})
+    shared_cache.flush()
+    assert shared_cache.get_many('later', ['a', 'b']) == {'a': 1, 'b': [2]}
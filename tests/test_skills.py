@@ -0,0 +1,50 @@
+from benchmarks import corpus
+from utils import nlp, skills
+
+
+def naive_match(expert, query):
+    tokens = nlp.preprocess_text(query)
+    fields = [edu.get('field', '') for edu in expert.get('education', [])]
+    return {
+        'skill_matches': [s for s in expert.get('skills', []) if any(t in s.lower() for t in tokens)],
+        'education_matches': [f for f in fields if any(t in f.lower() for t in tokens)],
+    }
+
+
+def test_matches_agree_with_substring_scan():
+    experts = corpus.make_experts(200)
+    for i, expert in enumerate(experts):
+        expert['etag'] = f"etag-{i}"
+
+    for query in corpus.make_queries(10):
+        bulk = nlp.analyze_expertise_matches(experts, query)
+        for expert, result in zip(experts, bulk):
+            expected = naive_match(expert, query)
+            assert result['skill_matches'] == expected['skill_matches']
+            assert result['education_matches'] == expected['education_matches']
+            single = nlp.analyze_expertise_match(expert, query)
+            assert single['skill_matches'] == expected['skill_matches']
+
+
+def test_vocabulary_is_replaced_when_full(monkeypatch):
+    monkeypatch.setattr(skills, '_vocabulary', skills.Vocabulary())
+    monkeypatch.setattr(skills, 'SKILL_VOCABULARY_SIZE', 3)
+
+    vocabulary = skills.get_vocabulary()
+    vocabulary.terms_bitset(['Python', 'Java', 'Rust'])
+    assert skills.get_vocabulary() is not vocabulary
+    assert len(skills.get_vocabulary()) == 0
+
+    # The old vocabulary stays usable by whoever still holds it
+    assert vocabulary.matching_terms(['Java', 'Go'], vocabulary.query_bitset(['java'])) == ['Java']
+
+
+def test_expert_bitsets_follow_etag():
+    vocabulary = skills.Vocabulary()
+    expert = {'id': 'e1', 'etag': 'v1', 'skills': ['Python'], 'education': []}
+    first = vocabulary.expert_bitsets(expert)
+    assert vocabulary.expert_bitsets(dict(expert, skills=['Java'])) == first
+
+    updated = vocabulary.expert_bitsets(dict(expert, etag='v2', skills=['Java']))
+    assert updated != first
+    assert updated[0] & vocabulary.query_bitset(['java'])
@@ -0,0 +1,285 @@
+"""
+Admission Control Module
+
+This module bounds how many expensive requests (searches) a worker runs at
+once, so a traffic spike is turned away quickly instead of queueing until
+the server's timeout kills it.
+
+The concurrency limit adapts with AIMD: it grows by about one per limit's
+worth of requests finishing under ADMISSION_TARGET_LATENCY, and is cut by
+ADMISSION_BACKOFF when requests finish slower than that or fail. Requests
+over the limit wait in a bounded priority queue, where cheaper routes go
+first. A full queue answers 429, and a request that waits longer than
+ADMISSION_QUEUE_TIMEOUT answers 503, both with a Retry-After header.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Whether admission control is applied
+ENABLED = os.getenv('ADMISSION_ENABLED', 'True').lower() in ('true', '1', 't')
+
+# Concurrency limit bounds and starting point, per worker
+ADMISSION_MIN_LIMIT = int(os.getenv('ADMISSION_MIN_LIMIT', 1))
+ADMISSION_MAX_LIMIT = int(os.getenv('ADMISSION_MAX_LIMIT', 64))
+ADMISSION_INITIAL_LIMIT = int(os.getenv('ADMISSION_INITIAL_LIMIT', 8))
+
+# Latency above which the limit is decreased, in seconds
+ADMISSION_TARGET_LATENCY = float(os.getenv('ADMISSION_TARGET_LATENCY', 3.0))
+
+# Multiplicative decrease factor, applied at most once per target latency
+ADMISSION_BACKOFF = float(os.getenv('ADMISSION_BACKOFF', 0.7))
+
+# Waiting requests per worker, and how long one may wait, in seconds
+ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', 32))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 2.0))
+
+# Admission priority per endpoint; lower goes first. Endpoints not listed
+# are cheap and never held back.
+ROUTE_PRIORITIES = {
+    'monitor_view': 0,
+    'schedule': 1,
+    'search': 2,
+    'api_search': 2,
+    'api_search_batch': 3,
+    # Async routes served by asgi.py
+    'api_schedule': 1,
+}
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted."""
+
+    def __init__(self, status, retry_after):
+        self.status = status
+        self.retry_after = retry_after
+        super().__init__(f"Request rejected with {status}")
+
+
+class AdmissionController:
+    """
+    AIMD concurrency limiter with a priority queue.
+
+    Args:
+        limit (int): Starting concurrency limit
+        min_limit (int): Lowest limit
+        max_limit (int): Highest limit
+        target_latency (float): Completion time above which the limit shrinks
+        queue_size (int): Maximum waiting requests
+        queue_timeout (float): Maximum wait in seconds
+    """
+
+    def __init__(self, limit=ADMISSION_INITIAL_LIMIT, min_limit=ADMISSION_MIN_LIMIT, max_limit=ADMISSION_MAX_LIMIT,
+                 target_latency=ADMISSION_TARGET_LATENCY, queue_size=ADMISSION_QUEUE_SIZE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiters = []
+        self.sequence = itertools.count()
+        self.last_decrease = 0.0
+        self.average_latency = None
+        self.admitted = 0
+        self.rejections = {}
+        self.condition = threading.Condition()
+
+    def _retry_after(self):
+        # Roughly how long until the current queue has drained
+        latency = self.average_latency or self.target_latency
+        return max(1, math.ceil(latency * (len(self.waiters) + 1) / max(self.limit, 1)))
+
+    def _reject(self, status, route):
+        key = (route, status)
+        self.rejections[key] = self.rejections.get(key, 0) + 1
+        raise Rejected(status, self._retry_after())
+
+    def acquire(self, priority=0, route=None):
+        """
+        Wait for a slot.
+
+        Args:
+            priority (int, optional): Lower values are admitted first
+            route (str, optional): Route name for the rejection counters
+
+        Returns:
+            float: Admission time, to pass to release
+
+        Raises:
+            Rejected: With status 429 if the queue is full, 503 on timeout
+        """
+        with self.condition:
+            if self.in_flight < int(self.limit) and not self.waiters:
+                self.in_flight += 1
+                self.admitted += 1
+                return time.perf_counter()
+
+            if len(self.waiters) >= self.queue_size:
+                self._reject(429, route)
+
+            entry = (priority, next(self.sequence))
+            heapq.heappush(self.waiters, entry)
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while not (self.waiters[0] == entry and self.in_flight < int(self.limit)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject(503, route)
+                    self.condition.wait(remaining)
+            finally:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                # Let the next waiter re-check now that the head changed
+                self.condition.notify_all()
+
+            self.in_flight += 1
+            self.admitted += 1
+            return time.perf_counter()
+
+    def release(self, started, failed=False):
+        """
+        Free a slot and adapt the limit to the request's latency.
+
+        Args:
+            started (float): Value returned by acquire
+            failed (bool, optional): Whether the request raised
+        """
+        latency = time.perf_counter() - started
+        with self.condition:
+            self.in_flight -= 1
+            if self.average_latency is None:
+                self.average_latency = latency
+            else:
+                self.average_latency = 0.9 * self.average_latency + 0.1 * latency
+
+            now = time.monotonic()
+            if failed or latency > self.target_latency:
+                # Decrease once per congestion episode, not once per slow request
+                if now - self.last_decrease > self.target_latency:
+                    self.limit = max(self.min_limit, self.limit * ADMISSION_BACKOFF)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+    def get_stats(self):
+        """
+        Get the current limit, load and counters.
+
+        Returns:
+            dict: limit, in_flight, queue_depth, admitted and rejections by
+                (route, status)
+        """
+        with self.condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'queue_depth': len(self.waiters),
+                'admitted': self.admitted,
+                'rejections': dict(self.rejections)
+            }
+
+
+_controller = AdmissionController()
+
+def priority_for(endpoint):
+    """
+    Get the admission priority of an endpoint.
+
+    Args:
+        endpoint (str): Flask endpoint name
+
+    Returns:
+        int: Priority, or None if the endpoint is never held back
+    """
+    return ROUTE_PRIORITIES.get(endpoint)
+
+def acquire(endpoint):
+    """
+    Admit a request to an endpoint.
+
+    Args:
+        endpoint (str): Flask endpoint name
+
+    Returns:
+        float: Token for release, or None if the endpoint isn't controlled
+
+    Raises:
+        Rejected: If the request should be turned away
+    """
+    priority = priority_for(endpoint)
+    if priority is None:
+        return None
+    return _controller.acquire(priority, endpoint)
+
+# Threads that wait for a slot on behalf of async requests, one per queue
+# place plus one, so waiters never hold the event loop's default executor
+_async_waiters = ThreadPoolExecutor(ADMISSION_QUEUE_SIZE + 1, thread_name_prefix='admission')
+
+async def acquire_async(endpoint):
+    """
+    Admit a request to an endpoint from the event loop.
+
+    Shares the worker's limit and queue with acquire; the wait happens on a
+    dedicated thread so the event loop keeps running.
+
+    Args:
+        endpoint (str): Endpoint name
+
+    Returns:
+        float: Token for release, or None if the endpoint isn't controlled
+
+    Raises:
+        Rejected: If the request should be turned away
+    """
+    if priority_for(endpoint) is None:
+        return None
+    return await asyncio.get_running_loop().run_in_executor(_async_waiters, acquire, endpoint)
+
+def release(token, failed=False):
+    """
+    Finish an admitted request.
+
+    Args:
+        token (float): Value returned by acquire
+        failed (bool, optional): Whether the request raised
+    """
+    if token is not None:
+        _controller.release(token, failed)
+
+def get_stats():
+    """
+    Get admission statistics for this worker.
+
+    Returns:
+        dict: Limit, in-flight requests, queue depth and counters
+    """
+    return _controller.get_stats()
+
+def render_prometheus():
+    """
+    Render admission gauges and counters in Prometheus text format.
+
+    Returns:
+        str: Metrics text
+    """
+    stats = get_stats()
+    lines = []
+    for name in ('limit', 'in_flight', 'queue_depth'):
+        lines.append(f"# TYPE julie_admission_{name} gauge")
+        lines.append(f"julie_admission_{name} {stats[name]}")
+    lines.append('# TYPE julie_admission_admitted_total counter')
+    lines.append(f"julie_admission_admitted_total {stats['admitted']}")
+    lines.append('# TYPE julie_admission_rejections_total counter')
+    for (route, status), count in sorted(stats['rejections'].items(), key=str):
+        lines.append(f'julie_admission_rejections_total{{route="{route}",status="{status}"}} {count}')
+    return '\n'.join(lines) + '\n'
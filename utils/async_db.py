@@ -0,0 +1,216 @@
+"""
+Async Database Module
+
+This module has aiosqlite versions of the database and monitoring functions
+used on the async request path (see asgi.py). They read and write the same
+tables as the db and monitor modules and return the same values, but wait
+for SQLite without blocking the event loop.
+
+As in the db module, each call opens its own connection.
+"""
+
+import datetime
+import json
+import aiosqlite
+from utils import db, monitor, popularity, tracing
+
+def _connect(path=None):
+    return aiosqlite.connect(path or db.DB_FILE, timeout=10)
+
+async def _user_id(conn, email):
+    async with conn.execute('SELECT id FROM users WHERE email = ?', (email,)) as cursor:
+        user = await cursor.fetchone()
+    if user:
+        return user[0]
+    cursor = await conn.execute('INSERT INTO users (email) VALUES (?)', (email,))
+    return cursor.lastrowid
+
+@tracing.traced('async_db.get_or_create_user')
+async def get_or_create_user(email):
+    """
+    Get a user by email or create if not exists.
+
+    Args:
+        email (str): User's email address
+
+    Returns:
+        int: User ID
+    """
+    async with _connect() as conn:
+        user_id = await _user_id(conn, email)
+        await conn.commit()
+    return user_id
+
+@tracing.traced('async_db.get_expert')
+async def get_expert(expert_id):
+    """
+    Get expert information from the database.
+
+    Args:
+        expert_id (str): Expert ID
+
+    Returns:
+        dict: Expert information, or None if not found
+    """
+    async with _connect() as conn:
+        conn.row_factory = aiosqlite.Row
+        async with conn.execute('''
+        SELECT * FROM experts WHERE id = COALESCE(
+            (SELECT canonical_id FROM expert_aliases WHERE alias_id = ?), ?)
+        ''', (expert_id, expert_id)) as cursor:
+            row = await cursor.fetchone()
+    return db._parse_expert(row) if row else None
+
+@tracing.traced('async_db.search_local_experts')
+async def search_local_experts(query, limit=20):
+    """
+    Search stored experts with the full-text index.
+
+    Args:
+        query (str): Search query
+        limit (int, optional): Maximum number of experts
+
+    Returns:
+        list: Expert dictionaries, best first, as from db.search_local_experts
+    """
+    expression = db._match_expression(query)
+    if expression is None:
+        return []
+
+    weights = ', '.join(str(weight) for weight in db.EXPERT_SEARCH_WEIGHTS)
+    async with _connect() as conn:
+        conn.row_factory = aiosqlite.Row
+        rows = await conn.execute_fetchall(f'''
+        SELECT experts.*, matches.rank
+        FROM (
+            SELECT rowid, bm25(experts_fts, {weights}) AS rank
+            FROM experts_fts
+            WHERE experts_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ) AS matches
+        JOIN experts ON experts.rowid = matches.rowid
+        ORDER BY matches.rank
+        ''', (expression, limit))
+
+    experts = []
+    for row in rows:
+        expert = db._parse_expert(row)
+        expert['bm25_score'] = -expert.pop('rank')
+        experts.append(expert)
+    return experts
+
+@tracing.traced('async_db.record_selections')
+async def record_selections(user_email, expert_ids, query=None):
+    """
+    Record a user's selection of several experts in one transaction.
+
+    Writes the same rows as db.record_selections: the user if new, the
+    query once, the selections and their popularity features. The experts'
+    stored details are left as they are.
+
+    Args:
+        user_email (str): User's email address
+        expert_ids (list): Selected expert IDs
+        query (str, optional): Search query; defaults to the user's most recent query
+
+    Returns:
+        list: Selection IDs
+    """
+    async with _connect() as conn:
+        await conn.execute('BEGIN IMMEDIATE')
+        user_id = await _user_id(conn, user_email)
+
+        if query:
+            cursor = await conn.execute('INSERT INTO queries (user_id, query) VALUES (?, ?)', (user_id, query))
+            query_id = cursor.lastrowid
+        else:
+            # Get the most recent query for this user
+            async with conn.execute('''
+            SELECT id, query FROM queries
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+            LIMIT 1
+            ''', (user_id,)) as cursor:
+                result = await cursor.fetchone()
+            query_id = result[0] if result else 0
+            query = result[1] if result else None
+
+        selection_ids = []
+        expert_rows, term_rows = [], []
+        for expert_id in expert_ids:
+            # Credit duplicates of a known expert to the canonical id
+            async with conn.execute('SELECT canonical_id FROM expert_aliases WHERE alias_id = ?',
+                                    (expert_id,)) as cursor:
+                alias = await cursor.fetchone()
+            if alias:
+                expert_id = alias[0]
+
+            cursor = await conn.execute('''
+            INSERT INTO selections (user_id, expert_id, query_id)
+            VALUES (?, ?, ?)
+            ''', (user_id, expert_id, query_id))
+            selection_ids.append(cursor.lastrowid)
+            rows = await popularity.record_selection_async(conn, expert_id, query)
+            expert_rows.extend(rows[0])
+            term_rows.extend(rows[1])
+        await conn.commit()
+    # Only committed selections reach this worker's popularity store
+    popularity.apply_local(expert_rows, term_rows)
+    return selection_ids
+
+@tracing.traced('async_db.log_action')
+async def log_action(action_type, details=None):
+    """
+    Log an action performed by Julie, as monitor.log_action does.
+
+    Args:
+        action_type (str): Type of action (e.g., 'search_initiated', 'search_completed')
+        details (dict, optional): Additional details about the action
+    """
+    details_json = json.dumps(details) if details else None
+    timestamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+    async with _connect(monitor.DB_FILE) as conn:
+        await conn.execute('''
+        CREATE TABLE IF NOT EXISTS actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action_type TEXT NOT NULL,
+            details TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        cursor = await conn.execute('''
+        INSERT INTO actions (action_type, details, timestamp)
+        VALUES (?, ?, ?)
+        ''', (action_type, details_json, timestamp))
+        action_id = cursor.lastrowid
+        await conn.commit()
+
+    monitor._patch_dashboard({
+        'id': action_id,
+        'action_type': action_type,
+        'details': details if details else None,
+        'timestamp': timestamp
+    })
+
+@tracing.traced('async_db.get_actions_since')
+async def get_actions_since(since_id=0):
+    """
+    Get actions since a specific ID.
+
+    Args:
+        since_id (int): Get actions with ID greater than this
+
+    Returns:
+        list: List of action dictionaries
+    """
+    async with _connect(monitor.DB_FILE) as conn:
+        conn.row_factory = aiosqlite.Row
+        rows = await conn.execute_fetchall('''
+        SELECT * FROM actions
+        WHERE id > ?
+        ORDER BY timestamp DESC
+        LIMIT 50
+        ''', (since_id,))
+    return [monitor._parse_action(row) for row in rows]
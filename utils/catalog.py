@@ -0,0 +1,326 @@
+"""
+Catalog Module
+
+This module puts a cache-through catalog in front of the expert provider.
+Provider results are stored in the experts table, with a fetch time and an
+ETag per profile, and the expert ids returned for each normalized query are
+kept in the catalog_queries table.
+
+Repeat queries are served from the catalog while younger than CATALOG_TTL.
+Older results, up to CATALOG_MAX_STALE, are still returned immediately while
+a single background refresh per query (across all workers) fetches new ones
+from the provider. Anything older, or never seen, is fetched synchronously.
+
+Provider calls go through the resilience module. When the provider is rate
+limited, open-circuited or failing, searches fall back to stored results of
+any age, or to the local full-text index.
+
+search_experts_async follows the same steps for the async request path.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from utils import db, dedup, linkedin, resilience, tracing
+
+logger = logging.getLogger(__name__)
+
+# How long provider results are served without refreshing, in seconds
+CATALOG_TTL = int(os.getenv('CATALOG_TTL', 86400))
+
+# How long stale results may still be served while refreshing, in seconds
+CATALOG_MAX_STALE = int(os.getenv('CATALOG_MAX_STALE', 7 * 86400))
+
+# A refresh claimed longer ago than this is assumed to have died, in seconds
+REFRESH_TIMEOUT = int(os.getenv('CATALOG_REFRESH_TIMEOUT', 60))
+
+# Fields that change on every fetch without the profile changing
+VOLATILE_FIELDS = ('timestamp', 'relevance_score', 'bm25_score', 'fetched_at', 'etag')
+
+def normalize_topic(query):
+    """
+    Normalize a query into a catalog key.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        str: Lowercased query with collapsed whitespace
+    """
+    return ' '.join((query or '').lower().split())
+
+def profile_etag(expert):
+    """
+    Get the version tag of a profile.
+
+    Uses the provider's ETag when it sends one, otherwise a hash of the
+    profile content.
+
+    Args:
+        expert (dict): Expert information
+
+    Returns:
+        str: ETag
+    """
+    if expert.get('etag'):
+        return expert['etag']
+    content = {key: value for key, value in expert.items() if key not in VOLATILE_FIELDS}
+    payload = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def store_profiles(experts, fetched_at=None):
+    """
+    Store provider profiles, rewriting only those whose ETag changed.
+
+    Args:
+        experts (list): Expert dictionaries from the provider
+        fetched_at (float, optional): Fetch time (defaults to now)
+
+    Returns:
+        int: Number of profiles inserted or changed
+    """
+    fetched_at = fetched_at or time.time()
+    rows = []
+    for expert in experts:
+        etag = profile_etag(expert)
+        # Lets the ranking pool look the stored profile up by id
+        expert['etag'] = etag
+        profile = {key: value for key, value in expert.items() if key not in VOLATILE_FIELDS}
+        rows.append((expert['id'], expert['name'], expert.get('title', ''), expert.get('company', ''),
+                     expert.get('location', ''), expert.get('profile_url', ''), json.dumps(profile),
+                     fetched_at, etag))
+
+    conn = sqlite3.connect(db.DB_FILE)
+    cursor = conn.cursor()
+    before = conn.total_changes
+    cursor.executemany('''
+    INSERT INTO experts (id, name, title, company, location, profile_url, details, fetched_at, etag)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        name = excluded.name, title = excluded.title, company = excluded.company,
+        location = excluded.location, profile_url = excluded.profile_url,
+        details = excluded.details, fetched_at = excluded.fetched_at, etag = excluded.etag
+    WHERE experts.etag IS NOT excluded.etag
+    ''', rows)
+    changed = conn.total_changes - before
+
+    # Unchanged profiles only get a new fetch time
+    cursor.executemany('UPDATE experts SET fetched_at = ? WHERE id = ? AND etag = ?',
+                       [(fetched_at, row[0], row[8]) for row in rows])
+    conn.commit()
+    conn.close()
+    return changed
+
+def _load_topic(topic):
+    """
+    Load the catalog entry for a topic with its experts in provider order.
+
+    Args:
+        topic (str): Normalized query
+
+    Returns:
+        tuple: (fetched_at, experts), or None if missing or incomplete
+    """
+    conn = sqlite3.connect(db.DB_FILE)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT expert_ids, fetched_at FROM catalog_queries WHERE query = ?', (topic,))
+    row = cursor.fetchone()
+    if row is None:
+        conn.close()
+        return None
+
+    expert_ids = json.loads(row['expert_ids'])
+    placeholders = ', '.join('?' * len(expert_ids))
+    cursor.execute(f'SELECT * FROM experts WHERE id IN ({placeholders})', expert_ids)
+    by_id = {}
+    for expert_row in cursor.fetchall():
+        expert = dict(expert_row)
+        details = expert.pop('details', None)
+        if details:
+            expert.update(json.loads(details))
+        by_id[expert['id']] = expert
+    conn.close()
+
+    # A profile was removed since; treat the entry as missing
+    if len(by_id) < len(expert_ids):
+        return None
+    return row['fetched_at'], [by_id[expert_id] for expert_id in expert_ids]
+
+def _claim_refresh(topic, now):
+    """
+    Claim the refresh of a topic, so only one worker refreshes it at a time.
+
+    Args:
+        topic (str): Normalized query
+        now (float): Current time
+
+    Returns:
+        bool: True if this caller should refresh
+    """
+    conn = sqlite3.connect(db.DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+    UPDATE catalog_queries SET refreshing_at = ?
+    WHERE query = ? AND (refreshing_at IS NULL OR refreshing_at < ?)
+    ''', (now, topic, now - REFRESH_TIMEOUT))
+    claimed = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    return claimed
+
+def refresh(topic):
+    """
+    Fetch a topic from the provider and store the results.
+
+    Args:
+        topic (str): Normalized query
+
+    Returns:
+        list: Expert dictionaries from the provider
+    """
+    experts = resilience.call('linkedin', linkedin.search_experts, topic)
+    return _store_topic(topic, experts)
+
+async def refresh_async(topic):
+    """
+    Fetch a topic from the provider without blocking the event loop, and store the results.
+
+    Args:
+        topic (str): Normalized query
+
+    Returns:
+        list: Expert dictionaries from the provider
+    """
+    experts = await resilience.call_async('linkedin', linkedin.search_experts_async, topic)
+    return await asyncio.to_thread(_store_topic, topic, experts)
+
+def _store_topic(topic, experts):
+    """
+    Store a topic's provider results.
+
+    Args:
+        topic (str): Normalized query
+        experts (list): Expert dictionaries from the provider
+
+    Returns:
+        list: The stored expert dictionaries
+    """
+    # Store duplicates of known experts under their canonical ids
+    experts = dedup.dedupe(experts)
+    fetched_at = time.time()
+    store_profiles(experts, fetched_at)
+
+    conn = sqlite3.connect(db.DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+    INSERT INTO catalog_queries (query, expert_ids, fetched_at, refreshing_at)
+    VALUES (?, ?, ?, NULL)
+    ON CONFLICT (query) DO UPDATE SET
+        expert_ids = excluded.expert_ids, fetched_at = excluded.fetched_at, refreshing_at = NULL
+    ''', (topic, json.dumps([expert['id'] for expert in experts]), fetched_at))
+    conn.commit()
+    conn.close()
+    return experts
+
+def _refresh_in_background(topic):
+    def run():
+        try:
+            refresh(topic)
+        except Exception as e:
+            if not isinstance(e, resilience.ProviderUnavailable):
+                logger.exception("Catalog refresh failed for %r", topic)
+            # Release the claim so the next request can retry
+            conn = sqlite3.connect(db.DB_FILE)
+            conn.execute('UPDATE catalog_queries SET refreshing_at = NULL WHERE query = ?', (topic,))
+            conn.commit()
+            conn.close()
+
+    threading.Thread(target=run, name="catalog-refresh", daemon=True).start()
+
+@tracing.traced('catalog.search_experts')
+def search_experts(query):
+    """
+    Search for experts through the catalog.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        list: List of expert dictionaries, as from linkedin.search_experts
+    """
+    topic = normalize_topic(query)
+    cached = _load_topic(topic)
+    now = time.time()
+
+    if cached is not None:
+        fetched_at, experts = cached
+        age = now - fetched_at
+        if age <= CATALOG_TTL:
+            tracing.increment('catalog_lookups', result='fresh')
+            return experts
+        if age <= CATALOG_MAX_STALE:
+            tracing.increment('catalog_lookups', result='stale')
+            if _claim_refresh(topic, now):
+                _refresh_in_background(topic)
+            return experts
+
+    tracing.increment('catalog_lookups', result='miss')
+    try:
+        return refresh(topic)
+    except Exception as e:
+        if not isinstance(e, resilience.ProviderUnavailable):
+            logger.exception("Provider search failed for %r", topic)
+        tracing.increment('catalog_fallbacks', result='stale' if cached else 'local')
+        if cached is not None:
+            return cached[1]
+        return db.search_local_experts(topic)
+
+
+@tracing.traced('catalog.search_experts_async')
+async def search_experts_async(query):
+    """
+    Search for experts through the catalog, waiting for the provider without holding a thread.
+
+    Catalog reads and writes run on a thread; the provider call is awaited.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        list: List of expert dictionaries, as from search_experts
+    """
+    topic = normalize_topic(query)
+    cached = await asyncio.to_thread(_load_topic, topic)
+    now = time.time()
+
+    if cached is not None:
+        fetched_at, experts = cached
+        age = now - fetched_at
+        if age <= CATALOG_TTL:
+            tracing.increment('catalog_lookups', result='fresh')
+            return experts
+        if age <= CATALOG_MAX_STALE:
+            tracing.increment('catalog_lookups', result='stale')
+            if await asyncio.to_thread(_claim_refresh, topic, now):
+                _refresh_in_background(topic)
+            return experts
+
+    tracing.increment('catalog_lookups', result='miss')
+    try:
+        return await refresh_async(topic)
+    except Exception as e:
+        if not isinstance(e, resilience.ProviderUnavailable):
+            logger.exception("Provider search failed for %r", topic)
+        tracing.increment('catalog_fallbacks', result='stale' if cached else 'local')
+        if cached is not None:
+            return cached[1]
+        # Imported here; async_db needs aiosqlite, which only the async path requires
+        from utils import async_db
+        return await async_db.search_local_experts(topic)
@@ -0,0 +1,256 @@
+"""
+Query Classifier Module
+
+This module detects expert categories in a query. The taxonomy file maps
+each category to its terms, and all terms are compiled into one
+Aho-Corasick automaton, so a single pass over the query finds every term
+of every category.
+"""
+
+import json
+import os
+import threading
+
+# Taxonomy file with categories and their terms
+TAXONOMY_FILE = os.getenv('TAXONOMY_FILE', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'taxonomy.json'))
+
+
+def normalize(text):
+    """
+    Normalize a query or taxonomy term for matching.
+
+    Hyphens and underscores count as spaces, so "machine-learning" and
+    "machine learning" match each other either way round.
+
+    Args:
+        text (str): Query or term
+
+    Returns:
+        str: Lowercased text
+    """
+    return (text or '').lower().replace('-', ' ').replace('_', ' ')
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton over lowercase terms.
+
+    Each state has a goto table, a failure link and the ids of the terms
+    that end there (including those reachable through failure links).
+    """
+
+    def __init__(self, terms):
+        self.terms = list(terms)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for term_id, term in enumerate(self.terms):
+            state = 0
+            for char in term:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = next_state
+                state = next_state
+            self.output[state].append(term_id)
+
+        # Breadth-first pass to set failure links
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find(self, text):
+        """
+        Find all term occurrences in a text.
+
+        Args:
+            text (str): Lowercase text
+
+        Yields:
+            tuple: (term_id, end_index) for each occurrence, end exclusive
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for term_id in output[state]:
+                yield term_id, index + 1
+
+
+class Classifier:
+    """
+    Query classifier compiled from a taxonomy.
+
+    Args:
+        taxonomy (dict): {'default': str, 'whole_words': bool, 'categories':
+            {name: {'provider': str, 'terms': [term or {'term', 'weight'}]}}}
+    """
+
+    def __init__(self, taxonomy):
+        self.default = taxonomy.get('default')
+        self.whole_words = taxonomy.get('whole_words', True)
+        self.categories = list(taxonomy.get('categories', {}))
+        self.providers = {}
+
+        terms = []
+        self.term_info = []
+        for category, spec in taxonomy.get('categories', {}).items():
+            self.providers[category] = spec.get('provider')
+            for term in spec.get('terms', []):
+                if isinstance(term, dict):
+                    text, weight = term['term'], float(term.get('weight', 1.0))
+                else:
+                    text, weight = term, 1.0
+                terms.append(normalize(text))
+                self.term_info.append((category, weight))
+
+        self.automaton = Automaton(terms)
+
+    def _is_word(self, text, start, end):
+        before = text[start - 1] if start > 0 else ' '
+        after = text[end] if end < len(text) else ' '
+        return not before.isalnum() and not after.isalnum()
+
+    def classify(self, query):
+        """
+        Find all categories mentioned in a query.
+
+        Args:
+            query (str): Search query
+
+        Returns:
+            list: [{'category', 'weight', 'provider', 'terms'}] by descending
+                weight, ties in taxonomy order
+        """
+        text = normalize(query)
+        scores = {}
+        matched = {}
+        for term_id, end in self.automaton.find(text):
+            term = self.automaton.terms[term_id]
+            if self.whole_words and not self._is_word(text, end - len(term), end):
+                continue
+            category, weight = self.term_info[term_id]
+            scores[category] = scores.get(category, 0.0) + weight
+            matched.setdefault(category, []).append(term)
+
+        order = {category: i for i, category in enumerate(self.categories)}
+        ranked = sorted(scores, key=lambda category: (-scores[category], order[category]))
+        return [{
+            'category': category,
+            'weight': scores[category],
+            'provider': self.providers.get(category),
+            'terms': matched[category]
+        } for category in ranked]
+
+    def primary_category(self, query):
+        """
+        Get the best matching category, or the default if none match.
+
+        Args:
+            query (str): Search query
+
+        Returns:
+            str: Category name
+        """
+        matches = self.classify(query)
+        return matches[0]['category'] if matches else self.default
+
+    def providers_for(self, query):
+        """
+        Get the providers to route a query to, best category first.
+
+        Args:
+            query (str): Search query
+
+        Returns:
+            list: Provider names without duplicates
+        """
+        providers = []
+        for match in self.classify(query):
+            if match['provider'] and match['provider'] not in providers:
+                providers.append(match['provider'])
+        return providers
+
+
+_classifier = None
+_lock = threading.Lock()
+
+def load_taxonomy(path=None):
+    """
+    Compile a taxonomy file and make it the active classifier.
+
+    Args:
+        path (str, optional): Taxonomy JSON file (defaults to TAXONOMY_FILE)
+
+    Returns:
+        Classifier: Compiled classifier
+    """
+    global _classifier
+    with open(path or TAXONOMY_FILE) as f:
+        taxonomy = json.load(f)
+    classifier = Classifier(taxonomy)
+    with _lock:
+        _classifier = classifier
+    return classifier
+
+def get_classifier():
+    """
+    Get the active classifier, compiling the taxonomy on first use.
+
+    Returns:
+        Classifier: Compiled classifier
+    """
+    if _classifier is None:
+        load_taxonomy()
+    return _classifier
+
+def classify(query):
+    """
+    Find all categories mentioned in a query.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        list: Matched categories with weights, best first
+    """
+    return get_classifier().classify(query)
+
+def primary_category(query):
+    """
+    Get the best matching category for a query.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        str: Category name, or the taxonomy default
+    """
+    return get_classifier().primary_category(query)
+
+def providers_for(query):
+    """
+    Get the providers to route a query to.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        list: Provider names, best category first
+    """
+    return get_classifier().providers_for(query)
@@ -9,10 +9,28 @@ import sqlite3
 import json
 import os
 import datetime
+import re
+from utils import tracing
 
 # Database file
 DB_FILE = os.getenv('DB_FILE', 'julie.db')
 
+# bm25 column weights for name, title, company, skills and summary
+EXPERT_SEARCH_WEIGHTS = (2.0, 3.0, 1.0, 2.0, 1.0)
+
+# Query words left out of full-text matches; they match most profiles
+EXPERT_SEARCH_STOPWORDS = frozenset('''
+    a an and any are as at be by expert experts for from has have i in is looking
+    me need of on or our someone the to we who with
+'''.split())
+
+# Values for the full-text index, taken from the columns and the details JSON
+EXPERT_INDEX_VALUES = '''
+    {row}.rowid, {row}.name, {row}.title, {row}.company,
+    (SELECT group_concat(value, ' ') FROM json_each({row}.details, '$.skills')),
+    json_extract({row}.details, '$.summary')
+'''
+
 def init_db():
     """Initialize the database with required tables."""
     conn = sqlite3.connect(DB_FILE)
@@ -52,6 +70,85 @@ def init_db():
     )
     ''')
     
+    # Track when each expert profile was fetched from the provider, and its
+    # version, for the catalog
+    cursor.execute('PRAGMA table_info(experts)')
+    expert_columns = [row[1] for row in cursor.fetchall()]
+    if 'fetched_at' not in expert_columns:
+        cursor.execute('ALTER TABLE experts ADD COLUMN fetched_at REAL')
+    if 'etag' not in expert_columns:
+        cursor.execute('ALTER TABLE experts ADD COLUMN etag TEXT')
+    # Lets workers find refetched experts without scanning the table
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_experts_fetched_at ON experts (fetched_at)')
+    
+    # Create catalog topics table: provider results per normalized query
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS catalog_queries (
+        query TEXT PRIMARY KEY,
+        expert_ids TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        refreshing_at REAL
+    )
+    ''')
+    
+    # Create expert aliases table: duplicate expert ids -> canonical id
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS expert_aliases (
+        alias_id TEXT PRIMARY KEY,
+        canonical_id TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Create rate limiter and circuit breaker tables, shared by all workers
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS rate_limits (
+        name TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS circuit_breakers (
+        name TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        failures INTEGER NOT NULL DEFAULT 0,
+        opened_at REAL
+    )
+    ''')
+    
+    # Full-text index over experts, kept in sync by triggers. Rows share
+    # rowids with the experts table.
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'experts_fts'")
+    fts_exists = cursor.fetchone() is not None
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS experts_fts USING fts5(
+        name, title, company, skills, summary,
+        tokenize = 'porter unicode61'
+    )
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS experts_fts_insert AFTER INSERT ON experts BEGIN
+        INSERT INTO experts_fts (rowid, name, title, company, skills, summary)
+        VALUES ({EXPERT_INDEX_VALUES.format(row='new')});
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS experts_fts_delete AFTER DELETE ON experts BEGIN
+        DELETE FROM experts_fts WHERE rowid = old.rowid;
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS experts_fts_update
+    AFTER UPDATE OF name, title, company, details ON experts BEGIN
+        DELETE FROM experts_fts WHERE rowid = old.rowid;
+        INSERT INTO experts_fts (rowid, name, title, company, skills, summary)
+        VALUES ({EXPERT_INDEX_VALUES.format(row='new')});
+    END
+    ''')
+    if not fts_exists:
+        _rebuild_expert_index(cursor)
+    
     # Create selections table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS selections (
@@ -66,6 +163,27 @@ def init_db():
     )
     ''')
     
+    # Time-decayed selection counts per expert and per query term x expert,
+    # maintained by record_selections and store_expert_selection for the popularity prior
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS expert_popularity (
+        expert_id TEXT PRIMARY KEY,
+        score REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS term_popularity (
+        term TEXT NOT NULL,
+        expert_id TEXT NOT NULL,
+        score REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (term, expert_id)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_expert_popularity_updated ON expert_popularity (updated_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_term_popularity_updated ON term_popularity (updated_at)')
+    
     # Create schedules table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS schedules (
@@ -73,6 +191,7 @@ def init_db():
         user_id INTEGER NOT NULL,
         expert_id TEXT NOT NULL,
         scheduled_time TIMESTAMP NOT NULL,
+        duration_minutes INTEGER DEFAULT 30,
         status TEXT DEFAULT 'pending',
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (user_id) REFERENCES users (id),
@@ -80,6 +199,42 @@ def init_db():
     )
     ''')
     
+    # Add call durations to schedules created before they were tracked
+    cursor.execute('PRAGMA table_info(schedules)')
+    schedule_columns = [row[1] for row in cursor.fetchall()]
+    if 'duration_minutes' not in schedule_columns:
+        cursor.execute('ALTER TABLE schedules ADD COLUMN duration_minutes INTEGER DEFAULT 30')
+    
+    # Number schedule updates so workers can reload the rows changed since
+    # their last refresh; writes are serialized, so versions only grow
+    if 'version' not in schedule_columns:
+        cursor.execute('ALTER TABLE schedules ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_schedules_version
+    ON schedules (version)
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS schedules_version_update
+    AFTER UPDATE OF user_id, expert_id, scheduled_time, duration_minutes, status ON schedules BEGIN
+        UPDATE schedules SET version = (SELECT MAX(version) + 1 FROM schedules)
+        WHERE id = new.id;
+    END
+    ''')
+    
+    # Index schedules by participant and time for conflict detection
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_schedules_expert_time
+    ON schedules (expert_id, scheduled_time)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_schedules_user_time
+    ON schedules (user_id, scheduled_time)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_schedules_time
+    ON schedules (scheduled_time)
+    ''')
+    
     # Create actions table for monitoring
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS actions (
@@ -93,6 +248,28 @@ def init_db():
     conn.commit()
     conn.close()
 
+def _rebuild_expert_index(cursor):
+    """Repopulate the experts full-text index from the experts table."""
+    cursor.execute('DELETE FROM experts_fts')
+    cursor.execute(f'''
+    INSERT INTO experts_fts (rowid, name, title, company, skills, summary)
+    SELECT {EXPERT_INDEX_VALUES.format(row='experts')} FROM experts
+    ''')
+
+def rebuild_expert_index():
+    """
+    Rebuild the experts full-text index.
+    
+    The index is keyed by experts rowid, so run this after a VACUUM, which
+    may renumber rows of a table without an INTEGER PRIMARY KEY.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    _rebuild_expert_index(cursor)
+    conn.commit()
+    conn.close()
+
+@tracing.traced('db.get_or_create_user')
 def get_or_create_user(email):
     """
     Get a user by email or create if not exists.
@@ -122,6 +299,7 @@ def get_or_create_user(email):
     
     return user_id
 
+@tracing.traced('db.store_query')
 def store_query(user_email, query):
     """
     Store a user query in the database.
@@ -149,10 +327,14 @@ def store_query(user_email, query):
     
     return query_id
 
+@tracing.traced('db.store_expert')
 def store_expert(expert):
     """
     Store an expert in the database.
     
+    An id recorded as an alias of another expert (see the dedup module)
+    updates the canonical expert instead.
+    
     Args:
         expert (dict): Expert information
         
@@ -162,6 +344,12 @@ def store_expert(expert):
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     
+    # Store duplicates of a known expert under the canonical id
+    cursor.execute('SELECT canonical_id FROM expert_aliases WHERE alias_id = ?', (expert['id'],))
+    alias = cursor.fetchone()
+    if alias:
+        expert = dict(expert, id=alias[0])
+    
     # Convert details to JSON
     details = json.dumps(expert)
     
@@ -204,6 +392,7 @@ def store_expert(expert):
     
     return expert['id']
 
+@tracing.traced('db.store_expert_selection')
 def store_expert_selection(user_email, expert, query=None):
     """
     Store an expert selection in the database.
@@ -231,13 +420,14 @@ def store_expert_selection(user_email, expert, query=None):
     else:
         # Get the most recent query for this user
         cursor.execute('''
-        SELECT id FROM queries 
+        SELECT id, query FROM queries 
         WHERE user_id = ? 
         ORDER BY created_at DESC 
         LIMIT 1
         ''', (user_id,))
         result = cursor.fetchone()
         query_id = result[0] if result else 0
+        query = result[1] if result else None
     
     # Store selection
     cursor.execute('''
@@ -246,19 +436,99 @@ def store_expert_selection(user_email, expert, query=None):
     ''', (user_id, expert_id, query_id))
     selection_id = cursor.lastrowid
     
+    # Update the popularity features in the same transaction
+    from utils import popularity
+    expert_rows, term_rows = popularity.record_selection(cursor, expert_id, query)
+    
     conn.commit()
     conn.close()
+    popularity.apply_local(expert_rows, term_rows)
     
     return selection_id
 
-def store_schedule(user_email, expert_id, scheduled_time):
+@tracing.traced('db.record_selections')
+def record_selections(user_email, expert_ids, query=None):
+    """
+    Record a user's selection of several experts in one transaction.
+    
+    Only the selections and their popularity features are written: the
+    query is stored once for the whole selection, and the experts' stored
+    details are left as they are.
+    
+    Args:
+        user_email (str): User's email address
+        expert_ids (list): Selected expert IDs
+        query (str, optional): Search query; defaults to the user's most recent query
+        
+    Returns:
+        list: Selection IDs
+    """
+    from utils import popularity
+    
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    
+    # Get or create user
+    cursor.execute('SELECT id FROM users WHERE email = ?', (user_email,))
+    user = cursor.fetchone()
+    if user:
+        user_id = user[0]
+    else:
+        cursor.execute('INSERT INTO users (email) VALUES (?)', (user_email,))
+        user_id = cursor.lastrowid
+    
+    if query:
+        cursor.execute('INSERT INTO queries (user_id, query) VALUES (?, ?)', (user_id, query))
+        query_id = cursor.lastrowid
+    else:
+        # Get the most recent query for this user
+        cursor.execute('''
+        SELECT id, query FROM queries 
+        WHERE user_id = ? 
+        ORDER BY created_at DESC 
+        LIMIT 1
+        ''', (user_id,))
+        result = cursor.fetchone()
+        query_id = result[0] if result else 0
+        query = result[1] if result else None
+    
+    selection_ids = []
+    expert_rows, term_rows = [], []
+    for expert_id in expert_ids:
+        # Credit duplicates of a known expert to the canonical id
+        cursor.execute('SELECT canonical_id FROM expert_aliases WHERE alias_id = ?', (expert_id,))
+        alias = cursor.fetchone()
+        if alias:
+            expert_id = alias[0]
+        
+        cursor.execute('''
+        INSERT INTO selections (user_id, expert_id, query_id)
+        VALUES (?, ?, ?)
+        ''', (user_id, expert_id, query_id))
+        selection_ids.append(cursor.lastrowid)
+        rows = popularity.record_selection(cursor, expert_id, query)
+        expert_rows.extend(rows[0])
+        term_rows.extend(rows[1])
+    
+    conn.commit()
+    conn.close()
+    # Only committed selections reach this worker's popularity store
+    popularity.apply_local(expert_rows, term_rows)
+    
+    return selection_ids
+
+@tracing.traced('db.store_schedule')
+def store_schedule(user_email, expert_id, scheduled_time, duration_minutes=30):
     """
     Store a scheduled call in the database.
     
+    This does not check for conflicts; use scheduling.book_call for that.
+    
     Args:
         user_email (str): User's email address
         expert_id (str): Expert ID
         scheduled_time (str): Scheduled time for the call
+        duration_minutes (int, optional): Length of the call in minutes
         
     Returns:
         int: Schedule ID
@@ -271,9 +541,9 @@ def store_schedule(user_email, expert_id, scheduled_time):
     
     # Store schedule
     cursor.execute('''
-    INSERT INTO schedules (user_id, expert_id, scheduled_time)
-    VALUES (?, ?, ?)
-    ''', (user_id, expert_id, scheduled_time))
+    INSERT INTO schedules (user_id, expert_id, scheduled_time, duration_minutes)
+    VALUES (?, ?, ?, ?)
+    ''', (user_id, expert_id, scheduled_time, duration_minutes))
     schedule_id = cursor.lastrowid
     
     conn.commit()
@@ -281,6 +551,25 @@ def store_schedule(user_email, expert_id, scheduled_time):
     
     return schedule_id
 
+def _parse_expert(row):
+    """
+    Turn a stored expert row into an expert dictionary.
+    
+    The details JSON is merged into the row's columns and then dropped.
+    
+    Args:
+        row (sqlite3.Row): Row from the experts table
+        
+    Returns:
+        dict: Expert information
+    """
+    expert = dict(row)
+    details = expert.pop('details', None)
+    if details:
+        expert.update(json.loads(details))
+    return expert
+
+@tracing.traced('db.get_expert')
 def get_expert(expert_id):
     """
     Get expert information from the database.
@@ -295,20 +584,106 @@ def get_expert(expert_id):
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM experts WHERE id = ?', (expert_id,))
+    cursor.execute('''
+    SELECT * FROM experts WHERE id = COALESCE(
+        (SELECT canonical_id FROM expert_aliases WHERE alias_id = ?), ?)
+    ''', (expert_id, expert_id))
     row = cursor.fetchone()
     
     conn.close()
     
     if row:
-        expert = dict(row)
-        # Parse details JSON
-        if 'details' in expert and expert['details']:
-            expert.update(json.loads(expert['details']))
-        return expert
+        return _parse_expert(row)
     
     return None
 
+@tracing.traced('db.get_all_experts')
+def get_all_experts():
+    """
+    Get all experts stored in the database.
+    
+    Returns:
+        list: List of expert dictionaries
+    """
+    conn = sqlite3.connect(DB_FILE)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT * FROM experts ORDER BY id')
+    
+    experts = []
+    for row in cursor.fetchall():
+        experts.append(_parse_expert(row))
+    
+    conn.close()
+    
+    return experts
+
+def _match_expression(query):
+    """
+    Turn a free-text query into an FTS5 query matching any of its words.
+    
+    Args:
+        query (str): Search query
+        
+    Returns:
+        str: FTS5 match expression, or None if the query has no words
+    """
+    words = [word for word in re.findall(r'\w+', (query or '').lower())
+             if word not in EXPERT_SEARCH_STOPWORDS]
+    if not words:
+        return None
+    return ' OR '.join(f'"{word}"' for word in dict.fromkeys(words))
+
+@tracing.traced('db.search_local_experts')
+def search_local_experts(query, limit=20):
+    """
+    Search stored experts with the full-text index.
+    
+    Words are stemmed (so "lawyers" matches "lawyer") and any word may match;
+    experts matching more and rarer words rank higher.
+    
+    Args:
+        query (str): Search query
+        limit (int, optional): Maximum number of experts
+        
+    Returns:
+        list: Expert dictionaries, best first, each with a 'bm25_score'
+            (higher is better)
+    """
+    expression = _match_expression(query)
+    if expression is None:
+        return []
+    
+    conn = sqlite3.connect(DB_FILE)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    
+    weights = ', '.join(str(weight) for weight in EXPERT_SEARCH_WEIGHTS)
+    cursor.execute(f'''
+    SELECT experts.*, matches.rank
+    FROM (
+        SELECT rowid, bm25(experts_fts, {weights}) AS rank
+        FROM experts_fts
+        WHERE experts_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    ) AS matches
+    JOIN experts ON experts.rowid = matches.rowid
+    ORDER BY matches.rank
+    ''', (expression, limit))
+    
+    experts = []
+    for row in cursor.fetchall():
+        expert = _parse_expert(row)
+        expert['bm25_score'] = -expert.pop('rank')
+        experts.append(expert)
+    
+    conn.close()
+    
+    return experts
+
+@tracing.traced('db.get_user_experts')
 def get_user_experts(user_email):
     """
     Get all experts selected by a user.
@@ -347,11 +722,7 @@ def get_user_experts(user_email):
         cursor.execute('SELECT * FROM experts WHERE id = ?', (expert_id,))
         row = cursor.fetchone()
         if row:
-            expert = dict(row)
-            # Parse details JSON
-            if 'details' in expert and expert['details']:
-                expert.update(json.loads(expert['details']))
-            experts.append(expert)
+            experts.append(_parse_expert(row))
     
     conn.close()
     
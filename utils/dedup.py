@@ -0,0 +1,518 @@
+"""
+Deduplication Module
+
+This module detects the same person stored under different expert ids, for
+example a mock profile and a real LinkedIn one, or profile URLs that differ
+only in formatting.
+
+Two experts are duplicates if their normalized profile URLs are equal, or if
+their names are similar and their title, company and skills overlap enough.
+Candidates are found through a banded LSH index over MinHash signatures of
+all these features, so a lookup only compares experts sharing a band.
+
+Duplicates are recorded in the expert_aliases table, mapping each alias to
+its canonical id. The shared index picks up stored experts by rowid, and
+experts the catalog refetched by fetch time, re-indexing those whose ETag
+changed. Run the bulk job to merge duplicates already stored:
+    python -m utils.dedup
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from utils import db, popularity
+
+# Minimum similarity of title, company and skills for a duplicate
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', 0.5))
+
+# Minimum similarity of the names
+DEDUP_NAME_THRESHOLD = float(os.getenv('DEDUP_NAME_THRESHOLD', 0.6))
+
+# MinHash size, as bands of rows; 12 x 5 puts the LSH threshold near 0.6
+LSH_BANDS = 12
+LSH_ROWS = 5
+NUM_PERMUTATIONS = LSH_BANDS * LSH_ROWS
+
+# Query parameters that only track the visit, dropped from profile URLs
+TRACKING_PARAMS = ('trk', 'trkinfo', 'lipi', 'originalsubdomain', 'trackingid', 'refid',
+                   'fbclid', 'gclid', 'msclkid', 'mc_cid', 'mc_eid')
+TRACKING_PREFIXES = ('utm_',)
+
+# Refetched experts are looked up this many seconds back, for clock
+# differences between workers
+CLOCK_SKEW = 5.0
+
+_EMPTY = 1 << 64
+
+def normalize_profile_url(url):
+    """
+    Normalize a profile URL for comparison.
+
+    Drops the scheme, "www.", tracking query parameters, fragment, trailing
+    slashes and case, so "https://www.LinkedIn.com/in/jane-doe/?trk=x" and
+    "linkedin.com/in/jane-doe" are equal. Other query parameters are kept,
+    since some profile URLs are only told apart by them.
+
+    Args:
+        url (str): Profile URL
+
+    Returns:
+        str: Normalized URL, or '' if empty
+    """
+    url = (url or '').strip().lower()
+    if not url:
+        return ''
+    if '://' not in url:
+        url = 'https://' + url
+    parts = urlsplit(url)
+    host = parts.netloc
+    if host.startswith('www.'):
+        host = host[4:]
+    params = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+              if key not in TRACKING_PARAMS and not key.startswith(TRACKING_PREFIXES)]
+    query = '?' + urlencode(params) if params else ''
+    return host + parts.path.rstrip('/') + query
+
+def _normalize_text(text):
+    return ' '.join(re.findall(r'[a-z0-9]+', (text or '').lower()))
+
+def name_shingles(name):
+    """
+    Get the character 3-grams of a normalized name.
+
+    Args:
+        name (str): Expert name
+
+    Returns:
+        set: Name shingles
+    """
+    text = f" {_normalize_text(name)} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def attribute_features(expert):
+    """
+    Get the title, company and skill features of an expert.
+
+    Args:
+        expert (dict): Expert information
+
+    Returns:
+        set: Prefixed title words, company words and skills
+    """
+    result = {'t:' + word for word in _normalize_text(expert.get('title')).split()}
+    result.update('c:' + word for word in _normalize_text(expert.get('company')).split())
+    result.update('s:' + _normalize_text(skill) for skill in expert.get('skills', []) or [])
+    return result
+
+def features(expert):
+    """
+    Get the full feature set hashed into an expert's signature.
+
+    Args:
+        expert (dict): Expert information
+
+    Returns:
+        set: Prefixed name shingles plus attribute features
+    """
+    result = {'n:' + shingle for shingle in name_shingles(expert.get('name'))}
+    result.update(attribute_features(expert))
+    return result
+
+def minhash(feature_set):
+    """
+    Compute the MinHash signature of a feature set.
+
+    Uses one-permutation hashing: each feature is hashed once into one of
+    NUM_PERMUTATIONS bins, each bin keeps its minimum, and empty bins borrow
+    the value of the next non-empty bin. This costs one hash per feature
+    instead of one per feature and permutation.
+
+    Args:
+        feature_set (set): Features from `features`
+
+    Returns:
+        tuple: NUM_PERMUTATIONS bin minima
+    """
+    bins = [_EMPTY] * NUM_PERMUTATIONS
+    for feature in feature_set:
+        h = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+        position, value = h % NUM_PERMUTATIONS, h // NUM_PERMUTATIONS
+        if value < bins[position]:
+            bins[position] = value
+
+    if all(value == _EMPTY for value in bins):
+        return tuple(bins)
+    # Densify by rotation, offsetting borrowed values by the distance so
+    # they don't collide with the source bin's own value
+    signature = []
+    for position in range(NUM_PERMUTATIONS):
+        distance = 0
+        while bins[(position + distance) % NUM_PERMUTATIONS] == _EMPTY:
+            distance += 1
+        signature.append((bins[(position + distance) % NUM_PERMUTATIONS], distance))
+    return tuple(signature)
+
+def similarity(signature_a, signature_b):
+    """
+    Estimate Jaccard similarity from two MinHash signatures.
+
+    Args:
+        signature_a (tuple): Signature
+        signature_b (tuple): Signature
+
+    Returns:
+        float: Fraction of equal positions
+    """
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / NUM_PERMUTATIONS
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class DedupIndex:
+    """
+    LSH index over expert signatures, plus an exact profile URL lookup.
+
+    LSH candidates are confirmed by exact Jaccard similarity of the name
+    shingles and of the attribute features, which are kept per expert.
+    """
+
+    def __init__(self):
+        self.urls = {}
+        self.signatures = {}
+        self.names = {}
+        self.attributes = {}
+        # Expert id -> (normalized profile URL, ETag) it was indexed with
+        self.entries = {}
+        self.buckets = [{} for _ in range(LSH_BANDS)]
+
+    def _bands(self, signature):
+        for band in range(LSH_BANDS):
+            yield band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+
+    def add(self, expert_id, expert):
+        """
+        Index an expert as a canonical entry.
+
+        Args:
+            expert_id (str): Canonical expert id
+            expert (dict): Expert information
+        """
+        if expert_id in self.signatures:
+            return
+        url = normalize_profile_url(expert.get('profile_url'))
+        if url:
+            self.urls.setdefault(url, expert_id)
+        signature = minhash(features(expert))
+        self.signatures[expert_id] = signature
+        self.names[expert_id] = name_shingles(expert.get('name'))
+        self.attributes[expert_id] = attribute_features(expert)
+        self.entries[expert_id] = (url, expert.get('etag'))
+        for band, key in self._bands(signature):
+            self.buckets[band].setdefault(key, []).append(expert_id)
+
+    def remove(self, expert_id):
+        """
+        Drop an expert from the index, e.g. before re-indexing a changed profile.
+
+        Args:
+            expert_id (str): Canonical expert id
+        """
+        signature = self.signatures.pop(expert_id, None)
+        if signature is None:
+            return
+        url, _ = self.entries.pop(expert_id)
+        if url and self.urls.get(url) == expert_id:
+            del self.urls[url]
+        del self.names[expert_id]
+        del self.attributes[expert_id]
+        for band, key in self._bands(signature):
+            bucket = self.buckets[band][key]
+            bucket.remove(expert_id)
+            if not bucket:
+                del self.buckets[band][key]
+
+    def etag(self, expert_id):
+        """
+        Get the ETag an expert was indexed with.
+
+        Args:
+            expert_id (str): Canonical expert id
+
+        Returns:
+            str: ETag, or None if not indexed or stored without one
+        """
+        entry = self.entries.get(expert_id)
+        return entry[1] if entry else None
+
+    def find(self, expert):
+        """
+        Find an indexed expert that the given expert duplicates.
+
+        Args:
+            expert (dict): Expert information
+
+        Returns:
+            str: Canonical expert id, or None
+        """
+        if expert.get('id') in self.signatures:
+            return expert['id']
+
+        url = normalize_profile_url(expert.get('profile_url'))
+        if url and url in self.urls:
+            return self.urls[url]
+
+        signature = minhash(features(expert))
+        names = name_shingles(expert.get('name'))
+        attributes = attribute_features(expert)
+        candidates = []
+        for band, key in self._bands(signature):
+            candidates.extend(self.buckets[band].get(key, ()))
+
+        best, best_score = None, DEDUP_THRESHOLD
+        for candidate in dict.fromkeys(candidates):
+            if _jaccard(names, self.names[candidate]) < DEDUP_NAME_THRESHOLD:
+                continue
+            score = _jaccard(attributes, self.attributes[candidate])
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+
+_index = None
+_aliases = {}
+_last_rowid = 0
+_last_fetched_at = 0.0
+_last_alias_rowid = 0
+_lock = threading.Lock()
+
+def _refresh():
+    """Catch the shared index up with experts and aliases stored or changed since the last call."""
+    global _index, _last_rowid, _last_fetched_at, _last_alias_rowid
+    if _index is None:
+        _index = DedupIndex()
+
+    conn = sqlite3.connect(db.DB_FILE)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    # Experts refetched since the last call, then new experts; a row in both
+    # is skipped the second time by its unchanged ETag
+    cursor.execute('SELECT rowid, * FROM experts WHERE fetched_at >= ?', (_last_fetched_at - CLOCK_SKEW,))
+    rows = cursor.fetchall()
+    cursor.execute('SELECT rowid, * FROM experts WHERE rowid > ? ORDER BY rowid', (_last_rowid,))
+    rows.extend(cursor.fetchall())
+    for row in rows:
+        _last_rowid = max(_last_rowid, row['rowid'])
+        _last_fetched_at = max(_last_fetched_at, row['fetched_at'] or 0.0)
+        expert_id = row['id']
+        if expert_id in _index.signatures:
+            # Refetched without changes
+            if _index.etag(expert_id) == row['etag']:
+                continue
+            _index.remove(expert_id)
+        expert = dict(row)
+        details = expert.pop('details', None)
+        if details:
+            expert.update(json.loads(details))
+        _index.add(expert_id, expert)
+    cursor.execute('SELECT rowid, alias_id, canonical_id FROM expert_aliases WHERE rowid > ? ORDER BY rowid',
+                   (_last_alias_rowid,))
+    for row in cursor.fetchall():
+        _aliases[row['alias_id']] = row['canonical_id']
+        _last_alias_rowid = row['rowid']
+    conn.close()
+
+def _canonical(expert):
+    """Resolve an expert against the shared index; the caller holds the lock."""
+    expert_id = expert['id']
+    if expert_id in _aliases:
+        return _aliases[expert_id]
+
+    found = _index.find(expert)
+    if found is None:
+        return expert_id
+    if found != expert_id:
+        _record_alias(expert_id, found)
+    return found
+
+def _record_alias(alias_id, canonical_id):
+    _aliases[alias_id] = canonical_id
+    conn = sqlite3.connect(db.DB_FILE)
+    conn.execute('''
+    INSERT INTO expert_aliases (alias_id, canonical_id) VALUES (?, ?)
+    ON CONFLICT (alias_id) DO UPDATE SET canonical_id = excluded.canonical_id
+    ''', (alias_id, canonical_id))
+    conn.commit()
+    conn.close()
+
+def canonical_id(expert):
+    """
+    Get the canonical id for an expert, recording a new alias if it is a duplicate.
+
+    Args:
+        expert (dict): Expert information
+
+    Returns:
+        str: Canonical id; the expert's own id if it has no stored duplicate
+    """
+    with _lock:
+        _refresh()
+        return _canonical(expert)
+
+def resolve(expert):
+    """
+    Map an expert onto its canonical id before storing it.
+
+    Args:
+        expert (dict): Expert information
+
+    Returns:
+        dict: The expert, or a copy with the canonical id
+    """
+    canonical = canonical_id(expert)
+    if canonical == expert['id']:
+        return expert
+    return dict(expert, id=canonical)
+
+def dedupe(experts):
+    """
+    Drop duplicate experts from a candidate list before ranking.
+
+    The first occurrence of each person is kept, under its canonical id.
+    Duplicates within the list are found even if neither is stored yet.
+
+    Args:
+        experts (list): Expert dictionaries
+
+    Returns:
+        list: Experts without duplicates, in their original order
+    """
+    with _lock:
+        _refresh()
+        local = DedupIndex()
+        unique = []
+        for expert in experts:
+            expert_id = expert['id']
+            canonical = _canonical(expert)
+            if canonical in local.signatures or local.find(expert) is not None:
+                continue
+            local.add(canonical, expert)
+            unique.append(expert if canonical == expert_id else dict(expert, id=canonical))
+    return unique
+
+def rededupe_catalog():
+    """
+    Merge duplicate experts already stored in the catalog.
+
+    Experts are scanned oldest first, so the earliest stored profile stays
+    canonical. References in selections, schedules and catalog queries are
+    repointed to the canonical id, the duplicates' popularity is added to
+    the canonical expert's, and the duplicate rows are deleted.
+
+    Returns:
+        dict: Alias id -> canonical id for the merged experts
+    """
+    global _index, _last_rowid, _last_fetched_at, _last_alias_rowid
+
+    conn = sqlite3.connect(db.DB_FILE)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM experts ORDER BY created_at, rowid')
+    index = DedupIndex()
+    merged = {}
+    for row in cursor.fetchall():
+        expert = dict(row)
+        details = expert.pop('details', None)
+        if details:
+            expert.update(json.loads(details))
+        found = index.find(expert)
+        if found is None:
+            index.add(expert['id'], expert)
+        else:
+            merged[expert['id']] = found
+
+    now = time.time()
+    expert_rows, term_rows = [], []
+    for alias_id, canonical in merged.items():
+        merged_experts, merged_terms = _merge_popularity(cursor, alias_id, canonical, now)
+        expert_rows.extend(merged_experts)
+        term_rows.extend(merged_terms)
+        cursor.execute('''
+        INSERT INTO expert_aliases (alias_id, canonical_id) VALUES (?, ?)
+        ON CONFLICT (alias_id) DO UPDATE SET canonical_id = excluded.canonical_id
+        ''', (alias_id, canonical))
+        # Earlier aliases of a merged expert now point at its canonical id
+        cursor.execute('UPDATE expert_aliases SET canonical_id = ? WHERE canonical_id = ?', (canonical, alias_id))
+        cursor.execute('UPDATE selections SET expert_id = ? WHERE expert_id = ?', (canonical, alias_id))
+        cursor.execute('UPDATE schedules SET expert_id = ? WHERE expert_id = ?', (canonical, alias_id))
+        cursor.execute('DELETE FROM experts WHERE id = ?', (alias_id,))
+
+    if merged:
+        cursor.execute('SELECT query, expert_ids FROM catalog_queries')
+        for row in cursor.fetchall():
+            expert_ids = json.loads(row['expert_ids'])
+            canonical_ids = list(dict.fromkeys(merged.get(expert_id, expert_id) for expert_id in expert_ids))
+            if canonical_ids != expert_ids:
+                cursor.execute('UPDATE catalog_queries SET expert_ids = ? WHERE query = ?',
+                               (json.dumps(canonical_ids), row['query']))
+
+    conn.commit()
+    conn.close()
+    popularity.apply_local(expert_rows, term_rows)
+
+    with _lock:
+        _index = None
+        _last_rowid = _last_alias_rowid = 0
+        _last_fetched_at = 0.0
+        _aliases.clear()
+    return merged
+
+def _merge_popularity(cursor, alias_id, canonical, now):
+    """
+    Add a duplicate's popularity rows to its canonical expert's, as of now.
+
+    The merged rows are written with the current time, so other workers
+    pick them up on their next popularity refresh.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of the merge transaction
+        alias_id (str): Duplicate expert id
+        canonical (str): Canonical expert id
+        now (float): Merge time
+
+    Returns:
+        tuple: (expert rows, term rows) written, as for PopularityStore.apply
+    """
+    cursor.execute('SELECT score, updated_at FROM expert_popularity WHERE expert_id IN (?, ?)',
+                   (alias_id, canonical))
+    rows = cursor.fetchall()
+    expert_rows = []
+    if rows:
+        score = sum(popularity.decayed(row['score'], row['updated_at'], now) for row in rows)
+        cursor.execute('DELETE FROM expert_popularity WHERE expert_id = ?', (alias_id,))
+        cursor.execute('INSERT OR REPLACE INTO expert_popularity (expert_id, score, updated_at) VALUES (?, ?, ?)',
+                       (canonical, score, now))
+        expert_rows.append((canonical, score, now))
+
+    cursor.execute('SELECT term, score, updated_at FROM term_popularity WHERE expert_id IN (?, ?)',
+                   (alias_id, canonical))
+    scores = {}
+    for row in cursor.fetchall():
+        scores[row['term']] = scores.get(row['term'], 0.0) + popularity.decayed(row['score'], row['updated_at'], now)
+    cursor.execute('DELETE FROM term_popularity WHERE expert_id = ?', (alias_id,))
+    term_rows = [(term, canonical, score, now) for term, score in sorted(scores.items())]
+    cursor.executemany('''
+    INSERT OR REPLACE INTO term_popularity (term, expert_id, score, updated_at) VALUES (?, ?, ?, ?)
+    ''', term_rows)
+    return expert_rows, term_rows
+
+
+if __name__ == '__main__':
+    db.init_db()
+    result = rededupe_catalog()
+    print(f"Merged {len(result)} duplicate experts")
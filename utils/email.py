@@ -2,6 +2,9 @@
 Email Module
 
 This module handles sending emails for expert scheduling.
+
+send_email_async and send_expert_selection_email_async send the same
+emails from the async request path, through aiosmtplib.
 """
 
 import os
@@ -9,6 +12,7 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import logging
+from utils import tracing
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +21,7 @@ logger = logging.getLogger(__name__)
 # Check if we should use mock mode
 USE_MOCK = os.getenv('USE_MOCK_EMAIL', 'True').lower() in ('true', '1', 't')
 
+@tracing.traced('email.send_email')
 def send_email(to_email, subject, text_body, html_body=None):
     """
     Send an email.
@@ -63,9 +68,10 @@ def _mock_send_email(to_email, subject, text_body, html_body=None):
     
     return True
 
-def _smtp_send_email(to_email, subject, text_body, html_body=None):
+@tracing.traced('email.send_email_async')
+async def send_email_async(to_email, subject, text_body, html_body=None):
     """
-    Send an email using SMTP.
+    Send an email without blocking the event loop.
     
     Args:
         to_email (str): Recipient email address
@@ -76,7 +82,18 @@ def _smtp_send_email(to_email, subject, text_body, html_body=None):
     Returns:
         bool: True if email was sent successfully, False otherwise
     """
-    # Get email settings from config
+    if USE_MOCK:
+        return _mock_send_email(to_email, subject, text_body, html_body)
+    else:
+        return await _smtp_send_email_async(to_email, subject, text_body, html_body)
+
+def _smtp_settings():
+    """
+    Get the SMTP settings from the environment.
+    
+    Returns:
+        tuple: (host, port, username, password), or None if not configured
+    """
     email_host = os.getenv('EMAIL_HOST')
     email_port = int(os.getenv('EMAIL_PORT', 587))
     email_username = os.getenv('EMAIL_USERNAME')
@@ -85,21 +102,56 @@ def _smtp_send_email(to_email, subject, text_body, html_body=None):
     # Check if settings are available
     if not all([email_host, email_port, email_username, email_password]):
         logger.error("Email settings not configured. Check your config.py file.")
-        return False
+        return None
+    return email_host, email_port, email_username, email_password
+
+def _build_message(from_email, to_email, subject, text_body, html_body=None):
+    """
+    Build a multipart email message.
     
-    try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = email_username
-        msg['To'] = to_email
+    Args:
+        from_email (str): Sender email address
+        to_email (str): Recipient email address
+        subject (str): Email subject
+        text_body (str): Plain text email body
+        html_body (str, optional): HTML email body
         
-        # Attach text body
-        msg.attach(MIMEText(text_body, 'plain'))
+    Returns:
+        MIMEMultipart: Message
+    """
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = from_email
+    msg['To'] = to_email
+    
+    # Attach text body
+    msg.attach(MIMEText(text_body, 'plain'))
+    
+    # Attach HTML body if provided
+    if html_body:
+        msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+def _smtp_send_email(to_email, subject, text_body, html_body=None):
+    """
+    Send an email using SMTP.
+    
+    Args:
+        to_email (str): Recipient email address
+        subject (str): Email subject
+        text_body (str): Plain text email body
+        html_body (str, optional): HTML email body
         
-        # Attach HTML body if provided
-        if html_body:
-            msg.attach(MIMEText(html_body, 'html'))
+    Returns:
+        bool: True if email was sent successfully, False otherwise
+    """
+    settings = _smtp_settings()
+    if settings is None:
+        return False
+    email_host, email_port, email_username, email_password = settings
+    
+    try:
+        msg = _build_message(email_username, to_email, subject, text_body, html_body)
         
         # Connect to server and send
         server = smtplib.SMTP(email_host, email_port)
@@ -115,6 +167,39 @@ def _smtp_send_email(to_email, subject, text_body, html_body=None):
         logger.error(f"Failed to send email: {str(e)}")
         return False
 
+async def _smtp_send_email_async(to_email, subject, text_body, html_body=None):
+    """
+    Send an email using aiosmtplib.
+    
+    Args:
+        to_email (str): Recipient email address
+        subject (str): Email subject
+        text_body (str): Plain text email body
+        html_body (str, optional): HTML email body
+        
+    Returns:
+        bool: True if email was sent successfully, False otherwise
+    """
+    # Imported here; only the async request path needs aiosmtplib
+    import aiosmtplib
+    
+    settings = _smtp_settings()
+    if settings is None:
+        return False
+    email_host, email_port, email_username, email_password = settings
+    
+    try:
+        msg = _build_message(email_username, to_email, subject, text_body, html_body)
+        await aiosmtplib.send(msg, hostname=email_host, port=email_port, start_tls=True,
+                              username=email_username, password=email_password)
+        
+        logger.info(f"Email sent to {to_email}")
+        return True
+    
+    except Exception as e:
+        logger.error(f"Failed to send email: {str(e)}")
+        return False
+
 def send_expert_selection_email(user_email, experts, query):
     """
     Send an email with selected experts.
@@ -127,6 +212,33 @@ def send_expert_selection_email(user_email, experts, query):
     Returns:
         bool: True if email was sent successfully, False otherwise
     """
+    return send_email(user_email, *_expert_selection_message(experts, query))
+
+async def send_expert_selection_email_async(user_email, experts, query):
+    """
+    Send an email with selected experts, without blocking the event loop.
+    
+    Args:
+        user_email (str): User's email address
+        experts (list): List of selected expert dictionaries
+        query (str): Original search query
+        
+    Returns:
+        bool: True if email was sent successfully, False otherwise
+    """
+    return await send_email_async(user_email, *_expert_selection_message(experts, query))
+
+def _expert_selection_message(experts, query):
+    """
+    Build the selected experts email.
+    
+    Args:
+        experts (list): List of selected expert dictionaries
+        query (str): Original search query
+        
+    Returns:
+        tuple: (subject, text_body, html_body)
+    """
     subject = "Julie AI: Your Selected Experts"
     
     # Plain text version
@@ -174,4 +286,48 @@ def send_expert_selection_email(user_email, experts, query):
     </html>
     """
     
+    return subject, text_body, html_body
+
+def send_schedule_reminder_email(user_email, expert, scheduled_time, duration_minutes):
+    """
+    Send a reminder for an upcoming call.
+    
+    Args:
+        user_email (str): User's email address
+        expert (dict): Expert information
+        scheduled_time (str): Scheduled time for the call
+        duration_minutes (int): Length of the call in minutes
+        
+    Returns:
+        bool: True if email was sent successfully, False otherwise
+    """
+    subject = f"Julie AI: Reminder - your call with {expert['name']}"
+    
+    # Plain text version
+    text_body = f"Hello,\n\n"
+    text_body += f"This is a reminder of your upcoming call:\n\n"
+    text_body += f"   Expert: {expert['name']}\n"
+    if expert.get('title') and expert.get('company'):
+        text_body += f"   {expert['title']} at {expert['company']}\n"
+    text_body += f"   Time: {scheduled_time}\n"
+    text_body += f"   Duration: {duration_minutes} minutes\n\n"
+    text_body += "Best regards,\nJulie AI"
+    
+    # HTML version
+    html_body = f"""
+    <html>
+    <head></head>
+    <body>
+        <p>Hello,</p>
+        <p>This is a reminder of your upcoming call:</p>
+        <p>
+            <strong>{expert['name']}</strong><br>
+            Time: {scheduled_time}<br>
+            Duration: {duration_minutes} minutes
+        </p>
+        <p>Best regards,<br>Julie AI</p>
+    </body>
+    </html>
+    """
+    
     return send_email(user_email, subject, text_body, html_body)
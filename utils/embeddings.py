@@ -0,0 +1,584 @@
+"""
+Embeddings Module
+
+This module provides offline semantic matching for experts. Vectors combine
+hashed character n-grams, which catch spelling variants, with random-indexing
+co-occurrence vectors fitted on the experts table, which bring together
+words used in the same profiles ("attorney" and "lawyer"). Multi-word
+phrases also contribute their initials, so "machine learning" is close to
+"ML".
+
+A fitted model is saved as a small JSON header plus raw float32 and uint32
+files, opened with mmap so every worker shares one copy in the page cache.
+Each save writes a new versioned directory and then replaces a CURRENT
+pointer, so workers never open a mix of old and new files. Running workers
+re-read the pointer every EMBEDDINGS_CHECK_INTERVAL seconds and switch to a
+newly published version.
+Candidate retrieval uses sign-random-projection LSH and re-ranks candidates
+by exact cosine similarity.
+
+Build a model from the experts table:
+    python -m utils.embeddings
+"""
+
+import json
+import math
+import mmap
+import operator
+import os
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+import zlib
+from array import array
+
+# Directory holding the fitted model versions and the CURRENT pointer
+EMBEDDINGS_DIR = os.getenv('EMBEDDINGS_DIR', 'embeddings')
+
+# Published model versions kept on disk
+EMBEDDINGS_KEEP = int(os.getenv('EMBEDDINGS_KEEP', 2))
+
+# Seconds between checks for a newly published model
+EMBEDDINGS_CHECK_INTERVAL = float(os.getenv('EMBEDDINGS_CHECK_INTERVAL', 5))
+
+# Vector size
+EMBEDDING_DIM = int(os.getenv('EMBEDDING_DIM', 128))
+
+# LSH tables and signature bits per table
+LSH_TABLES = int(os.getenv('LSH_TABLES', 16))
+LSH_BITS = int(os.getenv('LSH_BITS', 8))
+
+# Models with at most this many experts are searched with an exact scan
+EXACT_SEARCH_LIMIT = int(os.getenv('EXACT_SEARCH_LIMIT', 2000))
+
+# Non-zero entries per random projection and per word index vector
+PROJECTION_DENSITY = 16
+INDEX_VECTOR_DENSITY = 8
+
+# Share of a known word's vector that comes from co-occurrence
+CONTEXT_WEIGHT = 0.6
+
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#&]*")
+
+
+def tokenize(text):
+    """
+    Split text into lowercase words plus initials of adjacent word pairs and triples.
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        list: Tokens
+    """
+    words = WORD_PATTERN.findall((text or '').lower())
+    tokens = list(words)
+    for size in (2, 3):
+        for i in range(len(words) - size + 1):
+            tokens.append(''.join(word[0] for word in words[i:i + size]))
+    return tokens
+
+def _hash(value, seed):
+    return zlib.crc32(f"{seed}:{value}".encode('utf-8'))
+
+def _normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector))
+    if norm:
+        for i in range(len(vector)):
+            vector[i] /= norm
+    return vector
+
+def ngram_vector(word, dim):
+    """
+    Hash a word's character 3- to 5-grams into a signed vector.
+
+    Args:
+        word (str): Lowercase word
+        dim (int): Vector size
+
+    Returns:
+        array: Unit-length float vector
+    """
+    vector = array('f', bytes(4 * dim))
+    padded = f"<{word}>"
+    for n in (3, 4, 5):
+        for i in range(len(padded) - n + 1):
+            h = _hash(padded[i:i + n], 'ngram')
+            vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    if len(padded) < 3:
+        h = _hash(padded, 'ngram')
+        vector[h % dim] += 1.0
+    return _normalize(vector)
+
+def _index_vector(word, dim):
+    """Sparse ternary random vector for a word, as (position, sign) pairs."""
+    return [(_hash(word, f"index{i}") % dim, 1.0 if _hash(word, f"sign{i}") & 1 else -1.0)
+            for i in range(INDEX_VECTOR_DENSITY)]
+
+def _mean(vectors, dim):
+    mean = array('f', bytes(4 * dim))
+    for vector in vectors:
+        mean = array('f', map(operator.add, mean, vector))
+    count = max(len(vectors), 1)
+    return array('f', (value / count for value in mean))
+
+def dot(a, b):
+    """Dot product of two equal-length vectors."""
+    return sum(map(operator.mul, a, b))
+
+
+class LSHIndex:
+    """
+    Sign-random-projection LSH over unit vectors.
+
+    Projections are sparse (PROJECTION_DENSITY random +/-1 entries), so a
+    signature costs tables * bits * density multiplications instead of
+    tables * bits * dim.
+    """
+
+    def __init__(self, dim, tables=LSH_TABLES, bits=LSH_BITS, seed=0):
+        self.dim = dim
+        self.tables = tables
+        self.bits = bits
+        rng = random.Random(seed)
+        self.projections = [
+            [[(rng.randrange(dim), rng.choice((-1.0, 1.0))) for _ in range(PROJECTION_DENSITY)]
+             for _ in range(bits)]
+            for _ in range(tables)
+        ]
+        self.buckets = [{} for _ in range(tables)]
+
+    def signatures(self, vector):
+        """
+        Compute one signature per table.
+
+        Args:
+            vector (sequence): Vector to hash
+
+        Returns:
+            list: Integer signatures
+        """
+        result = []
+        for table in self.projections:
+            signature = 0
+            for bit, projection in enumerate(table):
+                if sum(vector[i] * sign for i, sign in projection) >= 0:
+                    signature |= 1 << bit
+            result.append(signature)
+        return result
+
+    def add(self, row, signatures):
+        for table, signature in enumerate(signatures):
+            self.buckets[table].setdefault(signature, []).append(row)
+
+    def candidates(self, vector, probes=1):
+        """
+        Get rows sharing a bucket with the vector in any table.
+
+        Args:
+            vector (sequence): Query vector
+            probes (int, optional): Also probe buckets differing in up to
+                this many of the lowest-margin bits (0 or 1)
+
+        Returns:
+            set: Candidate row numbers
+        """
+        found = set()
+        for table, projections in enumerate(self.projections):
+            margins = []
+            signature = 0
+            for bit, projection in enumerate(projections):
+                value = sum(vector[i] * sign for i, sign in projection)
+                if value >= 0:
+                    signature |= 1 << bit
+                margins.append((abs(value), bit))
+            buckets = self.buckets[table]
+            found.update(buckets.get(signature, ()))
+            if probes:
+                for _, bit in sorted(margins)[:self.bits // 2]:
+                    found.update(buckets.get(signature ^ (1 << bit), ()))
+        return found
+
+
+class EmbeddingModel:
+    """
+    Fitted word vectors and expert vectors with an LSH index.
+
+    Vectors are read through memoryviews over mmapped files when loaded from
+    disk, or held in arrays right after fitting.
+    """
+
+    def __init__(self, dim, vocabulary, idf, word_vectors, expert_ids, expert_vectors, signatures, mean=None,
+                 tables=LSH_TABLES, bits=LSH_BITS):
+        self.dim = dim
+        self.mean = array('f', mean) if mean is not None else None
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.word_vectors = word_vectors
+        self.expert_ids = expert_ids
+        self.expert_rows = {expert_id: row for row, expert_id in enumerate(expert_ids)}
+        self.expert_vectors = expert_vectors
+        self.default_idf = max(idf.values()) if idf else 1.0
+        self.index = LSHIndex(dim, tables, bits)
+        for row in range(len(expert_ids)):
+            self.index.add(row, signatures[row * self.index.tables:(row + 1) * self.index.tables])
+        self._maps = []
+
+    def word_vector(self, word):
+        """
+        Get the vector for a word, falling back to n-grams for unknown words.
+
+        Args:
+            word (str): Lowercase word
+
+        Returns:
+            sequence: Unit-length vector
+        """
+        row = self.vocabulary.get(word)
+        if row is None:
+            return ngram_vector(word, self.dim)
+        return self.word_vectors[row * self.dim:(row + 1) * self.dim]
+
+    def embed(self, text):
+        """
+        Embed a text as the IDF-weighted sum of its word vectors.
+
+        The mean expert vector is subtracted so that similarity reflects what
+        sets a text apart rather than the vocabulary every profile shares.
+
+        Args:
+            text (str): Text to embed
+
+        Returns:
+            array: Unit-length vector
+        """
+        vector = array('f', bytes(4 * self.dim))
+        for token in tokenize(text):
+            weight = self.idf.get(token, self.default_idf)
+            vector = array('f', map(operator.add, vector, [weight * value for value in self.word_vector(token)]))
+        _normalize(vector)
+        if self.mean is not None:
+            vector = _normalize(array('f', map(operator.sub, vector, self.mean)))
+        return vector
+
+    def expert_vector(self, expert):
+        """
+        Get an expert's vector, from the index when known.
+
+        Args:
+            expert (dict): Expert information
+
+        Returns:
+            sequence: Unit-length vector
+        """
+        row = self.expert_rows.get(expert.get('id'))
+        if row is not None:
+            return self.expert_vectors[row * self.dim:(row + 1) * self.dim]
+        return self.embed(expert_text(expert))
+
+    def similarity(self, query_vector, expert):
+        """
+        Cosine similarity between a query vector and an expert.
+
+        Args:
+            query_vector (sequence): Vector from embed
+            expert (dict): Expert information
+
+        Returns:
+            float: Similarity in [-1, 1]
+        """
+        return dot(query_vector, self.expert_vector(expert))
+
+    def _rank_rows(self, query_vector, rows, k):
+        scored = []
+        dim = self.dim
+        vectors = self.expert_vectors
+        for row in rows:
+            scored.append((dot(query_vector, vectors[row * dim:(row + 1) * dim]), row))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(self.expert_ids[row], score) for score, row in scored[:k]]
+
+    def search(self, query, k=10, probes=1):
+        """
+        Find the experts closest to a query using the LSH index.
+
+        Small models are scanned exactly, since the index only pays off once
+        the scan costs more than hashing the query and probing buckets.
+
+        Args:
+            query (str): Search query
+            k (int, optional): Number of experts
+            probes (int, optional): Multi-probe depth (0 or 1)
+
+        Returns:
+            list: (expert_id, similarity) tuples, best first
+        """
+        query_vector = self.embed(query)
+        if len(self.expert_ids) <= EXACT_SEARCH_LIMIT:
+            return self._rank_rows(query_vector, range(len(self.expert_ids)), k)
+        return self._rank_rows(query_vector, self.index.candidates(query_vector, probes), k)
+
+    def search_exact(self, query, k=10):
+        """
+        Find the experts closest to a query by scanning every vector.
+
+        Args:
+            query (str): Search query
+            k (int, optional): Number of experts
+
+        Returns:
+            list: (expert_id, similarity) tuples, best first
+        """
+        return self._rank_rows(self.embed(query), range(len(self.expert_ids)), k)
+
+    def save(self, directory):
+        """
+        Write the model to a new version under a directory and publish it.
+
+        The files are written to a temporary directory, which is renamed and
+        then named in the CURRENT pointer, so workers see either the old or
+        the new model as a whole.
+
+        Args:
+            directory (str): Output directory
+
+        Returns:
+            str: Path of the published model version
+        """
+        os.makedirs(directory, exist_ok=True)
+        version = 1
+        previous = current_path(directory)
+        if previous is not None and os.path.basename(previous).startswith('model-'):
+            version = int(os.path.basename(previous).split('-')[1]) + 1
+
+        name = f"model-{version:08d}"
+        path = os.path.join(directory, name)
+        staging = path + '.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        signatures = array('I')
+        for row in range(len(self.expert_ids)):
+            signatures.extend(self.index.signatures(self.expert_vectors[row * self.dim:(row + 1) * self.dim]))
+
+        meta = {
+            'dim': self.dim,
+            'vocabulary': sorted(self.vocabulary, key=self.vocabulary.get),
+            'idf': self.idf,
+            'expert_ids': self.expert_ids,
+            'mean': list(self.mean) if self.mean is not None else None,
+            'lsh': {'tables': self.index.tables, 'bits': self.index.bits}
+        }
+        for filename, data in (('word_vectors.f32', bytes(self.word_vectors)),
+                               ('expert_vectors.f32', bytes(self.expert_vectors)),
+                               ('signatures.u32', bytes(signatures)),
+                               ('embeddings.json', json.dumps(meta).encode('utf-8'))):
+            with open(os.path.join(staging, filename), 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(staging, path)
+
+        pointer = os.path.join(directory, 'CURRENT')
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(name)
+        os.replace(pointer + '.tmp', pointer)
+
+        # Workers still mapping an older version keep reading it after the removal
+        published = sorted(n for n in os.listdir(directory)
+                           if n.startswith('model-') and not n.endswith('.tmp'))
+        for old in published[:-EMBEDDINGS_KEEP]:
+            shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+        return path
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Open the published model with its vectors memory-mapped.
+
+        Args:
+            directory (str): Model directory, or a single model version
+
+        Returns:
+            EmbeddingModel: Loaded model
+        """
+        directory = current_path(directory) or directory
+        with open(os.path.join(directory, 'embeddings.json')) as f:
+            meta = json.load(f)
+
+        maps = []
+        views = []
+        for name, fmt in (('word_vectors.f32', 'f'), ('expert_vectors.f32', 'f'), ('signatures.u32', 'I')):
+            with open(os.path.join(directory, name), 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    views.append(array(fmt))
+                    continue
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            maps.append(mapped)
+            views.append(memoryview(mapped).cast(fmt))
+
+        vocabulary = {word: row for row, word in enumerate(meta['vocabulary'])}
+        lsh = meta.get('lsh', {})
+        model = cls(meta['dim'], vocabulary, meta['idf'], views[0], meta['expert_ids'], views[1], views[2],
+                    meta.get('mean'), lsh.get('tables', LSH_TABLES), lsh.get('bits', LSH_BITS))
+        model._maps = maps
+        return model
+
+
+def expert_text(expert):
+    """
+    Combine the expert fields used for embedding.
+
+    Args:
+        expert (dict): Expert information
+
+    Returns:
+        str: Combined expert text
+    """
+    return ' '.join(filter(None, [
+        expert.get('title', ''),
+        expert.get('company', ''),
+        expert.get('summary', ''),
+        ' '.join(expert.get('skills', [])),
+        ' '.join([edu.get('field', '') for edu in expert.get('education', [])])
+    ]))
+
+def fit(experts, dim=EMBEDDING_DIM):
+    """
+    Fit word and expert vectors on a set of experts.
+
+    Args:
+        experts (list): List of expert dictionaries
+        dim (int, optional): Vector size
+
+    Returns:
+        EmbeddingModel: Fitted model
+    """
+    documents = [set(tokenize(expert_text(expert))) for expert in experts]
+
+    # Document frequencies and random-indexing context vectors
+    frequency = {}
+    for document in documents:
+        for token in document:
+            frequency[token] = frequency.get(token, 0) + 1
+    vocabulary = {token: row for row, token in enumerate(sorted(frequency))}
+    idf = {token: math.log((1 + len(documents)) / (1 + count)) + 1 for token, count in frequency.items()}
+
+    index_vectors = {token: _index_vector(token, dim) for token in vocabulary}
+    context = [array('f', bytes(4 * dim)) for _ in vocabulary]
+    for document in documents:
+        total = array('f', bytes(4 * dim))
+        for token in document:
+            for position, sign in index_vectors[token]:
+                total[position] += sign * idf[token]
+        for token in document:
+            row = vocabulary[token]
+            context[row] = array('f', map(operator.add, context[row], total))
+            for position, sign in index_vectors[token]:
+                context[row][position] -= sign * idf[token]
+
+    # Remove the component shared by all context vectors before combining
+    for row in context:
+        _normalize(row)
+    mean = _mean(context, dim)
+
+    word_vectors = array('f')
+    for token, row in vocabulary.items():
+        centered = _normalize(array('f', map(operator.sub, context[row], mean)))
+        combined = array('f', (CONTEXT_WEIGHT * a + (1 - CONTEXT_WEIGHT) * b
+                               for a, b in zip(centered, ngram_vector(token, dim))))
+        word_vectors.extend(_normalize(combined))
+
+    model = EmbeddingModel(dim, vocabulary, idf, word_vectors, [], array('f'), array('I'))
+    raw_vectors = [model.embed(expert_text(expert)) for expert in experts]
+    model.mean = _mean(raw_vectors, dim)
+
+    expert_vectors = array('f')
+    for vector in raw_vectors:
+        expert_vectors.extend(_normalize(array('f', map(operator.sub, vector, model.mean))))
+
+    signatures = array('I')
+    for row in range(len(experts)):
+        signatures.extend(model.index.signatures(expert_vectors[row * dim:(row + 1) * dim]))
+
+    return EmbeddingModel(dim, vocabulary, idf, word_vectors,
+                          [expert['id'] for expert in experts], expert_vectors, signatures, model.mean)
+
+
+def current_path(directory=None):
+    """
+    Get the published model version's path.
+
+    Models saved before versioning, with their files directly in the
+    directory, are returned as the directory itself.
+
+    Args:
+        directory (str, optional): Model directory (defaults to EMBEDDINGS_DIR)
+
+    Returns:
+        str: Model version path, or None if no model has been built
+    """
+    directory = directory or EMBEDDINGS_DIR
+    try:
+        with open(os.path.join(directory, 'CURRENT')) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        name = ''
+    if name:
+        return os.path.join(directory, name)
+    if os.path.exists(os.path.join(directory, 'embeddings.json')):
+        return directory
+    return None
+
+
+_model = None
+_model_path = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def get_model():
+    """
+    Get the fitted model from EMBEDDINGS_DIR, swapping to a newer one when it appears.
+
+    Returns:
+        EmbeddingModel: Loaded model, or None if no model has been built
+    """
+    global _model, _model_path, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < EMBEDDINGS_CHECK_INTERVAL:
+        return _model
+
+    with _lock:
+        if now - _checked_at >= EMBEDDINGS_CHECK_INTERVAL:
+            path = current_path()
+            if path is None:
+                _model, _model_path = None, None
+            elif path != _model_path:
+                # Callers holding the old model keep using it; its mappings
+                # are released with the object
+                _model, _model_path = EmbeddingModel.load(path), path
+            _checked_at = now
+    return _model
+
+def build(directory=None):
+    """
+    Fit a model on the experts table and save it.
+
+    Args:
+        directory (str, optional): Output directory (defaults to EMBEDDINGS_DIR)
+
+    Returns:
+        EmbeddingModel: Fitted model
+    """
+    from utils import db
+    model = fit(db.get_all_experts())
+    model.save(directory or EMBEDDINGS_DIR)
+    return model
+
+
+if __name__ == '__main__':
+    built = build(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"Embedded {len(built.expert_ids)} experts with {len(built.vocabulary)} words")
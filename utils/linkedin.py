@@ -2,31 +2,83 @@
 LinkedIn Module
 
 This module handles expert search via LinkedIn API or mock data for development.
+
+search_experts_async is the same search for the async request path; it
+waits for the provider without holding a thread.
 """
 
+import asyncio
 import os
 import json
 import random
 import time
 from datetime import datetime
+from utils import classifier, shared_cache
 
 # Check if we should use mock data
 USE_MOCK = os.getenv('USE_MOCK_LINKEDIN', 'True').lower() in ('true', '1', 't')
 
+# Simulated provider latency for mock searches, in seconds
+MOCK_SEARCH_DELAY = float(os.getenv('MOCK_SEARCH_DELAY', 1.5))
+
+# Seconds a provider response is shared between workers (0 disables it)
+LINKEDIN_CACHE_TTL = float(os.getenv('LINKEDIN_CACHE_TTL', 300))
+
 def search_experts(query):
     """
     Search for experts on LinkedIn based on query.
     
+    Responses are kept in the shared cache for LINKEDIN_CACHE_TTL seconds,
+    so the same query from another worker doesn't call the provider again.
+    
     Args:
         query (str): Search query
         
     Returns:
         list: List of expert dictionaries
     """
+    key = f"{'mock' if USE_MOCK else 'api'}:{query}"
+    if LINKEDIN_CACHE_TTL > 0:
+        experts = shared_cache.get('linkedin', key)
+        if experts is not None:
+            return experts
+    
     if USE_MOCK:
-        return _mock_search_experts(query)
+        experts = _mock_search_experts(query)
     else:
-        return _api_search_experts(query)
+        experts = _api_search_experts(query)
+    
+    if LINKEDIN_CACHE_TTL > 0:
+        shared_cache.set('linkedin', key, experts, ttl=LINKEDIN_CACHE_TTL)
+    return experts
+
+async def search_experts_async(query):
+    """
+    Search for experts on LinkedIn based on query, without blocking the event loop.
+    
+    Shares the cached responses of search_experts.
+    
+    Args:
+        query (str): Search query
+        
+    Returns:
+        list: List of expert dictionaries
+    """
+    key = f"{'mock' if USE_MOCK else 'api'}:{query}"
+    if LINKEDIN_CACHE_TTL > 0:
+        experts = shared_cache.get('linkedin', key)
+        if experts is not None:
+            return experts
+    
+    if USE_MOCK:
+        await asyncio.sleep(MOCK_SEARCH_DELAY)
+        experts = _mock_results(query)
+    else:
+        experts = await _api_search_experts_async(query)
+    
+    if LINKEDIN_CACHE_TTL > 0:
+        shared_cache.set('linkedin', key, experts, ttl=LINKEDIN_CACHE_TTL)
+    return experts
 
 def _mock_search_experts(query):
     """
@@ -39,23 +91,21 @@ def _mock_search_experts(query):
         list: List of mock expert dictionaries
     """
     # Simulate search delay
-    time.sleep(1.5)
-    
-    # Parse query to determine expert type
-    query_lower = query.lower()
-    
-    # Default expert type
-    expert_type = "technology"
+    time.sleep(MOCK_SEARCH_DELAY)
+    return _mock_results(query)
+
+def _mock_results(query):
+    """
+    Build the mock experts for a query.
     
+    Args:
+        query (str): Search query
+        
+    Returns:
+        list: List of mock expert dictionaries
+    """
     # Determine expert type from query
-    if any(term in query_lower for term in ["ai", "machine learning", "data science", "artificial intelligence"]):
-        expert_type = "ai"
-    elif any(term in query_lower for term in ["finance", "investment", "banking", "hedge fund"]):
-        expert_type = "finance"
-    elif any(term in query_lower for term in ["healthcare", "medical", "doctor", "pharma"]):
-        expert_type = "healthcare"
-    elif any(term in query_lower for term in ["legal", "law", "attorney", "compliance"]):
-        expert_type = "legal"
+    expert_type = classifier.primary_category(query)
     
     # Load mock data based on expert type
     mock_experts = _get_mock_experts(expert_type)
@@ -159,3 +209,17 @@ def _api_search_experts(query):
     # This would be implemented with actual LinkedIn API
     # For now, return empty list if not in mock mode
     return []
+
+async def _api_search_experts_async(query):
+    """
+    Search for experts using LinkedIn API from the event loop.
+    
+    Args:
+        query (str): Search query
+        
+    Returns:
+        list: List of expert dictionaries
+    """
+    # This would be implemented with an async HTTP client for the LinkedIn API
+    # For now, return empty list if not in mock mode
+    return []
@@ -0,0 +1,83 @@
+"""
+Models Module
+
+This module defines ExpertBatch, the column-oriented form candidate sets take
+while they are ranked. Experts enter and leave ranking as dictionaries; in
+between, their scores live in one float64 array instead of being written
+into every dictionary on each blend, and only the experts that are returned
+get a 'relevance_score'.
+"""
+
+import heapq
+from array import array
+
+
+class ExpertBatch:
+    """
+    Candidate experts with a parallel score column.
+
+    The expert dictionaries are referenced, not copied. Scores are written
+    through scores_view or blend, and ordering works on positions, so no
+    dictionary is touched until the ranked experts are materialized.
+    """
+
+    def __init__(self, experts):
+        self.experts = experts if isinstance(experts, list) else list(experts)
+        self.scores = array('d', bytes(8 * len(self.experts)))
+
+    def __len__(self):
+        return len(self.experts)
+
+    def scores_view(self):
+        """
+        Get a writable zero-copy view of the score column.
+
+        Returns:
+            memoryview: View over the scores array
+        """
+        return memoryview(self.scores)
+
+    def blend(self, func, values):
+        """
+        Blend one value per expert into the scores, in place.
+
+        Args:
+            func (callable): Takes (score, value) and returns the new score
+            values (iterable): Value per expert, in batch order
+        """
+        scores = self.scores
+        for i, value in enumerate(values):
+            scores[i] = func(scores[i], value)
+
+    def top_k(self, k=None):
+        """
+        Get positions ordered by descending score, keeping ties in batch order.
+
+        Args:
+            k (int, optional): Number of positions to return
+
+        Returns:
+            list: Batch positions
+        """
+        key = self.scores.__getitem__
+        if k is not None:
+            # nlargest is stable, like sorted(..., reverse=True)[:k]
+            return heapq.nlargest(k, range(len(self.scores)), key=key)
+        return sorted(range(len(self.scores)), key=key, reverse=True)
+
+    def ranked(self, positions):
+        """
+        Materialize ranked experts, setting their 'relevance_score'.
+
+        Args:
+            positions (list): Batch positions, e.g. from top_k
+
+        Returns:
+            list: Expert dictionaries in the given order
+        """
+        ranked = []
+        for i in positions:
+            expert = self.experts[i]
+            expert['relevance_score'] = self.scores[i]
+            ranked.append(expert)
+        return ranked
@@ -9,11 +9,26 @@ import time
 import datetime
 import sqlite3
 import os
-from utils import db
+import threading
+from utils import db, shared_cache, tracing
 
 # Database file
 DB_FILE = os.getenv('DB_FILE', 'julie.db')
 
+# Seconds the dashboard snapshot is served before it catches up with other
+# workers' actions (0 recomputes it on every view)
+MONITOR_CACHE_TTL = float(os.getenv('MONITOR_CACHE_TTL', 2))
+
+# Seconds a published snapshot is used as a base by other workers
+MONITOR_SHARED_TTL = float(os.getenv('MONITOR_SHARED_TTL', 3600))
+
+# Recent actions shown on the dashboard
+RECENT_ACTIONS = 20
+
+# Catching up on more new actions than this recomputes the snapshot instead
+CATCH_UP_LIMIT = 5000
+
+@tracing.traced('monitor.log_action')
 def log_action(action_type, details=None):
     """
     Log an action performed by Julie.
@@ -38,15 +53,28 @@ def log_action(action_type, details=None):
     # Convert details to JSON string
     details_json = json.dumps(details) if details else None
     
+    # Same format and clock as the column's CURRENT_TIMESTAMP default
+    timestamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    
     # Insert action
     cursor.execute('''
-    INSERT INTO actions (action_type, details)
-    VALUES (?, ?)
-    ''', (action_type, details_json))
+    INSERT INTO actions (action_type, details, timestamp)
+    VALUES (?, ?, ?)
+    ''', (action_type, details_json, timestamp))
+    action_id = cursor.lastrowid
     
     conn.commit()
     conn.close()
+    
+    # Patch this worker's dashboard snapshot instead of recomputing it
+    _patch_dashboard({
+        'id': action_id,
+        'action_type': action_type,
+        'details': details if details else None,
+        'timestamp': timestamp
+    })
 
+@tracing.traced('monitor.get_recent_actions')
 def get_recent_actions(limit=20):
     """
     Get recent actions for monitoring.
@@ -88,6 +116,7 @@ def get_recent_actions(limit=20):
     
     return actions
 
+@tracing.traced('monitor.get_actions_since')
 def get_actions_since(since_id=0):
     """
     Get actions since a specific ID.
@@ -120,6 +149,7 @@ def get_actions_since(since_id=0):
     conn.close()
     return actions
 
+@tracing.traced('monitor.get_active_searches_count')
 def get_active_searches_count():
     """
     Get the count of active searches.
@@ -145,6 +175,7 @@ def get_active_searches_count():
     
     return count
 
+@tracing.traced('monitor.get_experts_found_today')
 def get_experts_found_today():
     """
     Get the count of experts found today.
@@ -171,6 +202,7 @@ def get_experts_found_today():
     
     return experts_found
 
+@tracing.traced('monitor.get_scheduled_calls_count')
 def get_scheduled_calls_count():
     """
     Get the count of scheduled calls.
@@ -192,20 +224,17 @@ def get_scheduled_calls_count():
     
     return count
 
-def get_monitor_data():
+def _count_dashboard(cursor, today):
     """
-    Get data for the monitor page.
+    Compute the dashboard counters.
     
+    Args:
+        cursor (sqlite3.Cursor): Cursor with sqlite3.Row rows
+        today (str): Today's date as YYYY-MM-DD
+        
     Returns:
-        dict: Dictionary with monitoring data
+        dict: active_searches, experts_found and scheduled_calls
     """
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # Get today's date
-    today = datetime.datetime.now().strftime('%Y-%m-%d')
-    
     # Count active searches (searches initiated today)
     cursor.execute('''
     SELECT COUNT(*) as count FROM actions
@@ -231,26 +260,197 @@ def get_monitor_data():
     ''')
     scheduled_calls = cursor.fetchone()['count']
     
-    # Get recent actions
-    cursor.execute('''
-    SELECT * FROM actions
-    ORDER BY timestamp DESC
-    LIMIT 20
-    ''')
-    
-    actions = []
-    for row in cursor.fetchall():
-        action = dict(row)
-        # Parse JSON details
-        if action['details']:
-            action['details'] = json.loads(action['details'])
-        actions.append(action)
-    
-    conn.close()
-    
     return {
         'active_searches': active_searches,
         'experts_found': experts_found,
-        'scheduled_calls': scheduled_calls,
-        'actions': actions
+        'scheduled_calls': scheduled_calls
     }
+
+# This worker's dashboard snapshot. Counters and recent actions reflect
+# every action up to 'last_id', plus the actions in 'applied' that
+# log_action patched in since.
+_dashboard = None
+_dashboard_lock = threading.Lock()
+
+# Held by the one caller refreshing the snapshot
+_refresh_lock = threading.Lock()
+
+def _today():
+    return datetime.datetime.now().strftime('%Y-%m-%d')
+
+def _apply_action(dashboard, action):
+    """Add one action to a snapshot's counters and recent actions."""
+    if action['id'] <= dashboard['last_id'] or action['id'] in dashboard['applied']:
+        return
+    dashboard['applied'].add(action['id'])
+    
+    # The same conditions as the queries in _count_dashboard
+    today = action['timestamp'][:10] == dashboard['day']
+    details = action['details'] or {}
+    if action['action_type'] == 'search_initiated' and today:
+        dashboard['active_searches'] += 1
+    elif action['action_type'] == 'search_completed' and today:
+        dashboard['experts_found'] += details.get('experts_found') or 0
+    elif action['action_type'] == 'scheduling_completed':
+        dashboard['scheduled_calls'] += 1
+    
+    actions = dashboard['actions']
+    actions.append(action)
+    actions.sort(key=lambda a: (a['timestamp'], a['id']), reverse=True)
+    del actions[RECENT_ACTIONS:]
+
+def _patch_dashboard(action):
+    with _dashboard_lock:
+        if _dashboard is not None and _dashboard['db_file'] == DB_FILE:
+            _apply_action(_dashboard, action)
+
+def _parse_action(row):
+    action = dict(row)
+    # Parse JSON details
+    if action['details']:
+        action['details'] = json.loads(action['details'])
+    return action
+
+def _load_dashboard(cursor, today):
+    """
+    Compute a dashboard snapshot from scratch, in one read transaction.
+    
+    Args:
+        cursor (sqlite3.Cursor): Cursor with sqlite3.Row rows, in autocommit mode
+        today (str): Today's date as YYYY-MM-DD
+        
+    Returns:
+        dict: Counters, recent actions and the last action id they cover
+    """
+    cursor.execute('BEGIN')
+    try:
+        dashboard = _count_dashboard(cursor, today)
+        # Newest first; id breaks ties between actions logged in the same second
+        cursor.execute('''
+        SELECT * FROM actions
+        ORDER BY timestamp DESC, id DESC
+        LIMIT ?
+        ''', (RECENT_ACTIONS,))
+        dashboard['actions'] = [_parse_action(row) for row in cursor.fetchall()]
+        cursor.execute('SELECT COALESCE(MAX(id), 0) AS last_id FROM actions')
+        dashboard['last_id'] = cursor.fetchone()['last_id']
+    finally:
+        cursor.execute('COMMIT')
+    return dashboard
+
+def _refresh_dashboard(dashboard, today):
+    """
+    Bring a snapshot up to date, or build one for a new day or database.
+    
+    A new snapshot starts from the one another worker published to the
+    shared cache when there is one. Either way, only the actions logged
+    since its last id are read.
+    
+    Args:
+        dashboard (dict): Current snapshot, or None
+        today (str): Today's date as YYYY-MM-DD
+        
+    Returns:
+        dict: Refreshed snapshot
+    """
+    conn = sqlite3.connect(DB_FILE, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cache_key = f"dashboard:{DB_FILE}:{today}"
+    
+    if dashboard is None or dashboard['day'] != today or dashboard['db_file'] != DB_FILE:
+        base = shared_cache.get('monitor', cache_key)
+        if base is None:
+            base = _load_dashboard(cursor, today)
+        dashboard = dict(base, day=today, db_file=DB_FILE, applied=set())
+    
+    cursor.execute('''
+    SELECT * FROM actions WHERE id > ? ORDER BY id LIMIT ?
+    ''', (dashboard['last_id'], CATCH_UP_LIMIT + 1))
+    rows = cursor.fetchall()
+    if len(rows) > CATCH_UP_LIMIT:
+        dashboard = dict(_load_dashboard(cursor, today), day=today, db_file=DB_FILE, applied=set())
+        rows = []
+    conn.close()
+    
+    with _dashboard_lock:
+        # Patches from log_action may have landed on the previous snapshot
+        if _dashboard is not None and _dashboard is not dashboard and _dashboard['db_file'] == DB_FILE:
+            for action in _dashboard['actions']:
+                if action['id'] > dashboard['last_id']:
+                    _apply_action(dashboard, action)
+        for row in rows:
+            _apply_action(dashboard, _parse_action(row))
+        if rows:
+            dashboard['last_id'] = rows[-1]['id']
+        dashboard['applied'] = {i for i in dashboard['applied'] if i > dashboard['last_id']}
+        dashboard['refreshed_at'] = time.monotonic()
+        published = None
+        if not dashboard['applied']:
+            published = {key: dashboard[key] for key in
+                         ('active_searches', 'experts_found', 'scheduled_calls', 'last_id')}
+            published['actions'] = list(dashboard['actions'])
+    
+    if published is not None:
+        shared_cache.set('monitor', cache_key, published, ttl=MONITOR_SHARED_TTL)
+    return dashboard
+
+def reset_dashboard():
+    """Drop the dashboard snapshots, e.g. after the database file was replaced."""
+    global _dashboard
+    with _dashboard_lock:
+        _dashboard = None
+    shared_cache.delete('monitor', f"dashboard:{DB_FILE}:{_today()}")
+
+def _dashboard_view(dashboard):
+    with _dashboard_lock:
+        return {
+            'active_searches': dashboard['active_searches'],
+            'experts_found': dashboard['experts_found'],
+            'scheduled_calls': dashboard['scheduled_calls'],
+            'actions': list(dashboard['actions'])
+        }
+
+@tracing.traced('monitor.get_monitor_data')
+def get_monitor_data():
+    """
+    Get data for the monitor page.
+    
+    The data comes from a per-worker snapshot that log_action patches as
+    actions are logged. It is served as is for MONITOR_CACHE_TTL seconds,
+    then one caller catches it up with other workers' actions while
+    concurrent callers keep getting the current snapshot.
+    
+    Returns:
+        dict: Dictionary with monitoring data
+    """
+    global _dashboard
+    today = _today()
+    
+    if MONITOR_CACHE_TTL <= 0:
+        conn = sqlite3.connect(DB_FILE, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        dashboard = _load_dashboard(conn.cursor(), today)
+        conn.close()
+        del dashboard['last_id']
+        return dashboard
+    
+    dashboard = _dashboard
+    usable = dashboard is not None and dashboard['day'] == today and dashboard['db_file'] == DB_FILE
+    if usable and time.monotonic() - dashboard['refreshed_at'] < MONITOR_CACHE_TTL:
+        return _dashboard_view(dashboard)
+    
+    # Single flight: while one caller refreshes, the others serve the
+    # current snapshot, and only wait when there is none for today
+    if not _refresh_lock.acquire(blocking=not usable):
+        return _dashboard_view(dashboard)
+    try:
+        dashboard = _dashboard
+        usable = dashboard is not None and dashboard['day'] == today and dashboard['db_file'] == DB_FILE
+        if not (usable and time.monotonic() - dashboard['refreshed_at'] < MONITOR_CACHE_TTL):
+            dashboard = _refresh_dashboard(dashboard, today)
+            _dashboard = dashboard
+    finally:
+        _refresh_lock.release()
+    
+    return _dashboard_view(dashboard)
@@ -10,6 +10,12 @@ from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 import string
 import re
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from utils import skills as skill_index
+from utils import embeddings, popularity, shared_cache, snapshot
+from utils.models import ExpertBatch
 
 # Download NLTK resources
 try:
@@ -30,6 +36,22 @@ except LookupError:
 # Initialize lemmatizer
 lemmatizer = WordNetLemmatizer()
 
+# Batches with at least this many queries are scored in a process pool
+BATCH_POOL_THRESHOLD = int(os.getenv('BATCH_POOL_THRESHOLD', 200))
+
+# Largest batch request accepted by /api/search/batch
+BATCH_MAX_QUERIES = int(os.getenv('BATCH_MAX_QUERIES', 1000))
+
+# Largest caller-supplied expert pool accepted by /api/search/batch
+BATCH_MAX_EXPERTS = int(os.getenv('BATCH_MAX_EXPERTS', 5000))
+
+# Share of the relevance score taken from embedding similarity when a
+# fitted embeddings model is available (0 disables it)
+SEMANTIC_WEIGHT = float(os.getenv('SEMANTIC_WEIGHT', 0.3))
+
+# Shared cache namespace for preprocessed expert texts
+TOKEN_CACHE_NAMESPACE = 'nlp.tokens'
+
 def preprocess_text(text):
     """
     Preprocess text for NLP analysis.
@@ -61,19 +83,17 @@ def preprocess_text(text):
     
     return tokens
 
-def calculate_relevance_score(expert, query_tokens):
+def _expert_text(expert):
     """
-    Calculate relevance score for an expert based on query tokens.
+    Combine the expert fields used for relevance scoring.
     
     Args:
         expert (dict): Expert information
-        query_tokens (list): Preprocessed query tokens
         
     Returns:
-        float: Relevance score (0-1)
+        str: Combined expert text
     """
-    # Combine relevant expert fields
-    expert_text = ' '.join(filter(None, [
+    return ' '.join(filter(None, [
         expert.get('name', ''),
         expert.get('title', ''),
         expert.get('company', ''),
@@ -81,10 +101,19 @@ def calculate_relevance_score(expert, query_tokens):
         ' '.join(expert.get('skills', [])),
         ' '.join([edu.get('field', '') for edu in expert.get('education', [])])
     ]))
+
+def _score_tokens(expert_tokens, title, query_tokens):
+    """
+    Score preprocessed expert tokens against query tokens.
     
-    # Preprocess expert text
-    expert_tokens = preprocess_text(expert_text)
-    
+    Args:
+        expert_tokens (list or set): Preprocessed expert tokens
+        title (str): Expert title
+        query_tokens (list): Preprocessed query tokens
+        
+    Returns:
+        float: Relevance score (0-1)
+    """
     if not expert_tokens or not query_tokens:
         return 0.0
     
@@ -95,19 +124,151 @@ def calculate_relevance_score(expert, query_tokens):
     score = matches / len(query_tokens) if query_tokens else 0.0
     
     # Boost score for exact title matches
-    if any(token in expert.get('title', '').lower() for token in query_tokens):
+    if any(token in title.lower() for token in query_tokens):
         score *= 1.5
     
     # Cap at 1.0
     return min(score, 1.0)
 
-def rank_experts(experts, query):
+def _score_batch(batch, tokens, query_tokens):
+    """
+    Score a batch of experts into its score column.
+    
+    Gives the same scores as _score_tokens, but checks each distinct title
+    for a query token only once, since candidates share a few titles.
+    
+    Args:
+        batch (ExpertBatch): Candidate experts
+        tokens (list): Preprocessed tokens for each expert
+        query_tokens (list): Preprocessed query tokens
+    """
+    if not query_tokens:
+        return
+    
+    scores = batch.scores_view()
+    count = len(query_tokens)
+    title_boost = {}
+    for i, (expert, expert_tokens) in enumerate(zip(batch.experts, tokens)):
+        if not expert_tokens:
+            continue
+        matches = 0
+        for token in query_tokens:
+            if token in expert_tokens:
+                matches += 1
+        score = matches / count
+        
+        # Boost score for exact title matches
+        title = expert.get('title', '')
+        boost = title_boost.get(title)
+        if boost is None:
+            lowered = title.lower()
+            boost = title_boost[title] = any(token in lowered for token in query_tokens)
+        if boost:
+            score *= 1.5
+        
+        scores[i] = min(score, 1.0)
+
+def expert_tokens(experts):
+    """
+    Preprocess the scoring text of many experts, through the shared cache.
+    
+    Stored experts whose ETag matches the published snapshot take their
+    (distinct) tokens from it. Preprocessing depends only on the text, so
+    other tokens are cached without a TTL and shared by every worker; new
+    ones are written by the cache's background writer.
+    
+    Args:
+        experts (list): List of expert dictionaries
+        
+    Returns:
+        list: Preprocessed tokens for each expert
+    """
+    tokens = [None] * len(experts)
+    snap = snapshot.get_snapshot()
+    if snap is not None:
+        for i, expert in enumerate(experts):
+            if expert.get('etag') and expert.get('id'):
+                row = snap.find(expert['id'])
+                if row is not None and snap.etag(row) == expert['etag']:
+                    tokens[i] = snap.tokens(row)
+    
+    texts = {i: _expert_text(expert) for i, expert in enumerate(experts) if tokens[i] is None}
+    cached = shared_cache.get_many(TOKEN_CACHE_NAMESPACE, list(texts.values()))
+    
+    computed = {}
+    for i, text in texts.items():
+        if text in cached:
+            tokens[i] = cached[text]
+        else:
+            if text not in computed:
+                computed[text] = preprocess_text(text)
+            tokens[i] = computed[text]
+    # Stored by the background writer, so ranking doesn't wait for the cache's write lock
+    shared_cache.set_many_deferred(TOKEN_CACHE_NAMESPACE, computed)
+    
+    return tokens
+
+def calculate_relevance_score(expert, query_tokens):
+    """
+    Calculate relevance score for an expert based on query tokens.
+    
+    Args:
+        expert (dict): Expert information
+        query_tokens (list): Preprocessed query tokens
+        
+    Returns:
+        float: Relevance score (0-1)
+    """
+    # Preprocess expert text
+    expert_tokens = preprocess_text(_expert_text(expert))
+    
+    return _score_tokens(expert_tokens, expert.get('title', ''), query_tokens)
+
+def blend_semantic(score, similarity):
+    """
+    Blend a keyword relevance score with embedding similarity.
+    
+    Args:
+        score (float): Keyword relevance score (0-1)
+        similarity (float): Cosine similarity from the embeddings model
+        
+    Returns:
+        float: Blended relevance score (0-1)
+    """
+    return (1 - SEMANTIC_WEIGHT) * score + SEMANTIC_WEIGHT * max(0.0, similarity)
+
+def blend_popularity(score, prior):
+    """
+    Blend a relevance score with an expert's selection popularity prior.
+    
+    Args:
+        score (float): Relevance score (0-1)
+        prior (float): Prior from popularity.priors (0-1)
+        
+    Returns:
+        float: Blended relevance score (0-1)
+    """
+    weight = popularity.POPULARITY_WEIGHT
+    return (1 - weight) * score + weight * prior
+
+def rank_experts(experts, query, k=None):
     """
     Rank experts based on relevance to the query.
     
+    With k set, only the top k experts are selected using a heap instead of
+    sorting the whole list. Experts with equal scores keep their original
+    order either way. If an embeddings model has been built, the keyword
+    score is blended with embedding similarity by SEMANTIC_WEIGHT. Once
+    experts have been selected, their popularity prior is blended in by
+    popularity.POPULARITY_WEIGHT.
+    
+    Scores are kept in an ExpertBatch while ranking; with k set, only the
+    returned experts get a 'relevance_score'.
+    
     Args:
         experts (list): List of expert dictionaries
         query (str): Search query
+        k (int, optional): Number of top experts to return
         
     Returns:
         list: Ranked list of expert dictionaries
@@ -115,14 +276,222 @@ def rank_experts(experts, query):
     # Preprocess query
     query_tokens = preprocess_text(query)
     
+    batch = ExpertBatch(experts)
+    experts = batch.experts
+    
     # Calculate relevance scores
-    for expert in experts:
-        expert['relevance_score'] = calculate_relevance_score(expert, query_tokens)
+    _score_batch(batch, expert_tokens(experts), query_tokens)
+    
+    model = embeddings.get_model() if SEMANTIC_WEIGHT > 0 else None
+    if model is not None:
+        query_vector = model.embed(query)
+        batch.blend(blend_semantic, (model.similarity(query_vector, expert) for expert in experts))
     
-    # Sort by relevance score (descending)
-    ranked_experts = sorted(experts, key=lambda x: x.get('relevance_score', 0), reverse=True)
+    priors = popularity.priors(experts, query_tokens)
+    if priors is not None:
+        batch.blend(blend_popularity, priors)
     
-    return ranked_experts
+    # Order by relevance score (descending)
+    return batch.ranked(batch.top_k(k))
+
+def build_corpus(experts):
+    """
+    Preprocess a candidate pool once so it can be scored against many queries.
+    
+    Args:
+        experts (list): List of expert dictionaries
+        
+    Returns:
+        dict: Token sets, lowercased titles and a token -> expert index postings map
+    """
+    tokens = []
+    titles = []
+    postings = {}
+    for i, expert in enumerate(experts):
+        expert_tokens = set(preprocess_text(_expert_text(expert)))
+        tokens.append(expert_tokens)
+        titles.append(expert.get('title', '').lower())
+        for token in expert_tokens:
+            postings.setdefault(token, []).append(i)
+    
+    return {'tokens': tokens, 'titles': titles, 'postings': postings}
+
+def score_queries(corpus, query_token_lists):
+    """
+    Score many queries against a preprocessed corpus.
+    
+    Only experts sharing at least one token with a query can score above
+    zero, so each row is built from the postings of the query's tokens
+    instead of visiting every expert.
+    
+    Args:
+        corpus (dict): Corpus from build_corpus
+        query_token_lists (list): Preprocessed tokens for each query
+        
+    Returns:
+        list: One sparse row per query, mapping expert index -> score
+    """
+    postings = corpus['postings']
+    titles = corpus['titles']
+    
+    rows = []
+    for query_tokens in query_token_lists:
+        row = {}
+        if query_tokens:
+            matches = {}
+            for token in query_tokens:
+                for i in postings.get(token, ()):
+                    matches[i] = matches.get(i, 0) + 1
+            for i, count in matches.items():
+                score = count / len(query_tokens)
+                if any(token in titles[i] for token in query_tokens):
+                    score *= 1.5
+                row[i] = min(score, 1.0)
+        rows.append(row)
+    
+    return rows
+
+def score_matrix(corpus, query_token_lists):
+    """
+    Score many queries against a corpus as a dense query x expert matrix.
+    
+    Args:
+        corpus (dict): Corpus from build_corpus
+        query_token_lists (list): Preprocessed tokens for each query
+        
+    Returns:
+        list: List of score lists, one per query, one column per expert
+    """
+    size = len(corpus['tokens'])
+    matrix = []
+    for row in score_queries(corpus, query_token_lists):
+        dense = [0.0] * size
+        for i, score in row.items():
+            dense[i] = score
+        matrix.append(dense)
+    return matrix
+
+def _top_k(row, size, k):
+    """
+    Pick the top k expert indexes from a sparse score row.
+    
+    Ties keep the original candidate order, and zero-score experts fill any
+    remaining places, matching the order rank_experts would produce.
+    
+    Args:
+        row (dict): Expert index -> score
+        size (int): Number of experts in the corpus
+        k (int): Number of results
+        
+    Returns:
+        list: List of (index, score) tuples
+    """
+    top = heapq.nsmallest(k, row.items(), key=lambda item: (-item[1], item[0]))
+    if len(top) < k:
+        for i in range(size):
+            if i not in row:
+                top.append((i, 0.0))
+                if len(top) == k:
+                    break
+    return top
+
+# Corpus shared with pool workers, set by _init_batch_worker
+_worker_corpus = None
+
+def _init_batch_worker(corpus):
+    global _worker_corpus
+    _worker_corpus = corpus
+
+def _score_chunk(query_token_lists, k):
+    rows = score_queries(_worker_corpus, query_token_lists)
+    if k is None:
+        return rows
+    size = len(_worker_corpus['tokens'])
+    return [_top_k(row, size, k) for row in rows]
+
+def _blend_rows(experts, queries, query_token_lists, rows, model):
+    """
+    Blend embedding similarity and popularity priors into keyword score rows.
+    
+    Applies the same blends, in the same order, as rank_experts, so the batch
+    ranking of a query matches its single-query ranking.
+    
+    Args:
+        experts (list): List of expert dictionaries
+        queries (list): List of search queries
+        query_token_lists (list): Preprocessed tokens for each query
+        rows (list): Sparse keyword score rows from score_queries
+        model (EmbeddingModel): Embeddings model, or None
+        
+    Returns:
+        list: Score rows covering every expert where a blend applies
+    """
+    # Expert vectors don't depend on the query
+    vectors = [model.expert_vector(expert) for expert in experts] if model is not None else None
+    blended = []
+    for query, query_tokens, row in zip(queries, query_token_lists, rows):
+        priors = popularity.priors(experts, query_tokens)
+        if vectors is None and priors is None:
+            blended.append(row)
+            continue
+        scores = [row.get(i, 0.0) for i in range(len(experts))]
+        if vectors is not None:
+            query_vector = model.embed(query)
+            scores = [blend_semantic(score, embeddings.dot(query_vector, vector))
+                      for score, vector in zip(scores, vectors)]
+        if priors is not None:
+            scores = [blend_popularity(score, prior) for score, prior in zip(scores, priors)]
+        blended.append(dict(enumerate(scores)))
+    return blended
+
+def rank_experts_batch(experts, queries, k=10, processes=None):
+    """
+    Rank one pool of experts against many queries.
+    
+    The pool is preprocessed once and every query is scored against it in a
+    single pass. Large batches are split across a process pool. Embedding
+    similarity and popularity priors are blended in as in rank_experts.
+    
+    Args:
+        experts (list): List of expert dictionaries
+        queries (list): List of search queries
+        k (int, optional): Number of results per query
+        processes (int, optional): Pool size; defaults to the CPU count once
+            the batch reaches BATCH_POOL_THRESHOLD queries
+        
+    Returns:
+        list: One ranked list of expert dictionaries per query, each with a
+            'relevance_score'
+    """
+    corpus = build_corpus(experts)
+    query_token_lists = [preprocess_text(query) for query in queries]
+    
+    if processes is None and len(queries) >= BATCH_POOL_THRESHOLD:
+        processes = os.cpu_count()
+    
+    model = embeddings.get_model() if SEMANTIC_WEIGHT > 0 else None
+    store = popularity.get_store() if popularity.POPULARITY_WEIGHT > 0 else None
+    # Blends can lift any expert, so rows are only cut to k after blending
+    blend = model is not None or bool(store and store.experts)
+    chunk_k = None if blend else k
+    
+    if processes and processes > 1:
+        chunk_size = -(-len(queries) // processes)
+        chunks = [query_token_lists[i:i + chunk_size] for i in range(0, len(queries), chunk_size)]
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_batch_worker,
+                                 initargs=(corpus,)) as executor:
+            results = [result for chunk in executor.map(_score_chunk, chunks, [chunk_k] * len(chunks))
+                       for result in chunk]
+    else:
+        results = score_queries(corpus, query_token_lists)
+        if not blend:
+            results = [_top_k(row, len(experts), k) for row in results]
+    
+    if blend:
+        results = [_top_k(row, len(experts), k)
+                   for row in _blend_rows(experts, queries, query_token_lists, results, model)]
+    
+    return [[dict(experts[i], relevance_score=score) for i, score in top] for top in results]
 
 def extract_keywords(query, max_keywords=5):
     """
@@ -144,31 +513,78 @@ def extract_keywords(query, max_keywords=5):
     # Return top keywords
     return tokens[:max_keywords]
 
-def analyze_expertise_match(expert, query):
+def analyze_expertise_match(expert, query, query_tokens=None):
     """
     Analyze how well an expert's expertise matches the query.
     
     Args:
         expert (dict): Expert information
         query (str): Search query
+        query_tokens (list, optional): Preprocessed query tokens, to skip
+            preprocessing when the caller already has them
         
     Returns:
         dict: Analysis results
     """
-    query_tokens = preprocess_text(query)
+    if query_tokens is None:
+        query_tokens = preprocess_text(query)
+    
+    vocabulary = skill_index.get_vocabulary()
+    # Intern the expert's terms before building the query bitset so new
+    # terms are covered by it
+    bits = vocabulary.expert_bitsets(expert)
+    query_bits = vocabulary.query_bitset(query_tokens)
     
-    # Extract skills
-    skills = expert.get('skills', [])
+    return _expertise_match(vocabulary, expert, bits, query_bits)
+
+def _expertise_match(vocabulary, expert, bits, query_bits):
+    """
+    Match an expert's interned terms against a query bitset.
     
-    # Extract education fields
-    education_fields = [edu.get('field', '') for edu in expert.get('education', [])]
+    Args:
+        vocabulary (Vocabulary): Vocabulary the bitsets come from
+        expert (dict): Expert information
+        bits (tuple): Skill and education bitsets from Vocabulary.expert_bitsets
+        query_bits (int): Bitset from Vocabulary.query_bitset
+        
+    Returns:
+        dict: Analysis results
+    """
+    skill_bits, education_bits = bits
     
-    # Calculate matches
-    skill_matches = [skill for skill in skills if any(token in skill.lower() for token in query_tokens)]
-    education_matches = [field for field in education_fields if any(token in field.lower() for token in query_tokens)]
+    # Calculate matches; experts without any matching term are settled by the AND
+    skill_matches = []
+    if skill_bits & query_bits:
+        skill_matches = vocabulary.matching_terms(expert.get('skills', []), query_bits)
+    education_matches = []
+    if education_bits & query_bits:
+        education_fields = [edu.get('field', '') for edu in expert.get('education', [])]
+        education_matches = vocabulary.matching_terms(education_fields, query_bits)
     
     return {
         'skill_matches': skill_matches,
         'education_matches': education_matches,
         'match_score': len(skill_matches) + len(education_matches)
     }
+
+def analyze_expertise_matches(experts, query):
+    """
+    Analyze expertise matches for many experts against one query.
+    
+    The query is preprocessed and turned into a term bitset once, and each
+    expert is then matched with bitset intersections. Stored experts reuse
+    their bitsets from earlier calls.
+    
+    Args:
+        experts (list): List of expert dictionaries
+        query (str): Search query
+        
+    Returns:
+        list: Analysis results, one per expert
+    """
+    vocabulary = skill_index.get_vocabulary()
+    # Intern every expert's terms first so the query bitset covers them
+    bitsets = [vocabulary.expert_bitsets(expert) for expert in experts]
+    query_bits = vocabulary.query_bitset(preprocess_text(query))
+    
+    return [_expertise_match(vocabulary, expert, bits, query_bits) for expert, bits in zip(experts, bitsets)]
@@ -0,0 +1,299 @@
+"""
+Popularity Module
+
+This module turns expert selections into a popularity prior for ranking.
+
+Two time-decayed features are kept: how often each expert was selected, and
+how often each expert was selected for a query containing each term. Both
+are updated incrementally by db.record_selections, in the same
+transaction as the selections, as (score, updated_at) pairs whose value
+halves every POPULARITY_HALF_LIFE_DAYS.
+
+Each worker mirrors the tables in memory and picks up changes from other
+workers in the background every POPULARITY_REFRESH_INTERVAL seconds, so
+looking up a candidate's prior is a dictionary read and ranking makes no
+extra database round trips.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from utils import db
+
+logger = logging.getLogger(__name__)
+
+# Days for a selection's weight to halve
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv('POPULARITY_HALF_LIFE_DAYS', 30))
+
+# Share of the relevance score taken from the popularity prior (0 disables it)
+POPULARITY_WEIGHT = float(os.getenv('POPULARITY_WEIGHT', 0.1))
+
+# Weight of selections for the query's terms relative to overall selections
+POPULARITY_TERM_WEIGHT = float(os.getenv('POPULARITY_TERM_WEIGHT', 2.0))
+
+# Decayed selections at which the prior reaches one half
+POPULARITY_SATURATION = float(os.getenv('POPULARITY_SATURATION', 5.0))
+
+# Seconds between background reloads of other workers' updates
+POPULARITY_REFRESH_INTERVAL = float(os.getenv('POPULARITY_REFRESH_INTERVAL', 30))
+
+# Reloads overlap by this many seconds, for clock differences between workers
+CLOCK_SKEW = 5.0
+
+
+def decayed(score, updated_at, now):
+    """
+    Decay a stored score to a point in time.
+
+    Args:
+        score (float): Score at updated_at
+        updated_at (float): Time of the last update
+        now (float): Time to decay to
+
+    Returns:
+        float: Decayed score
+    """
+    return score * 0.5 ** (max(0.0, now - updated_at) / (POPULARITY_HALF_LIFE_DAYS * 86400))
+
+def selection_terms(query):
+    """
+    Get the distinct terms of a query, as used for term features.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        set: Preprocessed terms
+    """
+    # nlp imports this module, so it is imported here
+    from utils import nlp
+    return set(nlp.preprocess_text(query)) if query else set()
+
+
+class PopularityStore:
+    """
+    In-memory mirror of the popularity tables for one worker.
+    """
+
+    def __init__(self):
+        self.experts = {}
+        self.terms = {}
+        self.loaded_until = None
+        self.checked_at = 0.0
+        self.refreshing = False
+        self.lock = threading.Lock()
+
+    def apply(self, expert_rows, term_rows):
+        """
+        Merge stored values; rows hold absolute values, so re-applying is harmless.
+
+        Args:
+            expert_rows (list): (expert_id, score, updated_at) rows
+            term_rows (list): (term, expert_id, score, updated_at) rows
+        """
+        latest = self.loaded_until or 0.0
+        for expert_id, score, updated_at in expert_rows:
+            self.experts[expert_id] = (score, updated_at)
+            latest = max(latest, updated_at)
+        for term, expert_id, score, updated_at in term_rows:
+            self.terms.setdefault(term, {})[expert_id] = (score, updated_at)
+            latest = max(latest, updated_at)
+        self.loaded_until = latest
+
+    def refresh(self):
+        """Load rows updated since the last load."""
+        since = (self.loaded_until or 0.0) - CLOCK_SKEW
+        try:
+            conn = sqlite3.connect(db.DB_FILE)
+            try:
+                expert_rows = conn.execute('''
+                SELECT expert_id, score, updated_at FROM expert_popularity WHERE updated_at >= ?
+                ''', (since,)).fetchall()
+                term_rows = conn.execute('''
+                SELECT term, expert_id, score, updated_at FROM term_popularity WHERE updated_at >= ?
+                ''', (since,)).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.OperationalError:
+            # Tables not created yet; there is nothing to load
+            expert_rows, term_rows = [], []
+        with self.lock:
+            self.apply(expert_rows, term_rows)
+            if self.loaded_until == 0.0:
+                self.loaded_until = time.time() - CLOCK_SKEW
+
+    def ensure_fresh(self):
+        """Load on first use, then refresh in the background when due."""
+        now = time.monotonic()
+        if self.loaded_until is None:
+            with self.lock:
+                first = self.loaded_until is None and not self.refreshing
+                if first:
+                    self.refreshing = True
+            if first:
+                try:
+                    self.refresh()
+                finally:
+                    self.checked_at = now
+                    self.refreshing = False
+            return
+
+        with self.lock:
+            if self.refreshing or now - self.checked_at < POPULARITY_REFRESH_INTERVAL:
+                return
+            self.refreshing = True
+            self.checked_at = now
+
+        def run():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Popularity refresh failed")
+            finally:
+                self.refreshing = False
+        threading.Thread(target=run, daemon=True).start()
+
+    def prior(self, expert_id, terms, now):
+        """
+        Get an expert's popularity prior for a query.
+
+        Args:
+            expert_id (str): Expert ID
+            terms (list): Distinct query terms
+            now (float): Current time
+
+        Returns:
+            float: Prior in [0, 1)
+        """
+        value = 0.0
+        entry = self.experts.get(expert_id)
+        if entry is not None:
+            value = decayed(entry[0], entry[1], now)
+        if terms:
+            term_value = 0.0
+            for term in terms:
+                entry = self.terms.get(term, {}).get(expert_id)
+                if entry is not None:
+                    term_value += decayed(entry[0], entry[1], now)
+            value += POPULARITY_TERM_WEIGHT * term_value / len(terms)
+        return value / (value + POPULARITY_SATURATION)
+
+
+_store = PopularityStore()
+
+def get_store():
+    """
+    Get this worker's popularity store, refreshing it when due.
+
+    Returns:
+        PopularityStore: In-memory popularity features
+    """
+    _store.ensure_fresh()
+    return _store
+
+def _bump(cursor, table, key_columns, key, now):
+    where = ' AND '.join(f'{column} = ?' for column in key_columns)
+    row = cursor.execute(f'SELECT score, updated_at FROM {table} WHERE {where}', key).fetchone()
+    score = (decayed(row[0], row[1], now) if row else 0.0) + 1.0
+    cursor.execute(f'''
+    INSERT OR REPLACE INTO {table} ({', '.join(key_columns)}, score, updated_at)
+    VALUES ({', '.join('?' * len(key_columns))}, ?, ?)
+    ''', tuple(key) + (score, now))
+    return score
+
+def record_selection(cursor, expert_id, query=None, now=None):
+    """
+    Add a selection to the popularity features.
+
+    Called by db.record_selections after it has written the selection,
+    so the updates run inside its write transaction. The caller passes the
+    returned rows to apply_local once the transaction has committed.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of the selection's transaction
+        expert_id (str): Selected expert's ID
+        query (str, optional): Query the expert was selected for
+        now (float, optional): Selection time
+
+    Returns:
+        tuple: (expert rows, term rows) written, as for PopularityStore.apply
+    """
+    now = time.time() if now is None else now
+    expert_rows = [(expert_id, _bump(cursor, 'expert_popularity', ('expert_id',), (expert_id,), now), now)]
+    term_rows = [(term, expert_id, _bump(cursor, 'term_popularity', ('term', 'expert_id'), (term, expert_id), now), now)
+                 for term in sorted(selection_terms(query))]
+    return expert_rows, term_rows
+
+async def _bump_async(conn, table, key_columns, key, now):
+    where = ' AND '.join(f'{column} = ?' for column in key_columns)
+    async with conn.execute(f'SELECT score, updated_at FROM {table} WHERE {where}', key) as cursor:
+        row = await cursor.fetchone()
+    score = (decayed(row[0], row[1], now) if row else 0.0) + 1.0
+    await conn.execute(f'''
+    INSERT OR REPLACE INTO {table} ({', '.join(key_columns)}, score, updated_at)
+    VALUES ({', '.join('?' * len(key_columns))}, ?, ?)
+    ''', tuple(key) + (score, now))
+    return score
+
+async def record_selection_async(conn, expert_id, query=None, now=None):
+    """
+    Add a selection to the popularity features, on an aiosqlite connection.
+
+    Called by async_db.record_selections inside its write transaction,
+    which applies the returned rows once it has committed.
+
+    Args:
+        conn (aiosqlite.Connection): Connection of the selection's transaction
+        expert_id (str): Selected expert's ID
+        query (str, optional): Query the expert was selected for
+        now (float, optional): Selection time
+
+    Returns:
+        tuple: (expert rows, term rows) written, as for PopularityStore.apply
+    """
+    now = time.time() if now is None else now
+    expert_rows = [(expert_id, await _bump_async(conn, 'expert_popularity', ('expert_id',), (expert_id,), now), now)]
+    term_rows = []
+    for term in sorted(selection_terms(query)):
+        score = await _bump_async(conn, 'term_popularity', ('term', 'expert_id'), (term, expert_id), now)
+        term_rows.append((term, expert_id, score, now))
+    return expert_rows, term_rows
+
+def apply_local(expert_rows, term_rows):
+    """
+    Apply committed popularity rows to this worker's store.
+
+    Makes a selection visible to this worker right away; the others pick it
+    up on their next refresh. Call only after the rows' transaction has
+    committed, so a rollback never reaches the store.
+
+    Args:
+        expert_rows (list): (expert_id, score, updated_at) rows
+        term_rows (list): (term, expert_id, score, updated_at) rows
+    """
+    if _store.loaded_until is not None:
+        with _store.lock:
+            _store.apply(expert_rows, term_rows)
+
+def priors(experts, query_tokens):
+    """
+    Get the popularity prior of each candidate.
+
+    Args:
+        experts (list): List of expert dictionaries
+        query_tokens (list): Preprocessed query tokens
+
+    Returns:
+        list: Prior per expert, or None when no expert has been selected
+            or the prior is disabled
+    """
+    if POPULARITY_WEIGHT <= 0:
+        return None
+    store = get_store()
+    if not store.experts:
+        return None
+    terms = list(set(query_tokens))
+    now = time.time()
+    return [store.prior(expert.get('id'), terms, now) for expert in experts]
@@ -0,0 +1,166 @@
+"""
+Profiling Module
+
+This module captures cProfile profiles of live requests and diffs
+tracemalloc snapshots, for looking inside a slow or bloated worker.
+
+Profiling is off unless PROFILING_ENABLED is set. When it is off, app.py
+registers neither the request hooks nor the admin routes.
+"""
+
+import cProfile
+import os
+import pstats
+import threading
+import tracemalloc
+
+# Check if profiling is enabled
+ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() in ('true', '1', 't')
+
+# Token required on admin requests
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+# Stack depth recorded for each allocation
+TRACEMALLOC_FRAMES = int(os.getenv('TRACEMALLOC_FRAMES', 10))
+
+_lock = threading.Lock()
+_remaining = 0
+_captured = 0
+_stats = None
+_baseline = None
+
+def start_profile(requests):
+    """
+    Profile the next N requests, discarding any previous profile.
+
+    Args:
+        requests (int): Number of requests to capture
+    """
+    global _remaining, _captured, _stats
+    with _lock:
+        _remaining = requests
+        _captured = 0
+        _stats = None
+
+def begin_request():
+    """
+    Start profiling the current request if captures are pending.
+
+    Returns:
+        cProfile.Profile: Running profiler, or None if this request isn't profiled
+    """
+    global _remaining
+    if not _remaining:
+        return None
+    with _lock:
+        if not _remaining:
+            return None
+        _remaining -= 1
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another request on this worker is already being profiled
+        with _lock:
+            _remaining += 1
+        return None
+    return profiler
+
+def end_request(profiler):
+    """
+    Stop a request profiler and merge it into the collected profile.
+
+    Args:
+        profiler (cProfile.Profile): Profiler from begin_request
+    """
+    global _captured, _stats
+    profiler.disable()
+    with _lock:
+        if _stats is None:
+            _stats = pstats.Stats(profiler)
+        else:
+            _stats.add(profiler)
+        _captured += 1
+
+def get_profile(limit=30, sort='cumulative'):
+    """
+    Get the top functions from the collected profile.
+
+    Args:
+        limit (int, optional): Number of functions to return
+        sort (str, optional): 'cumulative' or 'tottime'
+
+    Returns:
+        dict: Capture progress and the top functions
+    """
+    with _lock:
+        result = {'captured': _captured, 'remaining': _remaining, 'functions': []}
+        if _stats is None:
+            return result
+
+        column = 3 if sort == 'cumulative' else 2
+        rows = sorted(_stats.stats.items(), key=lambda item: item[1][column], reverse=True)
+
+    for (filename, line, name), (calls, primitive_calls, total, cumulative, _) in rows[:limit]:
+        result['functions'].append({
+            'function': f"{filename}:{line}({name})",
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'total_time': round(total, 6),
+            'cumulative_time': round(cumulative, 6)
+        })
+    return result
+
+def take_snapshot():
+    """
+    Start tracing allocations if needed and record a baseline snapshot.
+
+    Returns:
+        dict: Traced memory figures in bytes
+    """
+    global _baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    _baseline = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    return {'traced_bytes': current, 'peak_bytes': peak}
+
+def diff_snapshot(limit=20, group_by='lineno'):
+    """
+    Compare current allocations with the baseline snapshot.
+
+    Args:
+        limit (int, optional): Number of allocation sites to return
+        group_by (str, optional): 'lineno', 'filename' or 'traceback'
+
+    Returns:
+        dict: Allocation sites with the largest growth, or None without a baseline
+    """
+    if _baseline is None or not tracemalloc.is_tracing():
+        return None
+
+    snapshot = tracemalloc.take_snapshot()
+    # Leave out the profilers' own bookkeeping
+    filters = [tracemalloc.Filter(False, module.__file__) for module in (tracemalloc, cProfile, pstats)]
+    stats = snapshot.filter_traces(filters).compare_to(_baseline.filter_traces(filters), group_by)
+
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        'traced_bytes': current,
+        'peak_bytes': peak,
+        'sites': [{
+            'site': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            'size_bytes': stat.size,
+            'size_diff_bytes': stat.size_diff,
+            'count': stat.count,
+            'count_diff': stat.count_diff
+        } for stat in stats[:limit]]
+    }
+
+def stop_tracing():
+    """Stop tracing allocations and drop the baseline snapshot."""
+    global _baseline
+    _baseline = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
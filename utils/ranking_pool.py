@@ -0,0 +1,272 @@
+"""
+Ranking Pool Module
+
+This module ranks large candidate sets in a persistent process pool, so
+concurrent searches in a threaded worker don't serialize on the GIL.
+
+Each pool process loads the NLTK resources once and reads stored experts
+from the published snapshot (see utils.snapshot), indexing only experts
+stored or changed since. Candidates that came from the experts table (they
+carry an `etag`) are sent as (id, etag) pairs instead of pickled
+dictionaries; a process reloads an expert by id when its ETag matches
+neither the snapshot nor its index. Candidates whose version the database no
+longer holds (rewritten or deleted since they were read) are scored here
+from their own fields. Other candidates are sent as their text fields only.
+Each process returns its shard's top k, and the shards are merged here.
+
+Candidate sets smaller than RANKING_POOL_THRESHOLD are ranked in-process,
+where the round trip would cost more than it saves.
+"""
+
+import atexit
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils import db, embeddings, nlp, popularity, snapshot
+from utils.models import ExpertBatch
+
+logger = logging.getLogger(__name__)
+
+# Candidate sets at least this large are ranked in the pool
+RANKING_POOL_THRESHOLD = int(os.getenv('RANKING_POOL_THRESHOLD', 2000))
+
+# Number of pool processes; 1 or less keeps all ranking in-process
+RANKING_POOL_SIZE = int(os.getenv('RANKING_POOL_SIZE', os.cpu_count() or 1))
+
+# Expert fields used for scoring and embedding
+TEXT_FIELDS = ('id', 'name', 'title', 'company', 'summary', 'skills', 'education')
+
+
+# --- Pool process side ---
+
+# Expert id -> (etag, token set, title, text fields), per pool process
+_index = {}
+_last_rowid = 0
+
+def _text_fields(expert):
+    return {field: expert[field] for field in TEXT_FIELDS if field in expert}
+
+def _index_row(row):
+    expert = {'id': row['id'], 'name': row['name'], 'title': row['title'], 'company': row['company']}
+    if row['details']:
+        expert.update(json.loads(row['details']))
+    profile = _text_fields(expert)
+    tokens = set(nlp.preprocess_text(nlp._expert_text(profile)))
+    _index[row['id']] = (row['etag'], tokens, profile.get('title', '') or '', profile)
+
+def _load_rows(where, params):
+    conn = sqlite3.connect(db.DB_FILE)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(f'SELECT rowid, id, name, title, company, details, etag FROM experts WHERE {where}',
+                        params).fetchall()
+    conn.close()
+    return rows
+
+def _load_new_experts():
+    """Index experts stored since the last load."""
+    global _last_rowid
+    for row in _load_rows('rowid > ? ORDER BY rowid', (_last_rowid,)):
+        _index_row(row)
+        _last_rowid = row['rowid']
+
+def _init_worker(db_file):
+    global _last_rowid
+    db.DB_FILE = db_file
+    # Load stopwords and WordNet now rather than on the first request
+    nlp.preprocess_text('warming up the ranking experts')
+    snap = snapshot.get_snapshot()
+    if snap is not None:
+        # Experts up to the snapshot are read from it on demand
+        _last_rowid = snap.max_rowid
+    _load_new_experts()
+
+def _indexed(item):
+    entry = _index.get(item[0])
+    return entry is not None and entry[0] == item[1]
+
+def _ensure_indexed(items, snap):
+    """
+    Resolve (id, etag) items to snapshot rows, reloading experts neither has at that ETag.
+
+    Returns:
+        tuple: (snapshot row per item, or None where the index or the item's
+            own text fields are used; positions of items whose version is
+            not stored any more)
+    """
+    rows = [None] * len(items)
+    stale = []
+    for i, item in enumerate(items):
+        if not isinstance(item, tuple) or _indexed(item):
+            continue
+        row = snap.find(item[0]) if snap is not None else None
+        if row is not None and snap.etag(row) == item[1]:
+            rows[i] = row
+        else:
+            stale.append(i)
+    if not stale:
+        return rows, []
+
+    _load_new_experts()
+    ids = list(dict.fromkeys(items[i][0] for i in stale if not _indexed(items[i])))
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        for row in _load_rows(f"id IN ({', '.join('?' * len(chunk))})", chunk):
+            _index_row(row)
+    return rows, [i for i in stale if not _indexed(items[i])]
+
+def _score_shard(query, query_tokens, offset, items, k, priors=None):
+    """
+    Score one shard of candidates.
+
+    Args:
+        query (str): Search query
+        query_tokens (list): Preprocessed query tokens
+        offset (int): Position of the shard's first candidate
+        items (list): (id, etag) pairs or text field dictionaries
+        k (int): Number of results, or None for every score
+        priors (list, optional): Popularity prior per item
+
+    Returns:
+        tuple: (position, score) pairs of the shard's top k, or all scores in
+            order when k is None; and the positions of items left unscored
+            because their version is not stored any more
+    """
+    snap = snapshot.get_snapshot()
+    rows, missing = _ensure_indexed(items, snap)
+    skip = set(missing)
+    model = embeddings.get_model() if nlp.SEMANTIC_WEIGHT > 0 else None
+    query_vector = model.embed(query) if model is not None else None
+    matches = snap.matching_tokens(query_tokens) if snap is not None and any(row is not None for row in rows) else {}
+
+    scores = array('d')
+    for i, (item, row) in enumerate(zip(items, rows)):
+        if i in skip:
+            # Scored by the caller from the candidate itself
+            scores.append(0.0)
+            continue
+        if row is not None:
+            # Only membership of query tokens matters for the score
+            tokens = matches.get(row, ())
+            title = snap.title(row)
+            profile = None
+            if model is not None:
+                profile = {'id': item[0]} if item[0] in model.expert_rows else snap.expert(row)
+        elif isinstance(item, tuple):
+            _, tokens, title, profile = _index[item[0]]
+        else:
+            profile = item
+            tokens = set(nlp.preprocess_text(nlp._expert_text(item)))
+            title = item.get('title', '') or ''
+        score = nlp._score_tokens(tokens, title, query_tokens)
+        if model is not None:
+            score = nlp.blend_semantic(score, model.similarity(query_vector, profile))
+        if priors is not None:
+            score = nlp.blend_popularity(score, priors[len(scores)])
+        scores.append(score)
+
+    missing = [offset + i for i in missing]
+    if k is None:
+        return scores, missing
+    return heapq.nsmallest(k, ((offset + i, score) for i, score in enumerate(scores) if i not in skip),
+                           key=lambda item: (-item[1], item[0])), missing
+
+
+# --- Request side ---
+
+_executor = None
+_lock = threading.Lock()
+
+def get_executor():
+    """
+    Get the ranking pool, starting it on first use.
+
+    Returns:
+        ProcessPoolExecutor: Persistent pool
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=RANKING_POOL_SIZE, initializer=_init_worker,
+                                            initargs=(db.DB_FILE,))
+    return _executor
+
+def shutdown():
+    """Stop the ranking pool; it is restarted on next use."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+atexit.register(shutdown)
+
+def _item(expert):
+    # Stored experts travel by id; anything else by its text fields only
+    if expert.get('etag') and expert.get('id'):
+        return (expert['id'], expert['etag'])
+    return _text_fields(expert)
+
+def rank_experts(experts, query, k=None):
+    """
+    Rank experts, in the process pool when the candidate set is large.
+
+    Produces the same order as nlp.rank_experts. With k set, only the
+    returned experts get a 'relevance_score'.
+
+    Args:
+        experts (list): List of expert dictionaries
+        query (str): Search query
+        k (int, optional): Number of top experts to return
+
+    Returns:
+        list: Ranked list of expert dictionaries
+    """
+    if len(experts) < RANKING_POOL_THRESHOLD or RANKING_POOL_SIZE <= 1:
+        return nlp.rank_experts(experts, query, k=k)
+
+    query_tokens = nlp.preprocess_text(query)
+    items = [_item(expert) for expert in experts]
+    # Priors come from this process's popularity store, not the pool's
+    priors = popularity.priors(experts, query_tokens)
+    shard_size = -(-len(items) // RANKING_POOL_SIZE)
+
+    try:
+        executor = get_executor()
+        futures = [executor.submit(_score_shard, query, query_tokens, offset, items[offset:offset + shard_size], k,
+                                   priors[offset:offset + shard_size] if priors is not None else None)
+                   for offset in range(0, len(items), shard_size)]
+        results = [future.result() for future in futures]
+    except BrokenProcessPool:
+        logger.exception("Ranking pool failed; ranking in-process")
+        shutdown()
+        return nlp.rank_experts(experts, query, k=k)
+
+    missing = [position for _, shard_missing in results for position in shard_missing]
+    if missing:
+        # Stored versions changed or were deleted since the candidates were
+        # read; scoring every candidate sets its 'relevance_score'
+        nlp.rank_experts([experts[position] for position in missing], query)
+
+    batch = ExpertBatch(experts)
+    if k is None:
+        scores = batch.scores_view()
+        offset = 0
+        for shard, _ in results:
+            scores[offset:offset + len(shard)] = shard
+            offset += len(shard)
+        for position in missing:
+            scores[position] = experts[position]['relevance_score']
+        return batch.ranked(batch.top_k())
+
+    candidates = [item for shard, _ in results for item in shard]
+    candidates.extend((position, experts[position]['relevance_score']) for position in missing)
+    top = heapq.nsmallest(k, candidates, key=lambda item: (-item[1], item[0]))
+    for position, score in top:
+        batch.scores[position] = score
+    return batch.ranked([position for position, _ in top])
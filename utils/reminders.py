@@ -0,0 +1,332 @@
+"""
+Reminders Module
+
+This module dispatches reminder emails and status transitions for scheduled
+calls. Upcoming schedules are held in a hierarchical timer wheel, and the
+wheel is topped up from the schedules table one time window at a time.
+
+Run it as a standalone service:
+    python -m utils.reminders
+"""
+
+import datetime
+import os
+import sqlite3
+import time
+import schedule
+from utils import db, email, monitor, scheduling
+
+# How long before a call the reminder goes out
+REMINDER_LEAD_MINUTES = int(os.getenv('REMINDER_LEAD_MINUTES', 60))
+
+# How far ahead schedules are loaded into the wheel
+REMINDER_HORIZON_HOURS = int(os.getenv('REMINDER_HORIZON_HOURS', 24))
+
+# How often the dispatcher wakes up
+REMINDER_TICK_SECONDS = int(os.getenv('REMINDER_TICK_SECONDS', 1))
+
+# Statuses that still have a pending timer
+ACTIVE_STATUSES = ('pending', 'reminded')
+
+
+class TimerWheel:
+    """
+    Hierarchical timer wheel with O(1) insert and cancel.
+
+    Level 0 has one slot per tick. Each higher level covers `slots` times the
+    span of the level below, and its slots are cascaded down as the lower level
+    wraps. Timers further out than the top level are parked in its last slot
+    and re-placed when that slot is cascaded.
+    """
+
+    def __init__(self, resolution=1.0, bits=6, levels=4, start=None):
+        self.resolution = resolution
+        self.bits = bits
+        self.slots = 1 << bits
+        self.mask = self.slots - 1
+        self.levels = levels
+        self.current = int((start if start is not None else time.time()) / resolution)
+        self.wheels = [[{} for _ in range(self.slots)] for _ in range(levels)]
+        self.handles = {}
+
+    def __len__(self):
+        return len(self.handles)
+
+    def __contains__(self, key):
+        return key in self.handles
+
+    def schedule(self, key, when, payload=None):
+        """
+        Schedule a timer, replacing any timer with the same key.
+
+        Args:
+            key (hashable): Timer key used for cancellation
+            when (float): Expiry time in seconds since the epoch
+            payload (any, optional): Value returned when the timer fires
+        """
+        self.cancel(key)
+        # Timers already due fire on the next tick
+        tick = max(int(when / self.resolution), self.current + 1)
+        self._place(key, tick, payload)
+
+    def _place(self, key, tick, payload):
+        for level in range(self.levels):
+            shift = level * self.bits
+            if (tick >> shift) - (self.current >> shift) < self.slots:
+                slot = (tick >> shift) & self.mask
+                break
+        else:
+            level = self.levels - 1
+            slot = ((self.current >> (level * self.bits)) - 1) & self.mask
+        self.wheels[level][slot][key] = (tick, payload)
+        self.handles[key] = (level, slot)
+
+    def cancel(self, key):
+        """
+        Cancel a timer.
+
+        Args:
+            key (hashable): Timer key
+
+        Returns:
+            bool: True if a timer was cancelled
+        """
+        handle = self.handles.pop(key, None)
+        if handle is None:
+            return False
+        level, slot = handle
+        del self.wheels[level][slot][key]
+        return True
+
+    def advance(self, now=None):
+        """
+        Advance the wheel to the given time.
+
+        Args:
+            now (float, optional): Current time in seconds since the epoch
+
+        Returns:
+            list: List of (key, payload) tuples for expired timers
+        """
+        target = int((now if now is not None else time.time()) / self.resolution)
+        expired = []
+        while self.current < target:
+            self.current += 1
+
+            # Cascade higher levels whose lower bits just wrapped
+            for level in range(self.levels - 1, 0, -1):
+                if self.current & ((1 << (level * self.bits)) - 1):
+                    continue
+                slot = (self.current >> (level * self.bits)) & self.mask
+                bucket = self.wheels[level][slot]
+                self.wheels[level][slot] = {}
+                for key, (tick, payload) in bucket.items():
+                    self._place(key, max(tick, self.current), payload)
+
+            slot = self.current & self.mask
+            bucket = self.wheels[0][slot]
+            self.wheels[0][slot] = {}
+            for key, (tick, payload) in bucket.items():
+                del self.handles[key]
+                expired.append((key, payload))
+        return expired
+
+
+class ReminderDispatcher:
+    """
+    Fires reminders and completes calls for pending schedules.
+
+    Each active schedule gets a 'remind' timer at its start time minus the
+    reminder lead and a 'complete' timer at its end. The loaded window is
+    extended by time range on every refresh, new bookings are picked up by
+    ID, and schedules moved or cancelled by any worker by their version, so
+    the schedules table is never rescanned. Each row is re-read by primary
+    key before it fires, so cancellations made elsewhere are respected.
+    """
+
+    def __init__(self, db_file=None, now=None):
+        self.db_file = db_file or db.DB_FILE
+        now = now if now is not None else time.time()
+        self.wheel = TimerWheel(resolution=REMINDER_TICK_SECONDS, start=now)
+        self.loaded_until = None
+        self.last_id = 0
+        self.last_version = 0
+
+    def _track(self, schedule_id, scheduled_time, duration_minutes, status, now):
+        start = scheduling.parse_time(scheduled_time)
+        end = start + datetime.timedelta(minutes=duration_minutes or scheduling.DEFAULT_DURATION_MINUTES)
+        # No point reminding about a call that has already started
+        if status == 'pending' and start > now:
+            remind_at = start - datetime.timedelta(minutes=REMINDER_LEAD_MINUTES)
+            self.wheel.schedule(('remind', schedule_id), remind_at.timestamp(), schedule_id)
+        self.wheel.schedule(('complete', schedule_id), end.timestamp(), schedule_id)
+
+    def refresh(self, now=None):
+        """
+        Load schedules that entered the horizon or were created since the last refresh.
+
+        Args:
+            now (float, optional): Current time in seconds since the epoch
+        """
+        now = datetime.datetime.fromtimestamp(now if now is not None else time.time())
+        horizon = now + datetime.timedelta(hours=REMINDER_HORIZON_HOURS, minutes=REMINDER_LEAD_MINUTES)
+
+        conn = sqlite3.connect(self.db_file, isolation_level=None)
+        cursor = conn.cursor()
+
+        # Read everything from one snapshot, and only up to the highest id
+        # seen in it, so a booking committed meanwhile is left for the next
+        # refresh instead of being skipped
+        cursor.execute('BEGIN')
+        cursor.execute('SELECT MAX(id), MAX(version) FROM schedules')
+        max_id, max_version = cursor.fetchone()
+        max_id, max_version = max_id or 0, max_version or 0
+
+        rows = []
+        changed = []
+        if self.loaded_until is None:
+            # First load: everything still active up to the horizon,
+            # including calls that started before we came up
+            cursor.execute('''
+            SELECT id, scheduled_time, duration_minutes, status FROM schedules
+            WHERE id <= ?
+            AND status IN (?, ?)
+            AND scheduled_time < ?
+            ''', (max_id,) + ACTIVE_STATUSES + (horizon.isoformat(sep=' '),))
+            rows.extend(cursor.fetchall())
+        else:
+            # Time window that just entered the horizon
+            cursor.execute('''
+            SELECT id, scheduled_time, duration_minutes, status FROM schedules
+            WHERE id <= ?
+            AND status IN (?, ?)
+            AND scheduled_time >= ? AND scheduled_time < ?
+            ''', (max_id,) + ACTIVE_STATUSES + (self.loaded_until.isoformat(sep=' '), horizon.isoformat(sep=' ')))
+            rows.extend(cursor.fetchall())
+
+            # Bookings created inside the already loaded window
+            cursor.execute('''
+            SELECT id, scheduled_time, duration_minutes, status FROM schedules
+            WHERE id > ? AND id <= ?
+            AND status IN (?, ?)
+            AND scheduled_time < ?
+            ''', (self.last_id, max_id) + ACTIVE_STATUSES + (self.loaded_until.isoformat(sep=' '),))
+            rows.extend(cursor.fetchall())
+
+            # Schedules moved, reassigned or cancelled since the last refresh,
+            # including by other workers
+            cursor.execute('''
+            SELECT id, scheduled_time, duration_minutes, status FROM schedules
+            WHERE version > ? AND version <= ?
+            ''', (self.last_version, max_version))
+            changed = cursor.fetchall()
+
+        cursor.execute('COMMIT')
+        conn.close()
+        self.last_id = max_id
+        self.last_version = max_version
+
+        for schedule_id, scheduled_time, duration_minutes, status in rows:
+            if ('complete', schedule_id) not in self.wheel:
+                self._track(schedule_id, scheduled_time, duration_minutes, status, now)
+
+        # Replace the timers of changed schedules; ones moved past the horizon
+        # come back when the window reaches them
+        for schedule_id, scheduled_time, duration_minutes, status in changed:
+            self.cancel(schedule_id)
+            if status in ACTIVE_STATUSES and scheduling.parse_time(scheduled_time) < horizon:
+                self._track(schedule_id, scheduled_time, duration_minutes, status, now)
+
+        self.loaded_until = horizon
+
+    def cancel(self, schedule_id):
+        """
+        Drop the timers for a schedule.
+
+        Args:
+            schedule_id (int): Schedule ID
+        """
+        self.wheel.cancel(('remind', schedule_id))
+        self.wheel.cancel(('complete', schedule_id))
+
+    def tick(self, now=None):
+        """
+        Refresh from the database and fire all expired timers.
+
+        Args:
+            now (float, optional): Current time in seconds since the epoch
+
+        Returns:
+            int: Number of timers fired
+        """
+        now = now if now is not None else time.time()
+        self.refresh(now)
+        expired = self.wheel.advance(now)
+        for (kind, _), schedule_id in expired:
+            if kind == 'remind':
+                self._send_reminder(schedule_id)
+            else:
+                self._complete(schedule_id)
+        return len(expired)
+
+    def _transition(self, cursor, schedule_id, from_status, to_status):
+        # Compare-and-set so two dispatchers never act on the same row twice
+        cursor.execute('''
+        UPDATE schedules SET status = ?
+        WHERE id = ? AND status = ?
+        ''', (to_status, schedule_id, from_status))
+        return cursor.rowcount == 1
+
+    def _send_reminder(self, schedule_id):
+        conn = sqlite3.connect(self.db_file)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT schedules.*, users.email FROM schedules
+        JOIN users ON users.id = schedules.user_id
+        WHERE schedules.id = ?
+        ''', (schedule_id,))
+        row = cursor.fetchone()
+
+        if not row or not self._transition(cursor, schedule_id, 'pending', 'reminded'):
+            conn.close()
+            return
+        conn.commit()
+        conn.close()
+
+        expert = db.get_expert(row['expert_id']) or {'name': row['expert_id']}
+        email_status = email.send_schedule_reminder_email(
+            row['email'], expert, row['scheduled_time'], row['duration_minutes'])
+
+        monitor.log_action('reminder_sent', {
+            'schedule_id': schedule_id,
+            'user_email': row['email'],
+            'email_status': 'sent' if email_status else 'failed'
+        })
+
+    def _complete(self, schedule_id):
+        self.wheel.cancel(('remind', schedule_id))
+
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        completed = (self._transition(cursor, schedule_id, 'reminded', 'completed')
+                     or self._transition(cursor, schedule_id, 'pending', 'completed'))
+        conn.commit()
+        conn.close()
+
+        if completed:
+            monitor.log_action('call_completed', {'schedule_id': schedule_id})
+
+
+def run():
+    """Run the dispatcher until interrupted."""
+    dispatcher = ReminderDispatcher()
+    schedule.every(REMINDER_TICK_SECONDS).seconds.do(dispatcher.tick)
+    while True:
+        schedule.run_pending()
+        time.sleep(REMINDER_TICK_SECONDS)
+
+
+if __name__ == '__main__':
+    db.init_db()
+    run()
@@ -0,0 +1,338 @@
+"""
+Resilience Module
+
+This module protects calls to external providers with a token-bucket rate
+limiter and a circuit breaker per provider. Both keep their state in SQLite,
+so every worker process shares the same quota and sees the same circuit.
+
+A closed circuit lets calls through and counts consecutive failures (calls
+slower than BREAKER_SLOW_CALL_SECONDS count too). After
+BREAKER_FAILURE_THRESHOLD failures it opens and rejects calls for
+BREAKER_RESET_TIMEOUT seconds, then goes half-open and lets a single probe
+call through: success closes it again, failure re-opens it.
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from utils import db, monitor
+
+# Sustained provider calls per second, and burst size
+PROVIDER_RATE_LIMIT = float(os.getenv('PROVIDER_RATE_LIMIT', 5))
+PROVIDER_BURST = float(os.getenv('PROVIDER_BURST', 10))
+
+# Consecutive failures that open a circuit
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+
+# Seconds an open circuit waits before letting a probe through
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', 30))
+
+# Successful calls slower than this count as failures, in seconds
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', 10))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling a provider that is rate limited or open-circuited."""
+
+    def __init__(self, provider, reason):
+        self.provider = provider
+        self.reason = reason
+        super().__init__(f"Provider {provider} unavailable: {reason}")
+
+
+def _transaction():
+    conn = sqlite3.connect(db.DB_FILE, timeout=10, isolation_level=None)
+    conn.execute('BEGIN IMMEDIATE')
+    return conn
+
+
+class TokenBucket:
+    """
+    Token bucket shared across workers through the rate_limits table.
+
+    Args:
+        name (str): Bucket name, e.g. the provider
+        rate (float): Tokens added per second
+        capacity (float): Maximum tokens, i.e. the burst size
+    """
+
+    def __init__(self, name, rate=PROVIDER_RATE_LIMIT, capacity=PROVIDER_BURST):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens from the bucket if enough are available.
+
+        Args:
+            tokens (float, optional): Tokens to take
+
+        Returns:
+            bool: True if the tokens were taken
+        """
+        now = time.time()
+        conn = _transaction()
+        try:
+            row = conn.execute('SELECT tokens, updated_at FROM rate_limits WHERE name = ?',
+                               (self.name,)).fetchone()
+            if row is None:
+                available = self.capacity
+            else:
+                available = min(self.capacity, row[0] + (now - row[1]) * self.rate)
+
+            allowed = available >= tokens
+            if allowed:
+                available -= tokens
+            conn.execute('''
+            INSERT INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+            ''', (self.name, available, now))
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        return allowed
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker shared across workers through the circuit_breakers table.
+
+    Args:
+        name (str): Provider name
+        failure_threshold (int): Consecutive failures that open the circuit
+        reset_timeout (float): Seconds before an open circuit is probed
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+    def _read(self, conn):
+        row = conn.execute('SELECT state, failures, opened_at FROM circuit_breakers WHERE name = ?',
+                           (self.name,)).fetchone()
+        return row if row is not None else (CLOSED, 0, None)
+
+    def _write(self, conn, state, failures, opened_at):
+        conn.execute('''
+        INSERT INTO circuit_breakers (name, state, failures, opened_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET
+            state = excluded.state, failures = excluded.failures, opened_at = excluded.opened_at
+        ''', (self.name, state, failures, opened_at))
+
+    def _transition(self, old_state, new_state, failures):
+        monitor.log_action('circuit_state_changed', {
+            'provider': self.name,
+            'from': old_state,
+            'to': new_state,
+            'failures': failures
+        })
+
+    def state(self):
+        """
+        Get the current state without changing it.
+
+        Returns:
+            str: 'closed', 'open' or 'half_open'
+        """
+        conn = sqlite3.connect(db.DB_FILE)
+        try:
+            return self._read(conn)[0]
+        finally:
+            conn.close()
+
+    def allow(self):
+        """
+        Check whether a call may go through.
+
+        An open circuit past its reset timeout becomes half-open, and the
+        caller that makes that transition gets the single probe call.
+
+        Returns:
+            bool: True if the call may proceed
+        """
+        now = time.time()
+        conn = sqlite3.connect(db.DB_FILE)
+        state, failures, opened_at = self._read(conn)
+        conn.close()
+        if state == CLOSED:
+            return True
+        # Open and still cooling down, or half-open with a probe in flight.
+        # Claiming a probe resets opened_at, so a probe that never reports
+        # back is replaced after another reset timeout.
+        if now - opened_at < self.reset_timeout:
+            return False
+
+        conn = _transaction()
+        try:
+            state, failures, opened_at = self._read(conn)
+            if state == CLOSED:
+                conn.execute('COMMIT')
+                return True
+            if now - opened_at < self.reset_timeout:
+                conn.execute('COMMIT')
+                return False
+            old_state = state
+            self._write(conn, HALF_OPEN, failures, now)
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+        if old_state != HALF_OPEN:
+            self._transition(old_state, HALF_OPEN, failures)
+        return True
+
+    def record_success(self):
+        """Record a successful call, closing a half-open circuit."""
+        conn = sqlite3.connect(db.DB_FILE)
+        state, failures, _ = self._read(conn)
+        conn.close()
+        # A late success from before the circuit opened doesn't close it
+        if state == OPEN or (state == CLOSED and failures == 0):
+            return
+
+        conn = _transaction()
+        try:
+            old_state = self._read(conn)[0]
+            if old_state != OPEN:
+                self._write(conn, CLOSED, 0, None)
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+        if old_state == HALF_OPEN:
+            self._transition(old_state, CLOSED, 0)
+
+    def record_failure(self):
+        """Record a failed call, opening the circuit if needed."""
+        now = time.time()
+        conn = _transaction()
+        try:
+            state, failures, opened_at = self._read(conn)
+            failures += 1
+            if state == HALF_OPEN or (state == CLOSED and failures >= self.failure_threshold):
+                new_state, opened_at = OPEN, now
+            else:
+                new_state = state
+            self._write(conn, new_state, failures, opened_at)
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+        if new_state != state:
+            self._transition(state, new_state, failures)
+
+
+_buckets = {}
+_breakers = {}
+
+def get_bucket(provider):
+    """
+    Get the rate limiter for a provider.
+
+    Args:
+        provider (str): Provider name
+
+    Returns:
+        TokenBucket: Shared token bucket
+    """
+    if provider not in _buckets:
+        _buckets[provider] = TokenBucket(provider)
+    return _buckets[provider]
+
+def get_breaker(provider):
+    """
+    Get the circuit breaker for a provider.
+
+    Args:
+        provider (str): Provider name
+
+    Returns:
+        CircuitBreaker: Shared circuit breaker
+    """
+    if provider not in _breakers:
+        _breakers[provider] = CircuitBreaker(provider)
+    return _breakers[provider]
+
+def _reject(provider, reason):
+    monitor.log_action('provider_rejected', {'provider': provider, 'reason': reason})
+    raise ProviderUnavailable(provider, reason)
+
+def call(provider, func, *args, **kwargs):
+    """
+    Call a provider through its circuit breaker and rate limiter.
+
+    Args:
+        provider (str): Provider name
+        func (callable): Provider function
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The return value of func
+
+    Raises:
+        ProviderUnavailable: If the circuit is open or the rate limit is hit
+    """
+    breaker = get_breaker(provider)
+    if not breaker.allow():
+        _reject(provider, 'circuit_open')
+    if not get_bucket(provider).acquire():
+        _reject(provider, 'rate_limited')
+
+    started = time.time()
+    try:
+        result = func(*args, **kwargs)
+    except Exception:
+        breaker.record_failure()
+        raise
+
+    if time.time() - started > BREAKER_SLOW_CALL_SECONDS:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return result
+
+async def call_async(provider, func, *args, **kwargs):
+    """
+    Await a provider coroutine through its circuit breaker and rate limiter.
+
+    The breaker and bucket updates are short SQLite transactions, which run
+    on a thread so lock waits don't stall the event loop.
+
+    Args:
+        provider (str): Provider name
+        func (callable): Provider coroutine function
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The result of awaiting func
+
+    Raises:
+        ProviderUnavailable: If the circuit is open or the rate limit is hit
+    """
+    breaker = get_breaker(provider)
+    if not await asyncio.to_thread(breaker.allow):
+        await asyncio.to_thread(_reject, provider, 'circuit_open')
+    if not await asyncio.to_thread(get_bucket(provider).acquire):
+        await asyncio.to_thread(_reject, provider, 'rate_limited')
+
+    started = time.time()
+    try:
+        result = await func(*args, **kwargs)
+    except Exception:
+        await asyncio.to_thread(breaker.record_failure)
+        raise
+
+    if time.time() - started > BREAKER_SLOW_CALL_SECONDS:
+        await asyncio.to_thread(breaker.record_failure)
+    else:
+        await asyncio.to_thread(breaker.record_success)
+    return result
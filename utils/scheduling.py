@@ -0,0 +1,490 @@
+"""
+Scheduling Module
+
+This module handles conflict detection and free-slot search for scheduled calls.
+Bookings from the schedules table are loaded into a sorted interval index per
+expert and per user, so checks don't need an overlap query per request.
+"""
+
+import bisect
+import datetime
+import heapq
+import os
+import sqlite3
+import threading
+from utils import db
+
+# Default call length in minutes
+DEFAULT_DURATION_MINUTES = int(os.getenv('DEFAULT_CALL_DURATION', 30))
+
+# Business hours used when searching for free slots
+BUSINESS_HOURS_START = int(os.getenv('BUSINESS_HOURS_START', 9))
+BUSINESS_HOURS_END = int(os.getenv('BUSINESS_HOURS_END', 17))
+
+# Schedules in these states no longer block the participants' calendars
+INACTIVE_STATUSES = ('cancelled', 'failed')
+
+
+class SchedulingConflict(Exception):
+    """Raised when a call overlaps an existing booking."""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(f"Call conflicts with {len(conflicts)} existing booking(s)")
+
+
+def check_duration(duration_minutes):
+    """
+    Check that a call fits inside one business day.
+
+    Args:
+        duration_minutes (int): Length of the call in minutes
+
+    Returns:
+        timedelta: Call length
+
+    Raises:
+        ValueError: If the call is not positive or longer than business hours
+    """
+    duration = datetime.timedelta(minutes=duration_minutes)
+    business_day = datetime.timedelta(hours=BUSINESS_HOURS_END - BUSINESS_HOURS_START)
+    if duration <= datetime.timedelta(0) or duration > business_day:
+        raise ValueError(f"Call length must be between 1 and {int(business_day.total_seconds()) // 60} minutes")
+    return duration
+
+def parse_time(value):
+    """
+    Parse a scheduled time.
+
+    Args:
+        value (str or datetime): ISO formatted time or datetime
+
+    Returns:
+        datetime: Naive datetime
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(value)
+
+
+class IntervalIndex:
+    """
+    Sorted index of the bookings for a single participant.
+
+    Bookings are kept ordered by start time. Because no call is longer than
+    max_duration, every booking that can overlap [start, end) starts inside
+    [start - max_duration, end), which is found with two binary searches.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.intervals = []
+        self.starts = {}
+        self.max_duration = datetime.timedelta(0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, schedule_id, start, end):
+        """
+        Add a booking to the index.
+
+        Args:
+            schedule_id (int): Schedule ID
+            start (datetime): Call start
+            end (datetime): Call end
+        """
+        if schedule_id in self.starts:
+            self.remove(schedule_id)
+        key = (start, schedule_id)
+        position = bisect.bisect_left(self.keys, key)
+        self.keys.insert(position, key)
+        self.intervals.insert(position, (start, end, schedule_id))
+        self.starts[schedule_id] = start
+        if end - start > self.max_duration:
+            self.max_duration = end - start
+
+    def add_many(self, bookings):
+        """
+        Add a batch of bookings, sorting once instead of per insert.
+
+        Args:
+            bookings (list): List of (schedule_id, start, end) tuples
+        """
+        for schedule_id, start, end in bookings:
+            if schedule_id in self.starts:
+                self.remove(schedule_id)
+            self.intervals.append((start, end, schedule_id))
+            self.starts[schedule_id] = start
+            if end - start > self.max_duration:
+                self.max_duration = end - start
+        self.intervals.sort(key=lambda interval: (interval[0], interval[2]))
+        self.keys = [(start, schedule_id) for start, _, schedule_id in self.intervals]
+
+    def remove(self, schedule_id):
+        """
+        Remove a booking from the index.
+
+        Args:
+            schedule_id (int): Schedule ID
+
+        Returns:
+            bool: True if the booking was indexed
+        """
+        start = self.starts.pop(schedule_id, None)
+        if start is None:
+            return False
+        position = bisect.bisect_left(self.keys, (start, schedule_id))
+        del self.keys[position]
+        del self.intervals[position]
+        return True
+
+    def overlapping(self, start, end):
+        """
+        Get bookings overlapping a time range.
+
+        Args:
+            start (datetime): Range start
+            end (datetime): Range end
+
+        Returns:
+            list: List of (start, end, schedule_id) tuples
+        """
+        lo = bisect.bisect_left(self.keys, (start - self.max_duration,))
+        hi = bisect.bisect_left(self.keys, (end,))
+        return [interval for interval in self.intervals[lo:hi] if interval[1] > start]
+
+    def iter_from(self, start):
+        """
+        Iterate over bookings that may still be running at or after a time.
+
+        Args:
+            start (datetime): Earliest time of interest
+
+        Yields:
+            tuple: (start, end, schedule_id) in start order
+        """
+        position = bisect.bisect_left(self.keys, (start - self.max_duration,))
+        for i in range(position, len(self.intervals)):
+            yield self.intervals[i]
+
+
+class Scheduler:
+    """
+    In-memory view of the schedules table for one worker.
+
+    The view is refreshed incrementally: new schedules by ID, and schedules
+    cancelled or moved by any worker by their version. Bookings made through
+    book() are checked and inserted inside a single write transaction, so two
+    workers can't double-book the same slot.
+    """
+
+    def __init__(self, db_file=None):
+        self.db_file = db_file or db.DB_FILE
+        self.indexes = {}
+        self.participants = {}
+        self.last_id = 0
+        self.last_version = 0
+        self.lock = threading.RLock()
+
+    def _index(self, kind, key):
+        index = self.indexes.get((kind, key))
+        if index is None:
+            index = self.indexes[(kind, key)] = IntervalIndex()
+        return index
+
+    def _add(self, schedule_id, user_id, expert_id, start, duration_minutes):
+        end = start + datetime.timedelta(minutes=duration_minutes or DEFAULT_DURATION_MINUTES)
+        self._index('user', user_id).add(schedule_id, start, end)
+        self._index('expert', expert_id).add(schedule_id, start, end)
+        self.participants[schedule_id] = (user_id, expert_id)
+
+    def _discard(self, schedule_id):
+        participants = self.participants.pop(schedule_id, None)
+        if participants:
+            user_id, expert_id = participants
+            self._index('user', user_id).remove(schedule_id)
+            self._index('expert', expert_id).remove(schedule_id)
+
+    def _load(self, cursor):
+        cursor.execute('''
+        SELECT id, user_id, expert_id, scheduled_time, duration_minutes, status, version
+        FROM schedules
+        WHERE id > ? OR version > ?
+        ORDER BY id
+        ''', (self.last_id, self.last_version))
+
+        batches = {}
+        for schedule_id, user_id, expert_id, scheduled_time, duration, status, version in cursor.fetchall():
+            self.last_id = max(self.last_id, schedule_id)
+            self.last_version = max(self.last_version, version)
+            # A changed schedule may have been cancelled, moved or reassigned
+            self._discard(schedule_id)
+            if status in INACTIVE_STATUSES:
+                continue
+            start = parse_time(scheduled_time)
+            end = start + datetime.timedelta(minutes=duration or DEFAULT_DURATION_MINUTES)
+            batches.setdefault(('user', user_id), []).append((schedule_id, start, end))
+            batches.setdefault(('expert', expert_id), []).append((schedule_id, start, end))
+            self.participants[schedule_id] = (user_id, expert_id)
+
+        for (kind, key), bookings in batches.items():
+            self._index(kind, key).add_many(bookings)
+
+    def refresh(self):
+        """Load schedules added or changed since the last refresh."""
+        with self.lock:
+            conn = sqlite3.connect(self.db_file)
+            self._load(conn.cursor())
+            conn.close()
+
+    def _user_id(self, user_email):
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM users WHERE email = ?', (user_email,))
+        user = cursor.fetchone()
+        conn.close()
+        return user[0] if user else None
+
+    def _conflicts(self, user_id, expert_ids, start, end):
+        conflicts = []
+        keys = [('expert', expert_id) for expert_id in expert_ids]
+        if user_id is not None:
+            keys.append(('user', user_id))
+        for key in keys:
+            index = self.indexes.get(key)
+            if index is None:
+                continue
+            for booked_start, booked_end, schedule_id in index.overlapping(start, end):
+                conflicts.append({
+                    'schedule_id': schedule_id,
+                    'participant': key[0],
+                    'participant_id': key[1],
+                    'start': booked_start.isoformat(),
+                    'end': booked_end.isoformat()
+                })
+        return conflicts
+
+    def check_conflicts(self, user_email, expert_ids, scheduled_time, duration_minutes=None):
+        """
+        Find bookings that overlap a proposed call.
+
+        Args:
+            user_email (str): User's email address
+            expert_ids (list): Expert IDs joining the call
+            scheduled_time (str or datetime): Proposed start time
+            duration_minutes (int, optional): Length of the call in minutes
+
+        Returns:
+            list: List of conflicting booking dictionaries
+        """
+        start = parse_time(scheduled_time)
+        end = start + datetime.timedelta(minutes=duration_minutes or DEFAULT_DURATION_MINUTES)
+        user_id = self._user_id(user_email)
+        with self.lock:
+            self.refresh()
+            return self._conflicts(user_id, expert_ids, start, end)
+
+    def book(self, user_email, expert_id, scheduled_time, duration_minutes=None):
+        """
+        Book a call if neither participant is busy.
+
+        Args:
+            user_email (str): User's email address
+            expert_id (str): Expert ID
+            scheduled_time (str or datetime): Call start time
+            duration_minutes (int, optional): Length of the call in minutes
+
+        Returns:
+            int: Schedule ID
+
+        Raises:
+            SchedulingConflict: If the call overlaps an existing booking
+            ValueError: If the call doesn't fit inside business hours
+        """
+        duration_minutes = duration_minutes or DEFAULT_DURATION_MINUTES
+        start = parse_time(scheduled_time)
+        end = start + check_duration(duration_minutes)
+        user_id = db.get_or_create_user(user_email)
+
+        with self.lock:
+            conn = sqlite3.connect(self.db_file, timeout=10, isolation_level=None)
+            cursor = conn.cursor()
+            try:
+                # Hold the write lock while catching up so no other worker can
+                # insert between the check and our own insert
+                cursor.execute('BEGIN IMMEDIATE')
+                self._load(cursor)
+
+                conflicts = self._conflicts(user_id, [expert_id], start, end)
+                if conflicts:
+                    cursor.execute('ROLLBACK')
+                    raise SchedulingConflict(conflicts)
+
+                cursor.execute('''
+                INSERT INTO schedules (user_id, expert_id, scheduled_time, duration_minutes)
+                VALUES (?, ?, ?, ?)
+                ''', (user_id, expert_id, start.isoformat(sep=' '), duration_minutes))
+                schedule_id = cursor.lastrowid
+                cursor.execute('COMMIT')
+            finally:
+                conn.close()
+
+            self._add(schedule_id, user_id, expert_id, start, duration_minutes)
+            self.last_id = max(self.last_id, schedule_id)
+
+        return schedule_id
+
+    def cancel(self, schedule_id):
+        """
+        Cancel a booking and free its slot.
+
+        Args:
+            schedule_id (int): Schedule ID
+        """
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute("UPDATE schedules SET status = 'cancelled' WHERE id = ?", (schedule_id,))
+        conn.commit()
+        conn.close()
+
+        with self.lock:
+            self._discard(schedule_id)
+
+    def find_free_slots(self, user_email, expert_ids, duration_minutes=None, k=5,
+                        start=None, granularity_minutes=15, horizon_days=30):
+        """
+        Find the next free slots shared by a user and a group of experts.
+
+        Args:
+            user_email (str): User's email address
+            expert_ids (list): Expert IDs that must all be free
+            duration_minutes (int, optional): Length of the call in minutes
+            k (int, optional): Number of slots to return
+            start (datetime, optional): Earliest slot start (defaults to now)
+            granularity_minutes (int, optional): Slot start alignment
+            horizon_days (int, optional): How far ahead to search
+
+        Returns:
+            list: List of (start, end) datetime tuples in time order
+
+        Raises:
+            ValueError: If the call doesn't fit inside business hours
+        """
+        duration = check_duration(duration_minutes or DEFAULT_DURATION_MINUTES)
+        start = parse_time(start) if start else datetime.datetime.now()
+        horizon = start + datetime.timedelta(days=horizon_days)
+        user_id = self._user_id(user_email)
+
+        with self.lock:
+            self.refresh()
+            keys = [('expert', expert_id) for expert_id in expert_ids]
+            if user_id is not None:
+                keys.append(('user', user_id))
+
+            # Merge everyone's bookings into one stream ordered by start time
+            busy = heapq.merge(*[
+                self.indexes[key].iter_from(start) for key in keys if key in self.indexes
+            ])
+
+            slots = []
+            cursor = _align(start, duration, granularity_minutes, horizon)
+            booking = next(busy, None)
+            while len(slots) < k and cursor < horizon:
+                end = cursor + duration
+                while booking and booking[1] <= cursor:
+                    booking = next(busy, None)
+                if booking and booking[0] < end:
+                    cursor = _align(booking[1], duration, granularity_minutes, horizon)
+                    continue
+                slots.append((cursor, end))
+                cursor = _align(end, duration, granularity_minutes, horizon)
+
+        return slots
+
+
+def _align(moment, duration, granularity_minutes, limit):
+    """
+    Move a time forward to the next slot start inside business hours.
+
+    Args:
+        moment (datetime): Candidate start time
+        duration (timedelta): Length of the call
+        granularity_minutes (int): Slot start alignment
+        limit (datetime): Stop searching at this time
+
+    Returns:
+        datetime: Aligned start time, or a time at or past limit if there is none
+    """
+    step = datetime.timedelta(minutes=granularity_minutes)
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    remainder = (moment - midnight) % step
+    if remainder:
+        moment += step - remainder
+
+    while moment < limit:
+        midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        day_start = midnight + datetime.timedelta(hours=BUSINESS_HOURS_START)
+        day_end = midnight + datetime.timedelta(hours=BUSINESS_HOURS_END)
+        if moment.weekday() >= 5 or moment + duration > day_end:
+            moment = midnight + datetime.timedelta(days=1, hours=BUSINESS_HOURS_START)
+        elif moment < day_start:
+            moment = day_start
+        else:
+            return moment
+    return moment
+
+
+# Shared scheduler for this process
+_scheduler = None
+
+def get_scheduler():
+    """
+    Get the process-wide scheduler, loading it on first use.
+
+    Returns:
+        Scheduler: Scheduler instance
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler()
+        _scheduler.refresh()
+    return _scheduler
+
+def book_call(user_email, expert_id, scheduled_time, duration_minutes=None):
+    """
+    Book a call, raising SchedulingConflict if either side is busy.
+
+    Args:
+        user_email (str): User's email address
+        expert_id (str): Expert ID
+        scheduled_time (str or datetime): Call start time
+        duration_minutes (int, optional): Length of the call in minutes
+
+    Returns:
+        int: Schedule ID
+
+    Raises:
+        SchedulingConflict: If the call overlaps an existing booking
+        ValueError: If the call doesn't fit inside business hours
+    """
+    return get_scheduler().book(user_email, expert_id, scheduled_time, duration_minutes)
+
+def find_free_slots(user_email, expert_ids, duration_minutes=None, k=5, start=None):
+    """
+    Find the next k free slots common to a user and a group of experts.
+
+    Args:
+        user_email (str): User's email address
+        expert_ids (list): Expert IDs
+        duration_minutes (int, optional): Length of the call in minutes
+        k (int, optional): Number of slots to return
+        start (datetime, optional): Earliest slot start
+
+    Returns:
+        list: List of (start, end) datetime tuples
+
+    Raises:
+        ValueError: If the call doesn't fit inside business hours
+    """
+    return get_scheduler().find_free_slots(user_email, expert_ids, duration_minutes, k, start)
@@ -0,0 +1,412 @@
+"""
+Search Module
+
+This module runs expert searches (provider search through the catalog, plus
+ranking) and caches the ranked results per normalized query, so repeat
+requests can be served without re-ranking.
+
+Searches can also be run step by step with iter_search, which ranks the
+stored candidates before the provider is called so a streamed results page
+can show them while the provider search is still running, and from an
+event loop with run_search_async.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from utils import catalog, db, dedup, embeddings, ranking_pool, tracing
+
+# How long ranked results stay fresh, in seconds
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 300))
+
+# Maximum number of distinct queries kept in the cache
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 256))
+
+# Number of ranked experts kept per query
+SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', 100))
+
+# Default number of experts per results page
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 10))
+
+# Stream the results page, showing stored matches before the provider returns
+SEARCH_STREAMING = os.getenv('SEARCH_STREAMING', 'False').lower() in ('true', '1', 't')
+
+# Stored experts added from the full-text index before ranking
+LOCAL_CANDIDATES = int(os.getenv('LOCAL_CANDIDATES', 20))
+
+# Stored experts added from the embeddings index before ranking
+SEMANTIC_CANDIDATES = int(os.getenv('SEMANTIC_CANDIDATES', 20))
+
+# Stored expert columns that are left out of search results
+INTERNAL_FIELDS = ('details', 'created_at', 'fetched_at', 'etag')
+
+# Cached results by normalized query, least recently used first
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+def normalize_query(query):
+    """
+    Normalize a query so equivalent queries share a cache entry.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        str: Lowercased query with collapsed whitespace
+    """
+    return re.sub(r'\s+', ' ', (query or '').strip().lower())
+
+def _result_version(experts):
+    """
+    Compute a content hash of a ranked result list.
+
+    Args:
+        experts (list): Ranked expert dictionaries
+
+    Returns:
+        str: Hex digest identifying this exact result list
+    """
+    payload = json.dumps(experts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def get_cached(query):
+    """
+    Get fresh cached results for a query without computing them.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        dict: Cache entry, or None if missing or expired
+    """
+    key = normalize_query(query)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['created_at'] > SEARCH_CACHE_TTL:
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return entry
+
+def public_expert(expert):
+    """
+    Copy an expert without the stored columns that are internal to the catalog.
+
+    Args:
+        expert (dict): Expert information
+
+    Returns:
+        dict: Expert information for API responses and the session
+    """
+    return {key: value for key, value in expert.items() if key not in INTERNAL_FIELDS}
+
+def _local_candidates(query, seen):
+    """
+    Get stored experts matching the query in the full-text and embeddings indexes.
+
+    Args:
+        query (str): Normalized search query
+        seen (set): Expert ids already among the candidates
+
+    Returns:
+        list: Expert dictionaries not in seen
+    """
+    candidates = []
+    if LOCAL_CANDIDATES > 0:
+        with tracing.span('search.local'):
+            for expert in db.search_local_experts(query, limit=LOCAL_CANDIDATES):
+                if expert['id'] not in seen:
+                    seen.add(expert['id'])
+                    candidates.append(expert)
+
+    model = embeddings.get_model() if SEMANTIC_CANDIDATES > 0 else None
+    if model is not None:
+        with tracing.span('search.semantic'):
+            for expert_id, _ in model.search(query, k=SEMANTIC_CANDIDATES):
+                if expert_id in seen:
+                    continue
+                expert = db.get_expert(expert_id)
+                if expert:
+                    seen.add(expert_id)
+                    candidates.append(expert)
+    return candidates
+
+def iter_search(query, partial=True):
+    """
+    Search for and rank experts step by step, using cached results when fresh.
+
+    Stored experts from the full-text and embeddings indexes are looked up
+    first and, with partial set, ranked on their own and yielded as a
+    provisional first page. The provider is called next, and the final
+    ranking of all candidates is the same as if the steps had not been split.
+
+    Args:
+        query (str): Search query
+        partial (bool, optional): Yield provisional results before the final ones
+
+    Yields:
+        tuple: ('partial', ranked expert list) at most once, then
+            ('final', cache entry) as the last item
+    """
+    entry = get_cached(query)
+    if entry is not None:
+        yield 'final', entry
+        return
+
+    # Search with the normalized query so the cached results match the key
+    query = normalize_query(query)
+    local_experts = _local_candidates(query, set())
+    if partial and local_experts:
+        with tracing.span('search.rank_partial'):
+            provisional = ranking_pool.rank_experts(local_experts, query, k=SEARCH_PAGE_SIZE)
+        yield 'partial', [public_expert(expert) for expert in provisional]
+
+    with tracing.span('search.provider'):
+        experts = catalog.search_experts(query)
+    yield 'final', _finish_search(query, experts, local_experts)
+
+def _finish_search(query, experts, local_experts):
+    """
+    Merge, deduplicate and rank the candidates of a search, and cache the result.
+
+    Args:
+        query (str): Normalized search query
+        experts (list): Experts from the provider search
+        local_experts (list): Stored experts from _local_candidates
+
+    Returns:
+        dict: Cache entry
+    """
+    provider_ids = {expert.get('id') for expert in experts}
+    experts = experts + [expert for expert in local_experts if expert['id'] not in provider_ids]
+    with tracing.span('search.dedup'):
+        experts = dedup.dedupe(experts)
+    with tracing.span('search.rank'):
+        ranked_experts = ranking_pool.rank_experts(experts, query, k=SEARCH_RESULTS_LIMIT)
+    ranked_experts = [public_expert(expert) for expert in ranked_experts]
+
+    entry = {
+        'query': query,
+        'experts': ranked_experts,
+        'version': _result_version(ranked_experts),
+        'created_at': time.time()
+    }
+
+    with _lock:
+        _cache[entry['query']] = entry
+        _cache.move_to_end(entry['query'])
+        while len(_cache) > SEARCH_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return entry
+
+def run_search(query):
+    """
+    Search for and rank experts, using cached results when fresh.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        dict: Cache entry with 'query', 'experts', 'version' and 'created_at'
+    """
+    for _, entry in iter_search(query, partial=False):
+        pass
+    return entry
+
+async def _local_candidates_async(query):
+    """
+    Get stored experts matching the query, as _local_candidates does, from the event loop.
+
+    Args:
+        query (str): Normalized search query
+
+    Returns:
+        list: Expert dictionaries
+    """
+    # Imported here; async_db needs aiosqlite, which only the async path requires
+    from utils import async_db
+
+    seen = set()
+    candidates = []
+    if LOCAL_CANDIDATES > 0:
+        with tracing.span('search.local'):
+            for expert in await async_db.search_local_experts(query, limit=LOCAL_CANDIDATES):
+                if expert['id'] not in seen:
+                    seen.add(expert['id'])
+                    candidates.append(expert)
+
+    model = await asyncio.to_thread(embeddings.get_model) if SEMANTIC_CANDIDATES > 0 else None
+    if model is not None:
+        with tracing.span('search.semantic'):
+            matches = await asyncio.to_thread(model.search, query, SEMANTIC_CANDIDATES)
+            for expert_id, _ in matches:
+                if expert_id in seen:
+                    continue
+                expert = await async_db.get_expert(expert_id)
+                if expert:
+                    seen.add(expert_id)
+                    candidates.append(expert)
+    return candidates
+
+async def run_search_async(query):
+    """
+    Search for and rank experts from the event loop, using cached results when fresh.
+
+    The provider and the local indexes are searched concurrently. Ranking is
+    CPU work and runs on a thread; the result is the same as run_search's.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        dict: Cache entry with 'query', 'experts', 'version' and 'created_at'
+    """
+    entry = get_cached(query)
+    if entry is not None:
+        return entry
+
+    query = normalize_query(query)
+    experts, local_experts = await asyncio.gather(
+        catalog.search_experts_async(query), _local_candidates_async(query))
+    return await asyncio.to_thread(_finish_search, query, experts, local_experts)
+
+def max_age(entry):
+    """
+    Get the remaining freshness of a cache entry.
+
+    Args:
+        entry (dict): Cache entry
+
+    Returns:
+        int: Seconds until the entry expires
+    """
+    return max(0, int(SEARCH_CACHE_TTL - (time.time() - entry['created_at'])))
+
+def make_etag(entry, limit, offset):
+    """
+    Build a strong ETag for one page of a result list.
+
+    Args:
+        entry (dict): Cache entry
+        limit (int): Page size
+        offset (int): Page offset
+
+    Returns:
+        str: ETag value (without quotes)
+    """
+    key = f"{entry['query']}|{entry['version']}|{limit}|{offset}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+def encode_cursor(entry, offset):
+    """
+    Encode the position of a results page as an opaque cursor.
+
+    Args:
+        entry (dict): Cache entry the page was taken from
+        offset (int): Offset of the page
+
+    Returns:
+        str: URL-safe cursor
+    """
+    payload = json.dumps({'q': entry['query'], 'v': entry['version'], 'o': offset})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Args:
+        cursor (str): URL-safe cursor
+
+    Returns:
+        tuple: (query, version, offset), or None if the cursor is invalid
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        query, version, offset = payload['q'], payload['v'], max(int(payload['o']), 0)
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(query, str) or not isinstance(version, str):
+        return None
+    return query, version, offset
+
+def resume(cursor):
+    """
+    Get the cached results a cursor points into.
+
+    The cached scores are reused while the entry is fresh. If it has expired
+    the search is run again and the cursor's offset is applied to the new
+    results.
+
+    Args:
+        cursor (str): Cursor from a previous page
+
+    Returns:
+        tuple: (entry, offset), or None if the cursor is invalid
+    """
+    decoded = decode_cursor(cursor)
+    if decoded is None:
+        return None
+    query, version, offset = decoded
+    entry = get_cached(query)
+    if entry is None or entry['version'] != version:
+        entry = run_search(query)
+    return entry, offset
+
+async def resume_async(cursor):
+    """
+    Get the cached results a cursor points into, as resume does, from the event loop.
+
+    Args:
+        cursor (str): Cursor from a previous page
+
+    Returns:
+        tuple: (entry, offset), or None if the cursor is invalid
+    """
+    decoded = decode_cursor(cursor)
+    if decoded is None:
+        return None
+    query, version, offset = decoded
+    entry = get_cached(query)
+    if entry is None or entry['version'] != version:
+        entry = await run_search_async(query)
+    return entry, offset
+
+def get_page(entry, offset=0, limit=None):
+    """
+    Slice one page out of cached results.
+
+    Args:
+        entry (dict): Cache entry
+        offset (int, optional): Index of the first expert on the page
+        limit (int, optional): Page size
+
+    Returns:
+        dict: Page with 'experts', 'total', 'offset', 'limit' and cursors
+            for the previous and next pages (None at either end)
+    """
+    limit = limit or SEARCH_PAGE_SIZE
+    total = len(entry['experts'])
+    return {
+        'experts': entry['experts'][offset:offset + limit],
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'prev_cursor': encode_cursor(entry, max(offset - limit, 0)) if offset > 0 else None,
+        'next_cursor': encode_cursor(entry, offset + limit) if offset + limit < total else None
+    }
+
+def clear_cache():
+    """Drop all cached search results."""
+    with _lock:
+        _cache.clear()
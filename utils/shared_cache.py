@@ -0,0 +1,457 @@
+"""
+Shared Cache Module
+
+This module provides a cache shared by every worker process on a host, so
+preprocessed tokens, provider responses and dashboard counters are computed
+once instead of once per worker, and stay warm when a worker is recycled.
+
+Entries live in a WAL-mode SQLite file (SHARED_CACHE_FILE), grouped by
+namespace. Values are serialized with marshal, zlib-compressed above
+SHARED_CACHE_COMPRESS_MIN bytes, and may carry a TTL. Each namespace has a
+size budget in bytes; a write that takes a namespace over its budget evicts
+expired entries and then the least recently used ones.
+
+Request threads can queue writes with set_many_deferred; a background
+writer merges them into one transaction per namespace every
+SHARED_CACHE_FLUSH_INTERVAL seconds, so requests don't wait for the write
+lock.
+
+The cache is best-effort: when the file is locked or unavailable, or an
+entry cannot be (de)serialized, reads miss and writes are dropped.
+"""
+
+import atexit
+import hashlib
+import logging
+import marshal
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Whether the shared cache is used; off, every read misses
+ENABLED = os.getenv('SHARED_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+
+# Cache database file, separate from the application database
+SHARED_CACHE_FILE = os.getenv('SHARED_CACHE_FILE', 'julie_cache.db')
+
+# Default size budget per namespace, in bytes
+SHARED_CACHE_BUDGET = int(os.getenv('SHARED_CACHE_BUDGET', 32 * 1024 * 1024))
+
+# Per-namespace budgets overriding the default, e.g. "nlp=67108864,linkedin=4194304"
+SHARED_CACHE_BUDGETS = {
+    name.strip(): int(size)
+    for name, size in (item.split('=') for item in os.getenv('SHARED_CACHE_BUDGETS', '').split(',') if '=' in item)
+}
+
+# Serialized values at least this large are compressed
+SHARED_CACHE_COMPRESS_MIN = int(os.getenv('SHARED_CACHE_COMPRESS_MIN', 1024))
+
+# Seconds between last-access updates of an entry; reads within this window
+# don't write, at the cost of coarser LRU order
+SHARED_CACHE_TOUCH_INTERVAL = float(os.getenv('SHARED_CACHE_TOUCH_INTERVAL', 10))
+
+# Seconds deferred writes are held before the background writer stores them
+SHARED_CACHE_FLUSH_INTERVAL = float(os.getenv('SHARED_CACHE_FLUSH_INTERVAL', 1))
+
+# Deferred entries that make the writer flush early; four times as many are
+# held at most, and further deferred writes are dropped
+SHARED_CACHE_FLUSH_SIZE = int(os.getenv('SHARED_CACHE_FLUSH_SIZE', 1000))
+
+# Share of the budget a namespace is evicted down to once it goes over
+EVICT_TO = 0.9
+
+# Maximum keys per IN (...) query
+BATCH_SIZE = 500
+
+_PLAIN = b'm'
+_COMPRESSED = b'z'
+
+# Errors of marshal and zlib on values they can't handle or corrupt data
+SERIALIZATION_ERRORS = (ValueError, EOFError, TypeError, zlib.error)
+
+_local = threading.local()
+
+
+def _connect():
+    """Get this thread's connection, creating the cache tables on first use."""
+    conn = getattr(_local, 'conn', None)
+    # Connections don't survive a fork, and tests may point at another file
+    if conn is not None and _local.pid == os.getpid() and _local.file == SHARED_CACHE_FILE:
+        return conn
+
+    conn = sqlite3.connect(SHARED_CACHE_FILE, timeout=1, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # Losing the last writes on power failure is fine for a cache
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        namespace TEXT NOT NULL,
+        key BLOB NOT NULL,
+        value BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        expires_at REAL,
+        accessed_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_lru ON cache_entries (namespace, accessed_at)')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS cache_namespaces (
+        namespace TEXT PRIMARY KEY,
+        bytes INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    _local.conn, _local.pid, _local.file = conn, os.getpid(), SHARED_CACHE_FILE
+    return conn
+
+def _key(key):
+    # Fixed-size digests keep long keys (e.g. whole profile texts) compact
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+def dumps(value):
+    """
+    Serialize a value for the cache.
+
+    Args:
+        value: None, bool, int, float, str, bytes, or lists, tuples, sets
+            and dicts of those
+
+    Returns:
+        bytes: Serialized value
+
+    Raises:
+        ValueError: If the value holds a type marshal can't serialize
+    """
+    data = marshal.dumps(value)
+    if len(data) >= SHARED_CACHE_COMPRESS_MIN:
+        compressed = zlib.compress(data, 1)
+        if len(compressed) < len(data):
+            return _COMPRESSED + compressed
+    return _PLAIN + data
+
+def loads(data):
+    """
+    Deserialize a value written by dumps.
+
+    Args:
+        data (bytes): Serialized value
+
+    Returns:
+        The original value
+
+    Raises:
+        ValueError, EOFError, TypeError or zlib.error: If the data is corrupt
+    """
+    data = bytes(data)
+    if data[:1] == _COMPRESSED:
+        return marshal.loads(zlib.decompress(data[1:]))
+    return marshal.loads(data[1:])
+
+def budget(namespace):
+    """
+    Get the size budget of a namespace.
+
+    Args:
+        namespace (str): Cache namespace
+
+    Returns:
+        int: Budget in bytes
+    """
+    return SHARED_CACHE_BUDGETS.get(namespace, SHARED_CACHE_BUDGET)
+
+def get(namespace, key, default=None):
+    """
+    Get a cached value.
+
+    Args:
+        namespace (str): Cache namespace
+        key (str): Cache key
+        default (optional): Returned on a miss
+
+    Returns:
+        The cached value, or default if missing or expired
+    """
+    found = get_many(namespace, [key])
+    return found.get(key, default)
+
+def get_many(namespace, keys):
+    """
+    Get several cached values in one round trip per BATCH_SIZE keys.
+
+    Args:
+        namespace (str): Cache namespace
+        keys (list): Cache keys
+
+    Returns:
+        dict: Key -> value for the keys that were found and fresh
+    """
+    if not ENABLED or not keys:
+        return {}
+
+    digests = {}
+    for key in keys:
+        digests[_key(key)] = key
+    now = time.time()
+    found = {}
+    touched = []
+    try:
+        conn = _connect()
+        digest_list = list(digests)
+        for start in range(0, len(digest_list), BATCH_SIZE):
+            batch = digest_list[start:start + BATCH_SIZE]
+            rows = conn.execute(f'''
+            SELECT key, value, accessed_at FROM cache_entries
+            WHERE namespace = ? AND key IN ({', '.join('?' * len(batch))})
+            AND (expires_at IS NULL OR expires_at > ?)
+            ''', [namespace] + batch + [now]).fetchall()
+            for digest, value, accessed_at in rows:
+                try:
+                    found[digests[digest]] = loads(value)
+                except SERIALIZATION_ERRORS:
+                    # A corrupt or foreign entry is a miss; the next write replaces it
+                    logger.warning("Shared cache entry in %s could not be read", namespace)
+                    continue
+                if now - accessed_at > SHARED_CACHE_TOUCH_INTERVAL:
+                    touched.append((now, namespace, digest))
+        if touched:
+            conn.executemany('UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?', touched)
+    except sqlite3.Error:
+        logger.warning("Shared cache read failed", exc_info=True)
+    return found
+
+def set(namespace, key, value, ttl=None):
+    """
+    Cache a value.
+
+    Args:
+        namespace (str): Cache namespace
+        key (str): Cache key
+        value: Value serializable by dumps
+        ttl (float, optional): Seconds until the entry expires; None keeps it
+            until evicted
+    """
+    set_many(namespace, {key: value}, ttl)
+
+def set_many(namespace, items, ttl=None):
+    """
+    Cache several values in one transaction.
+
+    Args:
+        namespace (str): Cache namespace
+        items (dict): Key -> value
+        ttl (float, optional): Seconds until the entries expire; None keeps
+            them until evicted
+    """
+    if not ENABLED or not items:
+        return
+
+    now = time.time()
+    expires_at = now + ttl if ttl is not None else None
+    rows = []
+    for key, value in items.items():
+        try:
+            data = dumps(value)
+        except SERIALIZATION_ERRORS:
+            logger.warning("Shared cache value in %s could not be serialized; not cached", namespace)
+            continue
+        rows.append((_key(key), data, len(data)))
+    if not rows:
+        return
+
+    try:
+        conn = _connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            delta = 0
+            for digest, data, size in rows:
+                old = conn.execute('SELECT size FROM cache_entries WHERE namespace = ? AND key = ?',
+                                   (namespace, digest)).fetchone()
+                conn.execute('''
+                INSERT OR REPLACE INTO cache_entries (namespace, key, value, size, expires_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', (namespace, digest, data, size, expires_at, now))
+                delta += size - (old[0] if old else 0)
+            conn.execute('''
+            INSERT INTO cache_namespaces (namespace, bytes) VALUES (?, ?)
+            ON CONFLICT (namespace) DO UPDATE SET bytes = bytes + excluded.bytes
+            ''', (namespace, delta))
+            total = conn.execute('SELECT bytes FROM cache_namespaces WHERE namespace = ?', (namespace,)).fetchone()[0]
+            if total > budget(namespace):
+                _evict(conn, namespace, total, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    except sqlite3.Error:
+        logger.warning("Shared cache write failed", exc_info=True)
+
+_pending = {}
+_pending_count = 0
+_pending_lock = threading.Lock()
+_flush_wanted = threading.Event()
+_writer_pid = None
+
+def set_many_deferred(namespace, items, ttl=None):
+    """
+    Queue several values to be cached by the background writer.
+
+    For request threads: the values are stored within
+    SHARED_CACHE_FLUSH_INTERVAL seconds, together with other deferred
+    writes, instead of taking the write lock now. Values are dropped if the
+    queue is full.
+
+    Args:
+        namespace (str): Cache namespace
+        items (dict): Key -> value
+        ttl (float, optional): Seconds until the entries expire, counted
+            from when they are written
+    """
+    global _pending_count
+    if not ENABLED or not items:
+        return
+
+    with _pending_lock:
+        if _pending_count >= 4 * SHARED_CACHE_FLUSH_SIZE:
+            return
+        _pending.setdefault((namespace, ttl), {}).update(items)
+        _pending_count += len(items)
+        full = _pending_count >= SHARED_CACHE_FLUSH_SIZE
+    _start_writer()
+    if full:
+        _flush_wanted.set()
+
+def flush():
+    """Store every deferred write now, one transaction per namespace."""
+    global _pending, _pending_count
+    with _pending_lock:
+        pending, _pending = _pending, {}
+        _pending_count = 0
+    for (namespace, ttl), items in pending.items():
+        set_many(namespace, items, ttl)
+
+def _write_loop():
+    while True:
+        _flush_wanted.wait(SHARED_CACHE_FLUSH_INTERVAL)
+        _flush_wanted.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception("Shared cache flush failed")
+
+def _start_writer():
+    """Start this process's background writer on first use."""
+    global _writer_pid
+    if _writer_pid == os.getpid():
+        return
+    with _pending_lock:
+        if _writer_pid != os.getpid():
+            threading.Thread(target=_write_loop, name='shared-cache-writer', daemon=True).start()
+            _writer_pid = os.getpid()
+
+def _after_fork():
+    # The writer thread and any queued writes belong to the parent
+    global _pending, _pending_count, _pending_lock
+    _pending, _pending_count, _pending_lock = {}, 0, threading.Lock()
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(flush)
+
+def _evict(conn, namespace, total, now):
+    """Bring a namespace under its budget, expired entries first, inside the caller's transaction."""
+    target = budget(namespace) * EVICT_TO
+    freed = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ? AND expires_at <= ?',
+                         (namespace, now)).fetchone()[0]
+    conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?', (namespace, now))
+    total -= freed
+
+    while total > target:
+        victims = conn.execute('''
+        SELECT key, size FROM cache_entries WHERE namespace = ?
+        ORDER BY accessed_at LIMIT 256
+        ''', (namespace,)).fetchall()
+        if not victims:
+            total = 0
+            break
+        for digest, size in victims:
+            conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (namespace, digest))
+            total -= size
+            if total <= target:
+                break
+    conn.execute('UPDATE cache_namespaces SET bytes = ? WHERE namespace = ?', (max(total, 0), namespace))
+
+def delete(namespace, key):
+    """
+    Remove a cached value.
+
+    Args:
+        namespace (str): Cache namespace
+        key (str): Cache key
+    """
+    if not ENABLED:
+        return
+    try:
+        conn = _connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            digest = _key(key)
+            old = conn.execute('SELECT size FROM cache_entries WHERE namespace = ? AND key = ?',
+                               (namespace, digest)).fetchone()
+            if old:
+                conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (namespace, digest))
+                conn.execute('UPDATE cache_namespaces SET bytes = bytes - ? WHERE namespace = ?',
+                             (old[0], namespace))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    except sqlite3.Error:
+        logger.warning("Shared cache delete failed", exc_info=True)
+
+def clear(namespace=None):
+    """
+    Remove every entry of a namespace, or of all namespaces.
+
+    Args:
+        namespace (str, optional): Cache namespace; None clears everything
+    """
+    try:
+        conn = _connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if namespace is None:
+                conn.execute('DELETE FROM cache_entries')
+                conn.execute('DELETE FROM cache_namespaces')
+            else:
+                conn.execute('DELETE FROM cache_entries WHERE namespace = ?', (namespace,))
+                conn.execute('DELETE FROM cache_namespaces WHERE namespace = ?', (namespace,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    except sqlite3.Error:
+        logger.warning("Shared cache clear failed", exc_info=True)
+
+def get_stats():
+    """
+    Get the size of each namespace.
+
+    Returns:
+        dict: Namespace -> {'entries', 'bytes', 'budget'}, empty if the
+            cache cannot be read
+    """
+    try:
+        conn = _connect()
+        rows = conn.execute('''
+        SELECT n.namespace, n.bytes, COUNT(e.key) FROM cache_namespaces n
+        LEFT JOIN cache_entries e ON e.namespace = n.namespace
+        GROUP BY n.namespace
+        ''').fetchall()
+    except sqlite3.Error:
+        logger.warning("Shared cache stats failed", exc_info=True)
+        return {}
+    return {namespace: {'entries': entries, 'bytes': size, 'budget': budget(namespace)}
+            for namespace, size, entries in rows}
@@ -0,0 +1,217 @@
+"""
+Skills Module
+
+This module matches query tokens against expert skills and education fields.
+Terms are interned into a vocabulary, so each term is a bit position, an
+expert's terms form a bitset, and a query token maps to the bitset of every
+term containing it. Matching an expert then becomes a single AND.
+
+Each expert's bitsets are kept with the vocabulary, keyed by the expert's id
+and ETag, so stored experts are only interned once. The vocabulary is
+replaced by an empty one once it holds SKILL_VOCABULARY_SIZE terms, which
+bounds its memory and the width of the bitsets in long-lived workers.
+"""
+
+import os
+import threading
+
+# Terms interned before the vocabulary is started afresh
+SKILL_VOCABULARY_SIZE = int(os.getenv('SKILL_VOCABULARY_SIZE', 50000))
+
+# Stored experts whose bitsets are kept
+EXPERT_BITSET_CACHE_SIZE = int(os.getenv('EXPERT_BITSET_CACHE_SIZE', 20000))
+
+# Maximum number of query tokens kept in the substring index
+TOKEN_INDEX_SIZE = 10000
+
+def normalize_skill(skill):
+    """
+    Normalize a skill name for interning.
+
+    Args:
+        skill (str): Skill name
+
+    Returns:
+        str: Lowercased skill with collapsed whitespace
+    """
+    return ' '.join(skill.lower().split())
+
+
+class Vocabulary:
+    """
+    Interned skills and education fields, with the indexes built on them.
+
+    Bitsets are only comparable within one vocabulary, so callers should
+    get it once with get_vocabulary and use it for the whole operation.
+    """
+
+    def __init__(self):
+        # Normalized term -> id, id -> display name, and exact spellings
+        # already seen so lookups can skip normalization
+        self.ids = {}
+        self.names = []
+        self.raw_ids = {}
+        # token -> (bitset of terms containing it, vocabulary size when last scanned)
+        self.token_index = {}
+        # (expert id, etag) -> (skill bitset, education bitset)
+        self.expert_bits = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def term_id(self, term):
+        """
+        Get the interned id for a term, assigning one if it is new.
+
+        Args:
+            term (str): Skill or education field
+
+        Returns:
+            int: Term id
+        """
+        tid = self.raw_ids.get(term)
+        if tid is not None:
+            return tid
+
+        key = normalize_skill(term)
+        with self.lock:
+            tid = self.ids.get(key)
+            if tid is None:
+                tid = len(self.names)
+                self.names.append(term)
+                self.ids[key] = tid
+            self.raw_ids[term] = tid
+        return tid
+
+    def term_name(self, tid):
+        """
+        Get the display name of an interned term.
+
+        Args:
+            tid (int): Term id
+
+        Returns:
+            str: Term as first seen
+        """
+        return self.names[tid]
+
+    def terms_bitset(self, terms):
+        """
+        Build the bitset for a list of terms.
+
+        Args:
+            terms (iterable): Skills or education fields
+
+        Returns:
+            int: Bitset with one bit per term
+        """
+        bits = 0
+        for term in terms:
+            bits |= 1 << self.term_id(term)
+        return bits
+
+    def expert_bitsets(self, expert):
+        """
+        Get an expert's skill and education bitsets.
+
+        Stored experts (with an id and an ETag) are interned once and their
+        bitsets reused until the profile changes.
+
+        Args:
+            expert (dict): Expert information
+
+        Returns:
+            tuple: (skill bitset, education bitset)
+        """
+        key = (expert.get('id'), expert.get('etag'))
+        if key[0] and key[1]:
+            bits = self.expert_bits.get(key)
+            if bits is not None:
+                return bits
+
+        bits = (self.terms_bitset(expert.get('skills', [])),
+                self.terms_bitset(edu.get('field', '') for edu in expert.get('education', [])))
+        if key[0] and key[1]:
+            if len(self.expert_bits) >= EXPERT_BITSET_CACHE_SIZE:
+                self.expert_bits.clear()
+            self.expert_bits[key] = bits
+        return bits
+
+    def token_bitset(self, token):
+        """
+        Get the bitset of all interned terms that contain a token as a substring.
+
+        Results are cached per token and extended incrementally, so each term
+        is scanned at most once per token.
+
+        Args:
+            token (str): Preprocessed query token
+
+        Returns:
+            int: Bitset of matching terms
+        """
+        entry = self.token_index.get(token)
+        size = len(self.names)
+        if entry is not None and entry[1] == size:
+            return entry[0]
+
+        with self.lock:
+            bits, scanned = self.token_index.get(token, (0, 0))
+            for tid in range(scanned, size):
+                if token in normalize_skill(self.names[tid]):
+                    bits |= 1 << tid
+            if len(self.token_index) >= TOKEN_INDEX_SIZE and token not in self.token_index:
+                self.token_index.clear()
+            self.token_index[token] = (bits, size)
+        return bits
+
+    def query_bitset(self, query_tokens):
+        """
+        Get the bitset of all terms matched by any query token.
+
+        Intern the terms being matched first, so the bitset covers them.
+
+        Args:
+            query_tokens (list): Preprocessed query tokens
+
+        Returns:
+            int: Bitset of matching terms
+        """
+        bits = 0
+        for token in query_tokens:
+            bits |= self.token_bitset(token)
+        return bits
+
+    def matching_terms(self, terms, query_bits):
+        """
+        Filter terms down to those matched by a query, keeping their order.
+
+        Args:
+            terms (list): Skills or education fields
+            query_bits (int): Bitset from query_bitset
+
+        Returns:
+            list: Matching terms
+        """
+        return [term for term in terms if query_bits >> self.term_id(term) & 1]
+
+
+_vocabulary = Vocabulary()
+_vocabulary_lock = threading.Lock()
+
+def get_vocabulary():
+    """
+    Get the current vocabulary, starting a new one if it is full.
+
+    Operations already holding the previous vocabulary keep using it.
+
+    Returns:
+        Vocabulary: Current vocabulary
+    """
+    global _vocabulary
+    if len(_vocabulary) >= SKILL_VOCABULARY_SIZE:
+        with _vocabulary_lock:
+            if len(_vocabulary) >= SKILL_VOCABULARY_SIZE:
+                _vocabulary = Vocabulary()
+    return _vocabulary
@@ -0,0 +1,436 @@
+"""
+Expert Snapshot Module
+
+This module compiles the experts table into a versioned binary snapshot, so
+a new worker can rank stored experts without re-reading the table,
+re-decoding the details JSON, or re-tokenizing every profile.
+
+A snapshot file holds the vocabulary, postings, the token ids of each
+expert, ids, ETags, lowercased titles and the display fields of each
+expert, as flat arrays of offsets and values. Workers open it with mmap, so
+nothing is decoded until it is used and every worker shares one copy
+through the page cache. Terms are looked up by binary search over the
+mapped arrays; the id -> row map is built on first use.
+
+Snapshots are published by atomically replacing a CURRENT pointer file in
+SNAPSHOT_DIR. Workers check the pointer at most every
+SNAPSHOT_CHECK_INTERVAL seconds and swap to the newer snapshot in place.
+
+Build and publish a snapshot from the experts table:
+    python -m utils.snapshot
+"""
+
+import bisect
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from array import array
+from utils import db
+
+# Directory holding snapshot files and the CURRENT pointer
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots')
+
+# Seconds between checks for a newly published snapshot
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv('SNAPSHOT_CHECK_INTERVAL', 5))
+
+# Snapshot files kept after publishing, including the new one
+SNAPSHOT_KEEP = int(os.getenv('SNAPSHOT_KEEP', 2))
+
+MAGIC = b'JULSNAP\0'
+FORMAT_VERSION = 1
+
+# Section name -> array typecode; 'Q' sections are offsets into the next one
+SECTIONS = (
+    ('terms.offsets', 'Q'), ('terms', 'B'),
+    ('postings.offsets', 'Q'), ('postings', 'I'),
+    ('tokens.offsets', 'Q'), ('tokens', 'I'),
+    ('ids.offsets', 'Q'), ('ids', 'B'),
+    ('etags.offsets', 'Q'), ('etags', 'B'),
+    ('titles.offsets', 'Q'), ('titles', 'B'),
+    ('experts.offsets', 'Q'), ('experts', 'B'),
+)
+
+# Experts table columns left out of the display fields
+HIDDEN_COLUMNS = ('details',)
+
+
+def _strings(values):
+    """Pack strings into an offsets array and one UTF-8 blob."""
+    offsets = array('Q', [0])
+    blob = bytearray()
+    for value in values:
+        blob += value.encode('utf-8')
+        offsets.append(len(blob))
+    return offsets, blob
+
+def _ragged(rows):
+    """Pack lists of ints into an offsets array and one flat uint32 array."""
+    offsets = array('Q', [0])
+    flat = array('I')
+    for row in rows:
+        flat.extend(row)
+        offsets.append(len(flat))
+    return offsets, flat
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped expert snapshot.
+
+    Args:
+        path (str): Snapshot file path
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not an expert snapshot: {path}")
+        header_size = struct.unpack_from('<I', self._map, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        header = json.loads(self._map[start:start + header_size])
+        if header['format'] != FORMAT_VERSION or header['byteorder'] != sys.byteorder:
+            raise ValueError(f"Unsupported snapshot format: {path}")
+
+        self.version = header['version']
+        self.created_at = header['created_at']
+        self.max_rowid = header['max_rowid']
+        self.count = header['experts']
+
+        self._rows = None
+        self._view = memoryview(self._map)
+        self._sections = {}
+        for name, typecode in SECTIONS:
+            offset, size = header['sections'][name]
+            self._sections[name] = self._view[offset:offset + size].cast(typecode)
+
+    def __len__(self):
+        return self.count
+
+    def _slice(self, name, i):
+        offsets = self._sections[name + '.offsets']
+        return self._sections[name][offsets[i]:offsets[i + 1]]
+
+    def _string(self, name, i):
+        return bytes(self._slice(name, i)).decode('utf-8')
+
+    def _search(self, name, key):
+        """Binary search a sorted string section."""
+        key = key.encode('utf-8')
+        low, high = 0, len(self._sections[name + '.offsets']) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if bytes(self._slice(name, middle)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._sections[name + '.offsets']) - 1 and bytes(self._slice(name, low)) == key:
+            return low
+        return None
+
+    def term_id(self, term):
+        """
+        Look up a vocabulary term.
+
+        Args:
+            term (str): Preprocessed token
+
+        Returns:
+            int: Term id, or None if no expert has the term
+        """
+        return self._search('terms', term)
+
+    def postings(self, term):
+        """
+        Get the experts having a term.
+
+        Args:
+            term (str): Preprocessed token
+
+        Returns:
+            sequence: Ascending expert rows
+        """
+        term_id = self.term_id(term)
+        return self._slice('postings', term_id) if term_id is not None else ()
+
+    def matching_tokens(self, tokens):
+        """
+        Find the experts having any of some tokens, from the postings.
+
+        Args:
+            tokens (list): Preprocessed tokens, e.g. of a query
+
+        Returns:
+            dict: Expert row -> set of the tokens it has
+        """
+        matches = {}
+        for token in set(tokens):
+            for row in self.postings(token):
+                found = matches.get(row)
+                if found is None:
+                    matches[row] = {token}
+                else:
+                    found.add(token)
+        return matches
+
+    def token_ids(self, row):
+        """
+        Get an expert's distinct term ids.
+
+        Args:
+            row (int): Expert row
+
+        Returns:
+            sequence: Ascending term ids
+        """
+        return self._slice('tokens', row)
+
+    def has_token(self, row, term_id):
+        """
+        Check whether an expert has a term.
+
+        Args:
+            row (int): Expert row
+            term_id (int): Term id from term_id
+
+        Returns:
+            bool: True if the expert's text contains the term
+        """
+        ids = self.token_ids(row)
+        i = bisect.bisect_left(ids, term_id)
+        return i < len(ids) and ids[i] == term_id
+
+    def tokens(self, row):
+        """
+        Get an expert's distinct preprocessed tokens.
+
+        Args:
+            row (int): Expert row
+
+        Returns:
+            list: Tokens
+        """
+        return [self._string('terms', term_id) for term_id in self.token_ids(row)]
+
+    def find(self, expert_id):
+        """
+        Find an expert's row.
+
+        Args:
+            expert_id (str): Expert ID
+
+        Returns:
+            int: Row, or None if the expert isn't in the snapshot
+        """
+        if self._rows is None:
+            self._rows = {self._string('ids', row): row for row in range(self.count)}
+        return self._rows.get(expert_id)
+
+    def expert_id(self, row):
+        """Get an expert's id."""
+        return self._string('ids', row)
+
+    def etag(self, row):
+        """Get an expert's ETag, or '' if it has none."""
+        return self._string('etags', row)
+
+    def title(self, row):
+        """Get an expert's lowercased title."""
+        return self._string('titles', row)
+
+    def expert(self, row):
+        """
+        Decode an expert's display fields.
+
+        Args:
+            row (int): Expert row
+
+        Returns:
+            dict: Expert information, as from db.get_expert
+        """
+        return json.loads(bytes(self._slice('experts', row)))
+
+    def close(self):
+        """Unmap the file, unless slices handed out are still alive."""
+        sections, self._sections = self._sections, {}
+        try:
+            for section in sections.values():
+                section.release()
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            pass
+
+
+def compile_snapshot(rows, path, version):
+    """
+    Write a snapshot file from experts table rows.
+
+    Args:
+        rows (list): sqlite3.Row rows of the experts table, with rowid
+        path (str): Output file path
+        version (int): Snapshot version
+
+    Returns:
+        int: Number of experts written
+    """
+    from utils import nlp
+
+    experts = []
+    for row in rows:
+        expert = {key: row[key] for key in row.keys() if key not in HIDDEN_COLUMNS and key != 'rowid'}
+        if row['details']:
+            expert.update(json.loads(row['details']))
+        experts.append(expert)
+
+    token_lists = nlp.expert_tokens(experts)
+    vocabulary = sorted({token for tokens in token_lists for token in tokens}, key=lambda t: t.encode('utf-8'))
+    term_ids = {term: i for i, term in enumerate(vocabulary)}
+    expert_terms = [sorted({term_ids[token] for token in tokens}) for tokens in token_lists]
+    postings = [[] for _ in vocabulary]
+    for row, terms in enumerate(expert_terms):
+        for term_id in terms:
+            postings[term_id].append(row)
+
+    ids = [expert['id'] for expert in experts]
+    sections = {}
+    sections['terms.offsets'], sections['terms'] = _strings(vocabulary)
+    sections['postings.offsets'], sections['postings'] = _ragged(postings)
+    sections['tokens.offsets'], sections['tokens'] = _ragged(expert_terms)
+    sections['ids.offsets'], sections['ids'] = _strings(ids)
+    sections['etags.offsets'], sections['etags'] = _strings(expert.get('etag') or '' for expert in experts)
+    sections['titles.offsets'], sections['titles'] = _strings((expert.get('title') or '').lower()
+                                                             for expert in experts)
+    sections['experts.offsets'], sections['experts'] = _strings(json.dumps(expert) for expert in experts)
+
+    # Section offsets are absolute, so the header is sized with placeholder
+    # offsets first and the data starts at the next 8-byte boundary
+    layout = {}
+    header = {
+        'format': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'version': version,
+        'created_at': time.time(),
+        'experts': len(experts),
+        'max_rowid': max((row['rowid'] for row in rows), default=0),
+        'sections': {name: [2 ** 63, 2 ** 63] for name, _ in SECTIONS}
+    }
+    data_start = -(-(len(MAGIC) + 4 + len(json.dumps(header))) // 8) * 8
+    offset = data_start
+    for name, _ in SECTIONS:
+        size = len(bytes(sections[name]))
+        layout[name] = [offset, size]
+        offset += -(-size // 8) * 8
+    header['sections'] = layout
+    encoded = json.dumps(header).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(encoded)) + encoded)
+        for name, _ in SECTIONS:
+            f.write(b'\0' * (layout[name][0] - f.tell()))
+            f.write(bytes(sections[name]))
+        f.flush()
+        os.fsync(f.fileno())
+    return len(experts)
+
+def current_path(directory=None):
+    """
+    Get the published snapshot's path.
+
+    Args:
+        directory (str, optional): Snapshot directory (defaults to SNAPSHOT_DIR)
+
+    Returns:
+        str: Snapshot file path, or None if none has been published
+    """
+    directory = directory or SNAPSHOT_DIR
+    try:
+        with open(os.path.join(directory, 'CURRENT')) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(directory, name) if name else None
+
+def build(directory=None):
+    """
+    Compile the experts table into a new snapshot and publish it.
+
+    The file is written under a temporary name and the CURRENT pointer is
+    replaced atomically, so workers see either the old or the new snapshot.
+
+    Args:
+        directory (str, optional): Snapshot directory (defaults to SNAPSHOT_DIR)
+
+    Returns:
+        str: Path of the published snapshot
+    """
+    directory = directory or SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    version = 1
+    previous = current_path(directory)
+    if previous is not None:
+        version = int(os.path.basename(previous).split('-')[1].split('.')[0]) + 1
+
+    conn = sqlite3.connect(db.DB_FILE)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute('SELECT rowid, * FROM experts ORDER BY rowid').fetchall()
+    conn.close()
+
+    name = f"experts-{version:08d}.snap"
+    path = os.path.join(directory, name)
+    compile_snapshot(rows, path + '.tmp', version)
+    os.replace(path + '.tmp', path)
+
+    pointer = os.path.join(directory, 'CURRENT')
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(name)
+    os.replace(pointer + '.tmp', pointer)
+
+    # Workers still mapping an older file keep reading it after the unlink
+    published = sorted(n for n in os.listdir(directory) if n.startswith('experts-') and n.endswith('.snap'))
+    for old in published[:-SNAPSHOT_KEEP]:
+        os.remove(os.path.join(directory, old))
+    return path
+
+
+_snapshot = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def get_snapshot():
+    """
+    Get the published snapshot, swapping to a newer one when it appears.
+
+    Returns:
+        Snapshot: Current snapshot, or None if none has been published
+    """
+    global _snapshot, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < SNAPSHOT_CHECK_INTERVAL:
+        return _snapshot
+
+    with _lock:
+        if now - _checked_at >= SNAPSHOT_CHECK_INTERVAL:
+            path = current_path()
+            if path is None:
+                _snapshot = None
+            elif _snapshot is None or _snapshot.path != path:
+                # Readers holding the old snapshot keep using it until they
+                # drop it; its mapping is released with the object
+                _snapshot = Snapshot(path)
+            _checked_at = now
+    return _snapshot
+
+
+if __name__ == '__main__':
+    published = build(sys.argv[1] if len(sys.argv) > 1 else None)
+    snapshot = Snapshot(published)
+    print(f"Published snapshot version {snapshot.version} with {len(snapshot)} experts to {published}")
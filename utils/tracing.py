@@ -0,0 +1,209 @@
+"""
+Tracing Module
+
+This module times request stages and counts events, and renders the
+aggregates in Prometheus text format for the /metrics endpoint.
+
+Tracing is off unless TRACING_ENABLED is set. When it is off, traced()
+returns the wrapped function unchanged and span() returns a shared no-op
+context manager, so instrumented code pays almost nothing.
+"""
+
+import contextlib
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import deque
+
+# Check if tracing is enabled
+ENABLED = os.getenv('TRACING_ENABLED', 'False').lower() in ('true', '1', 't')
+
+# Number of recent samples kept per stage for percentile estimates
+RESERVOIR_SIZE = int(os.getenv('TRACING_RESERVOIR_SIZE', 1024))
+
+# Quantiles reported for every stage
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_null_span = contextlib.nullcontext()
+
+
+class _Stage:
+    """Running aggregate for one traced stage."""
+
+    __slots__ = ('count', 'total', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=RESERVOIR_SIZE)
+
+
+def observe(stage, seconds):
+    """
+    Record one duration for a stage.
+
+    Args:
+        stage (str): Stage name, e.g. 'search.provider'
+        seconds (float): Duration in seconds
+    """
+    with _lock:
+        aggregate = _stages.get(stage)
+        if aggregate is None:
+            aggregate = _stages[stage] = _Stage()
+        aggregate.count += 1
+        aggregate.total += seconds
+        aggregate.samples.append(seconds)
+
+def increment(name, amount=1, **labels):
+    """
+    Increment a counter.
+
+    Args:
+        name (str): Counter name, e.g. 'http_requests'
+        amount (int, optional): Amount to add
+        **labels: Label values for this series
+    """
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+class _Span:
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+def span(stage):
+    """
+    Time a block of code as a stage.
+
+    Args:
+        stage (str): Stage name
+
+    Returns:
+        context manager: Times the enclosed block when tracing is enabled
+    """
+    if not ENABLED:
+        return _null_span
+    return _Span(stage)
+
+def traced(stage):
+    """
+    Decorator that times every call to a function as a stage.
+
+    Coroutine functions are timed until the awaited call completes.
+
+    Args:
+        stage (str): Stage name
+
+    Returns:
+        callable: Decorator, which leaves the function untouched when tracing is disabled
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    observe(stage, time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def _quantile(sorted_samples, q):
+    if not sorted_samples:
+        return 0.0
+    index = min(int(q * len(sorted_samples)), len(sorted_samples) - 1)
+    return sorted_samples[index]
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+def get_stats():
+    """
+    Get a summary of all traced stages.
+
+    Returns:
+        dict: Stage name -> count, sum and p50/p95/p99 in seconds
+    """
+    with _lock:
+        snapshot = {stage: (agg.count, agg.total, sorted(agg.samples)) for stage, agg in _stages.items()}
+
+    return {
+        stage: {
+            'count': count,
+            'sum': total,
+            **{f"p{int(q * 100)}": _quantile(samples, q) for q in QUANTILES}
+        }
+        for stage, (count, total, samples) in snapshot.items()
+    }
+
+def render_prometheus():
+    """
+    Render stages and counters in Prometheus text exposition format.
+
+    Returns:
+        str: Metrics text
+    """
+    lines = [
+        '# HELP julie_stage_duration_seconds Time spent in each traced stage.',
+        '# TYPE julie_stage_duration_seconds summary'
+    ]
+    for stage, stats in sorted(get_stats().items()):
+        for q in QUANTILES:
+            labels = _format_labels([('stage', stage), ('quantile', q)])
+            lines.append(f"julie_stage_duration_seconds{labels} {stats[f'p{int(q * 100)}']:.6f}")
+        labels = _format_labels([('stage', stage)])
+        lines.append(f"julie_stage_duration_seconds_sum{labels} {stats['sum']:.6f}")
+        lines.append(f"julie_stage_duration_seconds_count{labels} {stats['count']}")
+
+    with _lock:
+        counters = sorted(_counters.items())
+
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE julie_{name}_total counter")
+        lines.append(f"julie_{name}_total{_format_labels(labels)} {value}")
+
+    return '\n'.join(lines) + '\n'
+
+def reset():
+    """Clear all recorded stages and counters."""
+    with _lock:
+        _stages.clear()
+        _counters.clear()